@@ -0,0 +1,164 @@
+import collections
+import heapq
+import itertools
+import threading
+import time
+
+# Lower rank is served first
+PRIORITIES = {"interactive": 0, "batch": 1}
+DEFAULT_PRIORITY = "interactive"
+
+DEFAULT_MAX_QUEUE = 64
+DEFAULT_QUEUE_TIMEOUT = 300
+WAIT_HISTORY = 1000
+# How often a waiter with a cancel event checks it
+CANCEL_POLL_SECONDS = 0.25
+
+
+class AdmissionRejected(Exception):
+    pass
+
+
+class _Ticket:
+    def __init__(self, rank):
+        self.rank = rank
+        self.granted = False
+        self.shed = False
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class AdmissionQueue:
+    """Holds in-flight requests to an instance at its -np slot count.
+
+    Waiters are served by priority class, then arrival order. When max_queue requests are already
+    waiting, an interactive arrival sheds the newest batch waiter; anything else is rejected.
+    """
+
+    def __init__(self, slots, max_queue=DEFAULT_MAX_QUEUE, telemetry=None):
+        self.slots = max(1, slots)
+        self.max_queue = max_queue
+        self.telemetry = telemetry
+        self.active = 0
+        self.waiting = []
+        self.seq = itertools.count()
+        self.cond = threading.Condition()
+        self.waits = {name: collections.deque(maxlen=WAIT_HISTORY) for name in PRIORITIES}
+        self.counts = {"admitted": 0, "rejected": 0, "shed": 0, "timed_out": 0}
+
+    def resize(self, slots, max_queue=None):
+        with self.cond:
+            self.slots = max(1, slots)
+            if max_queue is not None:
+                self.max_queue = max_queue
+            self._grant()
+
+    def acquire(self, priority=DEFAULT_PRIORITY, timeout=DEFAULT_QUEUE_TIMEOUT, cancel=None):
+        """Block until a slot is free. Returns seconds spent queued; raises AdmissionRejected.
+
+        A waiter gives up its place as soon as the optional cancel event is set.
+        """
+        if priority not in PRIORITIES:
+            priority = DEFAULT_PRIORITY
+        start = time.perf_counter()
+        with self.cond:
+            if self.active < self.slots and not self.waiting:
+                self.active += 1
+                return self._admitted(priority, 0.0)
+
+            ticket = _Ticket(PRIORITIES[priority])
+            if len(self.waiting) >= self.max_queue and not self._shed_for(ticket):
+                self._count("rejected")
+                raise AdmissionRejected(f"Queue full ({len(self.waiting)} waiting for {self.slots} slots)")
+
+            entry = (ticket.rank, next(self.seq), ticket)
+            heapq.heappush(self.waiting, entry)
+            self._publish_depth()
+            deadline = start + timeout
+            while not ticket.granted:
+                if ticket.shed:
+                    raise AdmissionRejected("Shed from the queue in favour of interactive traffic")
+                if cancel is not None and cancel.is_set():
+                    self._leave(entry)
+                    raise AdmissionRejected("Cancelled while waiting for a free slot")
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self._leave(entry)
+                    self._count("timed_out")
+                    raise AdmissionRejected(f"Timed out after {timeout}s waiting for a free slot")
+                self.cond.wait(remaining if cancel is None else min(remaining, CANCEL_POLL_SECONDS))
+            return self._admitted(priority, time.perf_counter() - start)
+
+    def release(self):
+        with self.cond:
+            self.active = max(0, self.active - 1)
+            self._grant()
+
+    def _grant(self):
+        while self.active < self.slots and self.waiting:
+            _, _, ticket = heapq.heappop(self.waiting)
+            ticket.granted = True
+            self.active += 1
+        self._publish_depth()
+        self.cond.notify_all()
+
+    def _leave(self, entry):
+        self.waiting.remove(entry)
+        heapq.heapify(self.waiting)
+        self._publish_depth()
+
+    def _shed_for(self, ticket):
+        """Drop the lowest-priority, most recent waiter if it ranks below ticket."""
+        if not self.waiting:
+            # max_queue=0: nothing to shed, the newcomer is rejected
+            return False
+        victim = max(self.waiting, key=lambda entry: (entry[0], entry[1]))
+        if victim[0] <= ticket.rank:
+            return False
+        self.waiting.remove(victim)
+        heapq.heapify(self.waiting)
+        victim[2].shed = True
+        self._count("shed")
+        self.cond.notify_all()
+        return True
+
+    def _admitted(self, priority, waited):
+        self.waits[priority].append(waited)
+        self.counts["admitted"] += 1
+        if self.telemetry:
+            self.telemetry.record_admission(waited, len(self.waiting), self.active)
+        return waited
+
+    def _count(self, key):
+        self.counts[key] += 1
+        if self.telemetry and key != "admitted":
+            self.telemetry.record_rejection()
+
+    def _publish_depth(self):
+        if self.telemetry:
+            self.telemetry.set_queue(len(self.waiting), self.active)
+
+    def stats(self):
+        with self.cond:
+            waits = {
+                name: {
+                    "p50": _percentile(values, 0.50),
+                    "p95": _percentile(values, 0.95),
+                    "p99": _percentile(values, 0.99),
+                    "max": max(values) if values else 0.0,
+                }
+                for name, values in self.waits.items()
+            }
+            return {
+                "slots": self.slots,
+                "active": self.active,
+                "queue_depth": len(self.waiting),
+                "max_queue": self.max_queue,
+                "counts": dict(self.counts),
+                "wait_seconds": waits,
+            }
@@ -1,24 +1,39 @@
+import time
+# Start of the import-to-listening measurement reported by serve()
+IMPORT_STARTED = time.perf_counter()
+
 from flask import Flask, render_template, request, Response, jsonify
+import argparse
+import functools
 import subprocess
+import sys
 import threading
 import queue
 import re
 import os
 import platform
-import pystray
-from PIL import Image
 import webbrowser
 import logging
 import json
-
-# Optional: HuggingFace model downloading
-try:
-    from huggingface_hub import hf_hub_download
-    HF_AVAILABLE = True
-except ImportError:
-    logging.warning("huggingface_hub not installed. Download feature will not work.")
-    hf_hub_download = None
-    HF_AVAILABLE = False
+import zlib
+from model_index import ModelIndex, ModelScanner
+from log_bus import LOG_LEVELS, LEVEL_COLORS
+from telemetry import render_prometheus
+from instances import InstanceRegistry, build_launch, DEFAULT_INSTANCE, DEFAULT_DRAIN_TIMEOUT
+import proxy
+from admission import AdmissionRejected
+from model_pool import ModelPool, PoolError, DEFAULT_PORT_RANGE
+from fit_planner import plan_launch, system_memory, PlanError
+from profiles import LaunchProfiles
+from auto_tuner import AutoTuner, TuningJob, TuningError, free_port
+from runtime_detect import RuntimeCache
+from server_flags import FlagCache
+from prewarm import Prewarmer
+from slot_store import SlotStore
+import response_cache as rcache
+from resource_sampler import ResourceSampler
+from batch_runner import BatchRunner, BatchError, DEFAULT_ENDPOINT as BATCH_ENDPOINT
+from draft_advisor import DraftAdvisor, PairingStats, AdvisorError
 
 app = Flask(__name__)
 
@@ -30,67 +45,64 @@ logging.basicConfig(
 )
 
 # Global variables
-server_process = None
-log_queue = queue.Queue()
-stop_event = threading.Event()
-log_thread = None
+slot_store = SlotStore()
+server_flags = FlagCache()
+instances = InstanceRegistry(slot_store, server_flags)
 tray_icon = None
 flask_thread = None
 service_running = False
 LLAMA_SERVER_PATH = None
+model_index = ModelIndex()
+model_scanner = ModelScanner(model_index)
+model_pool = ModelPool(instances, model_index)
+launch_profiles = LaunchProfiles()
+auto_tuner = AutoTuner(instances)
+runtime_cache = RuntimeCache()
+prewarmer = Prewarmer()
+response_cache = rcache.ResponseCache()
+resource_sampler = ResourceSampler(instances)
+batch_runner = BatchRunner(instances)
+draft_pairings = PairingStats()
+draft_advisor = DraftAdvisor(model_index, draft_pairings)
+resource_sampler.start()
 
-def find_llama_server():
-    is_windows = platform.system() == "Windows"
-    exe_suffix = ".exe" if is_windows else ""
-    
-    # Priority: Current Directory -> PATH -> Common Dirs
-    search_paths = [os.getcwd(), "."]
-    
-    path_env = os.environ.get("PATH", "")
-    path_sep = ";" if is_windows else ":"
-    search_paths.extend(path_env.split(path_sep))
-    
-    common_dirs = ["/usr/local/bin", "/usr/bin", os.path.expanduser("~/bin")]
-    if is_windows:
-        common_dirs.extend([
-            "C:\\llamacpp",
-            "C:\\Program Files\\llama.cpp",
-            os.path.expanduser("~\\llamacpp"),
-        ])
-    search_paths.extend(common_dirs)
-
-    for p in search_paths:
-        if not p: continue
-        exe_path = os.path.join(p, "llama-server" + exe_suffix)
-        if os.path.exists(exe_path):
-            logging.info(f"Found llama-server at: {exe_path}")
-            return exe_path
-    
-    logging.error("llama-server executable not found in search paths.")
-    return None
+# The GUI (tray icon, file dialogs) and the downloader are imported on first use, so headless mode
+# starts without pystray, Pillow or tkinter installed
+_download_manager = None
+_download_manager_lock = threading.Lock()
+# Seconds from importing app to accepting connections, set by serve()
+startup_seconds = None
 
-LLAMA_SERVER_PATH = find_llama_server()
+def get_download_manager():
+    """The download queue, created on first use."""
+    global _download_manager
+    with _download_manager_lock:
+        if _download_manager is None:
+            from download_manager import DownloadManager
+            _download_manager = DownloadManager(model_index)
+        return _download_manager
+
+def serve(host="127.0.0.1", port=5000):
+    """Bind the API, record how long startup took, and serve until the process exits."""
+    global startup_seconds
+    from werkzeug.serving import make_server
+    server = make_server(host, port, app, threaded=True)
+    startup_seconds = time.perf_counter() - IMPORT_STARTED
+    logging.info(f"LlamaForge API listening on http://{host}:{port} ({startup_seconds:.3f}s after import)")
+    server.serve_forever()
 
 def start_service():
     global flask_thread, service_running
     if not service_running:
-        flask_thread = threading.Thread(
-            target=lambda: app.run(
-                debug=False, host="127.0.0.1", port=5000, threaded=True
-            ),
-            daemon=True,
-        )
+        flask_thread = threading.Thread(target=serve, daemon=True)
         flask_thread.start()
         service_running = True
         update_tray_menu()
 
 def stop_service():
-    global flask_thread, service_running, server_process
+    global flask_thread, service_running
     if service_running:
-        if server_process:
-            server_process.terminate()
-            server_process.wait()
-            server_process = None
+        instances.stop_all()
         service_running = False
         update_tray_menu()
 
@@ -108,6 +120,7 @@ def on_exit():
     os._exit(0)
 
 def get_menu():
+    import pystray
     return pystray.Menu(
         pystray.MenuItem("Open", open_browser, enabled=service_running),
         pystray.Menu.SEPARATOR,
@@ -125,68 +138,6 @@ def update_tray_menu():
             f"LlamaForge: {'Running' if service_running else 'Stopped'}"
         )
 
-def parse_runtime_info(stdout, stderr):
-    output = stdout + "\n" + stderr
-    runtimes = []
-    
-    # Debug logging
-    logging.debug(f"Runtime Detection Output: {output}")
-
-    backend_map = {
-        "CUDA": "CUDA (NVIDIA GPUs)",
-        "HIP": "ROCm (AMD GPUs)",
-        "Vulkan": "Vulkan (Cross-platform)",
-        "Metal": "Metal (Apple Silicon)",
-        "SYCL": "SYCL (Intel GPUs/Accelerators)",
-    }
-    
-    active_backends = []
-    
-    lines = output.split('\n')
-    for line in lines:
-        lower_line = line.lower()
-        
-        # IGNORE ggml_cuda_init lines (Fix for AMD false positives)
-        if "ggml_cuda_init" in lower_line:
-            continue
-            
-        if "error" in lower_line or "failed" in lower_line or "not found" in lower_line:
-            continue
-            
-        if "cuda" in lower_line and ("device" in lower_line or "init" in lower_line):
-            active_backends.append("CUDA")
-        if ("hip" in lower_line or "rocm" in lower_line or "amd" in lower_line) and ("device" in lower_line or "init" in lower_line):
-            active_backends.append("ROCm")
-        if "vulkan" in lower_line and ("device" in lower_line or "init" in lower_line):
-            active_backends.append("Vulkan")
-        if "metal" in lower_line and ("device" in lower_line or "init" in lower_line):
-            active_backends.append("Metal")
-        if "sycl" in lower_line and ("device" in lower_line or "init" in lower_line):
-            active_backends.append("SYCL")
-
-    # Remove duplicates
-    active_backends = list(set(active_backends))
-
-    for backend, name in backend_map.items():
-        if backend in active_backends:
-            runtimes.append(
-                {
-                    "name": name,
-                    "status": "active",
-                    "tooltip": f"{name} is active and ready.",
-                }
-            )
-    
-    # Always include CPU
-    runtimes.append(
-        {
-            "name": "CPU (Fallback)",
-            "status": "active",
-            "tooltip": "CPU is always available as fallback.",
-        }
-    )
-    return runtimes
-
 @app.route("/")
 def index():
     try:
@@ -197,68 +148,18 @@ def index():
 
 @app.route("/detect-runtime")
 def detect_runtime():
+    """Cached runtime detection; never waits on `--list-devices`. pending means a refresh is running."""
     # Accept custom server path from query parameter
     server_path = request.args.get('serverPath') or LLAMA_SERVER_PATH
-    
+
     if not server_path:
         return jsonify({"error": "llama-server not found. Please install llama.cpp or specify server path."})
-    
-    try:
-        # Check for backend DLLs in the same directory as the server
-        server_dir = os.path.dirname(server_path)
-        if not server_dir: server_dir = "."
-        
-        available_backends = {
-            "cpu": True, # CPU always available
-            "cuda": False,
-            "rocm": False,
-            "vulkan": False,
-            "sycl": False
-        }
-        
-        # Check for specific DLLs
-        if os.path.exists(os.path.join(server_dir, "ggml-cuda.dll")):
-            available_backends["cuda"] = True
-        if os.path.exists(os.path.join(server_dir, "ggml-hip.dll")):
-            available_backends["rocm"] = True
-        if os.path.exists(os.path.join(server_dir, "ggml-vk.dll")):
-            available_backends["vulkan"] = True
-        if os.path.exists(os.path.join(server_dir, "ggml-sycl.dll")):
-            available_backends["sycl"] = True
-
-        # Configure startup info to hide window
-        startupinfo = None
-        creationflags = 0
-        if platform.system() == "Windows":
-            startupinfo = subprocess.STARTUPINFO()
-            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-            startupinfo.wShowWindow = subprocess.SW_HIDE
-            creationflags = subprocess.CREATE_NO_WINDOW
 
-        # Capture both stdout and stderr
-        runtimes = []
-        try:
-            result = subprocess.run(
-                [server_path, "--list-devices"],
-                capture_output=True,
-                text=True,
-                timeout=10,
-                startupinfo=startupinfo,
-                creationflags=creationflags
-            )
-            runtimes = parse_runtime_info(result.stdout, result.stderr)
-        except Exception as e:
-            logging.warning(f"Runtime check failed (safe to ignore if configuring): {e}")
-            runtimes.append({
-                "name": "CPU (Fallback)",
-                "status": "active",
-                "tooltip": "CPU is always available."
-            })
-        
-        return jsonify({
-            "runtimes": runtimes,
-            "available_backends": available_backends
-        })
+    try:
+        result = runtime_cache.get(server_path, force=request.args.get("refresh") == "1")
+        if result is None:
+            return jsonify({"error": f"llama-server not found at '{server_path}'. Please specify the server path."})
+        return jsonify(result)
     except Exception as e:
         logging.error(f"Error in detect_runtime: {e}")
         return jsonify({"error": str(e)})
@@ -306,16 +207,42 @@ def scan_models():
     try:
         data = request.json
         path = data.get("path", ".")
-        models = []
-        for root, dirs, files in os.walk(path):
-            for file in files:
-                if file.endswith(".gguf"):
-                    models.append(os.path.join(root, file))
+        models = model_scanner.scan(path)
         return jsonify({"models": models})
     except Exception as e:
         logging.error(f"Error in scan_models: {e}")
         return jsonify({"error": str(e)})
 
+@app.route("/scan-models/stream", methods=["POST"])
+def scan_models_stream():
+    """NDJSON variant of /scan-models: one line per model as soon as it is found."""
+    try:
+        data = request.json
+        path = data.get("path", ".")
+        results = queue.Queue()
+
+        def worker():
+            try:
+                models = model_scanner.scan(path, on_model=lambda m: results.put({"event": "model", "model": m}))
+                results.put({"event": "done", "count": len(models)})
+            except Exception as e:
+                logging.error(f"Error in scan_models_stream: {e}")
+                results.put({"event": "error", "error": str(e)})
+
+        threading.Thread(target=worker, daemon=True).start()
+
+        def generate():
+            while True:
+                item = results.get()
+                yield json.dumps(item) + "\n"
+                if item["event"] != "model":
+                    break
+
+        return Response(generate(), mimetype="application/x-ndjson")
+    except Exception as e:
+        logging.error(f"Error in scan_models_stream: {e}")
+        return jsonify({"error": str(e)})
+
 @app.route('/delete-model', methods=['POST'])
 def delete_model():
     try:
@@ -336,41 +263,79 @@ def delete_model():
 
 @app.route('/download-model', methods=['POST'])
 def download_model():
-    if not HF_AVAILABLE:
-        return jsonify({"error": "huggingface_hub not installed. Please install it with: pip install huggingface_hub"}), 500
-    
+    """Queue a download and return immediately; follow it via /downloads or /downloads/events."""
+    from download_manager import DownloadError, hf_url
     try:
-        data = request.json
+        data = request.json or {}
         repo_id = data.get("repoId")
         filename = data.get("filename")
+        url = data.get("url")
         save_dir = data.get("saveDir", ".")
-        
-        if not repo_id or not filename:
+
+        if url:
+            source = url
+        elif repo_id and filename:
+            source = hf_url(repo_id, filename, data.get("revision") or "main")
+        else:
             return jsonify({"error": "Missing repo ID or filename"}), 400
-        
-        logging.info(f"Downloading {filename} from {repo_id}...")
-        
-        # Download the model
-        file_path = hf_hub_download(
-            repo_id=repo_id,
-            filename=filename,
-            local_dir=save_dir,
-            local_dir_use_symlinks=False
-        )
-        
-        logging.info(f"Downloaded model to: {file_path}")
-        return jsonify({"success": True, "path": file_path})
+
+        job = get_download_manager().submit(source, save_dir, filename=filename, repo_id=repo_id,
+                                           sha256=data.get("sha256"), connections=data.get("connections"))
+        return jsonify({"success": True, "id": job.id, "path": job.dest, "state": job.state})
+    except DownloadError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         logging.error(f"Error downloading model: {e}")
         return jsonify({"error": str(e)}), 500
 
-import sys
-import tkinter as tk
-from tkinter import filedialog
+@app.route('/downloads', methods=['GET'])
+def list_downloads():
+    return jsonify(get_download_manager().status())
+
+@app.route('/downloads/config', methods=['POST'])
+def configure_downloads():
+    try:
+        data = request.json or {}
+        return jsonify(get_download_manager().configure(data.get("max_active"), data.get("connections")))
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/downloads/<job_id>/<action>', methods=['POST'])
+def control_download(job_id, action):
+    downloads = get_download_manager()
+    handlers = {"pause": downloads.pause, "resume": downloads.resume, "cancel": downloads.cancel}
+    if action not in handlers:
+        return jsonify({"error": f"Unknown action {action}"}), 404
+    job = handlers[action](job_id)
+    if job is None:
+        return jsonify({"error": "Download not found"}), 404
+    return jsonify(job.status())
+
+@app.route('/downloads/events')
+def download_events():
+    """SSE stream of the download queue, sent whenever progress or state changes."""
+    downloads = get_download_manager()
+
+    def generate():
+        version = -1
+        yield "retry: 2000\n\n"
+        while True:
+            latest = downloads.wait_for_change(version, timeout=LOG_KEEPALIVE_SECONDS)
+            if latest == version:
+                yield ": keep-alive\n\n"
+                continue
+            version = latest
+            yield f"event: downloads\ndata: {json.dumps(downloads.status())}\n\n"
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(generate(), mimetype="text/event-stream", headers=headers)
 
 @app.route('/browse-file', methods=['POST'])
 def browse_file():
     try:
+        import tkinter as tk
+        from tkinter import filedialog
+
         # Create hidden root window
         root = tk.Tk()
         root.withdraw()
@@ -392,8 +357,9 @@ def browse_file():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@functools.lru_cache(maxsize=None)
 def find_llama_server():
-    # Search for llama-server in common locations
+    # Search for llama-server in common locations, once per process (PATH can be long)
     # Critical: Check directory of the actual executable (sys.executable)
     exe_dir = os.path.dirname(sys.executable) if getattr(sys, 'frozen', False) else os.path.dirname(__file__)
     
@@ -408,6 +374,15 @@ def find_llama_server():
     if "PATH" in os.environ:
         search_paths.extend(os.environ["PATH"].split(os.pathsep))
 
+    # Then the usual install locations
+    search_paths.extend(["/usr/local/bin", "/usr/bin", os.path.expanduser("~/bin")])
+    if platform.system() == "Windows":
+        search_paths.extend([
+            "C:\\llamacpp",
+            "C:\\Program Files\\llama.cpp",
+            os.path.expanduser("~\\llamacpp"),
+        ])
+
     executable_name = "llama-server"
     if platform.system() == "Windows":
         executable_name += ".exe"
@@ -423,221 +398,818 @@ def find_llama_server():
     return "llama-server"
 
 LLAMA_SERVER_PATH = find_llama_server()
+# Probe in the background now so the first page load is answered from the cache
+runtime_cache.get(LLAMA_SERVER_PATH)
+server_flags.warm(LLAMA_SERVER_PATH)
+
+@app.route("/server-flags")
+def server_flags_route():
+    """Options parsed from the binary's --help, and which optional launch settings it supports."""
+    server_path = request.args.get('serverPath') or LLAMA_SERVER_PATH
+    if not server_path:
+        return jsonify({"error": "llama-server not found. Please install llama.cpp or specify server path."})
+    try:
+        entry = server_flags.get(server_path)
+        if entry is None:
+            return jsonify({"error": f"Could not read the options of '{server_path}'."})
+        return jsonify({"path": entry["fingerprint"]["path"], "probed_at": entry["probed_at"],
+                        "options": entry["options"], "features": server_flags.features(server_path)})
+    except Exception as e:
+        logging.error(f"Error in server_flags: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/plan-launch", methods=["POST"])
+def plan_launch_route():
+    """Memory estimate for a /start-server payload, checked before launch.
+
+    Optional vram_gb / ram_gb set the budgets. VRAM defaults to the free memory of the detected GPUs,
+    RAM to what the OS reports as available.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        if data.get("vram_gb"):
+            vram_bytes = int(float(data["vram_gb"]) * 1024 ** 3)
+        elif data.get("backend") != "cpu":
+            # Free memory reported by the last cached --list-devices probe, if any
+            devices = runtime_cache.devices(data.get("serverPath") or LLAMA_SERVER_PATH)
+            vram_bytes = sum(device["free_bytes"] for device in devices) if devices else None
+        else:
+            vram_bytes = None
+        if data.get("ram_gb"):
+            ram_bytes = int(float(data["ram_gb"]) * 1024 ** 3)
+        else:
+            ram_bytes = system_memory()[1]
+        return jsonify(plan_launch(data, vram_bytes, ram_bytes))
+    except PlanError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logging.error(f"Error in plan_launch: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/draft-models")
+def draft_models():
+    """Indexed models that can serve as speculative decoding drafts for ?model=, best first.
+
+    Each draft carries its measured speedup and acceptance rate once a launch with it has served requests.
+    """
+    model = request.args.get("model")
+    if not model:
+        return jsonify({"error": "model is required"}), 400
+    try:
+        return jsonify(draft_advisor.candidates(model))
+    except AdvisorError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logging.error(f"Error in draft_models: {e}")
+        return jsonify({"error": str(e)}), 500
+
+def resolve_draft(data):
+    """data with draft_model "auto" replaced by the advisor's pick for the model, or dropped if there is none."""
+    if data.get("draft_model") != "auto":
+        return data
+    try:
+        draft = draft_advisor.best(data.get("model", ""))
+    except AdvisorError as e:
+        logging.warning(f"No draft model chosen: {e}")
+        draft = None
+    return dict(data, draft_model=draft)
 
 @app.route('/start-server', methods=['POST'])
 def start_server():
-    global server_process, stop_event, log_thread
-    if server_process and server_process.poll() is None:
-        return jsonify({"error": "Server already running."}), 400
-        
     data = request.json
-    
+    if data.get("profile"):
+        # Fields sent with the request override the saved profile
+        profile = launch_profiles.get(data["profile"])
+        if profile is None:
+            return jsonify({"error": f"No launch profile named '{data['profile']}'"}), 404
+        data = dict(profile, **{k: v for k, v in data.items() if k != "profile"})
+    name = data.get("name") or DEFAULT_INSTANCE
+
     # Check for user-provided server path (V0.4 feature)
     custom_server_path = data.get("serverPath")
     server_path = custom_server_path if custom_server_path else LLAMA_SERVER_PATH
-    
+
     if not server_path:
         return jsonify({"error": "llama-server executable not found. Please specify the path in settings."}), 500
 
-    # Basic Parameters
-    model_path = data.get("model", "")
-    if not model_path:
-        return jsonify({"error": "No model specified"}), 400
-        
-    threads = data.get("threads", os.cpu_count())
-    gpu_layers = data.get("gpu_layers", 0)
-    port = data.get("port", 8080)
-    host = data.get("host", "127.0.0.1")
-    
-    # Advanced Parameters
-    ctx_size = data.get("ctx_size", 4096)
-    split_mode = data.get("split_mode", "none")
-    parallel = data.get("parallel", 1)
-    batch_size = data.get("batch_size", 512)
-    no_mmap = data.get("no_mmap", False)
-    mlock = data.get("mlock", False)
-    flash_attn = data.get("flash_attn", False)
-    jinja = data.get("jinja", False)
-    cache_type_k = data.get("cache_type_k", "f16")
-    cache_type_v = data.get("cache_type_v", "f16")
-    
-    # Sampling Parameters
-    temp = data.get("temp", 0.8)
-    top_k = data.get("top_k", 40)
-    top_p = data.get("top_p", 0.9)
-    min_p = data.get("min_p", 0.05)
-    repeat_penalty = data.get("repeat_penalty", 1.1)
-    
-    # RoPE Parameters
-    rope_freq_base = data.get("rope_freq_base", 0)
-    rope_freq_scale = data.get("rope_freq_scale", 0)
-    
-    # Backend Selection Logic (V0.4 feature - improved)
-    backend = data.get("backend", "auto")
-    logging.info(f"User preferred backend: {backend}")
-    
-    # If CPU is forced, ensure ngl is 0
-    if backend == "cpu":
-        gpu_layers = 0
+    try:
+        spec = build_launch(resolve_draft(data), server_path)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    # Construct Command Arguments (V0.3 logic - working)
-    args = []
-    
-    # Handle model input
-    model_args = []
-    if "-hf" in model_path:
-        parts = model_path.split("-hf")
-        if len(parts) > 1:
-            repo = parts[1].strip().split()[0]
-            model_args = ["-hf", repo]
-    elif "-m" in model_path:
-         parts = model_path.split("-m")
-         if len(parts) > 1:
-             path = parts[1].strip().split()[0]
-             model_args = ["-m", path]
-    else:
-        model_args = ["-m", model_path]
-
-    args.extend(model_args)
-    args.extend(["-t", str(threads)])
-    args.extend(["-ngl", str(gpu_layers)])
-    args.extend(["--port", str(port)])
-    args.extend(["--host", host])
-    args.extend(["-c", str(ctx_size)])
-    args.extend(["-sm", split_mode])
-    args.extend(["-np", str(parallel)])
-    args.extend(["-b", str(batch_size)])
-    
-    if no_mmap: args.append("--no-mmap")
-    if mlock: args.append("--mlock")
-    if flash_attn: args.extend(["-fa", "on"])  # V0.6.1: Fixed to use value format
-    if jinja: args.append("--jinja")
-    
-    args.extend(["--cache-type-k", cache_type_k])
-    args.extend(["--cache-type-v", cache_type_v])
-    
-    args.extend(["--temp", str(temp)])
-    args.extend(["--top-k", str(top_k)])
-    args.extend(["--top-p", str(top_p)])
-    args.extend(["--min-p", str(min_p)])
-    args.extend(["--repeat-penalty", str(repeat_penalty)])
-    
-    if rope_freq_base != 0: args.extend(["--rope-freq-base", str(rope_freq_base)])
-    if rope_freq_scale != 0: args.extend(["--rope-freq-scale", str(rope_freq_scale)])
+    # A prewarm of some other model would only compete with this load for the disk
+    model_file = data.get("model", "")
+    prewarmer.cancel(keep_path=model_file if os.path.isfile(model_file) else None)
 
-    # Prepare Environment
-    cache_path = data.get("cache_path", ".")
-    current_env = os.environ.copy()
-    current_env["LLAMA_CACHE"] = cache_path
-    
-    # V0.7.4: Correct backend forcing via environment variables
-    # Backend selection happens based on which GPU backends are VISIBLE
-    if backend == "vulkan":
-        # Hide ROCm to force Vulkan (Vulkan has no env var control)
-        current_env["HIP_VISIBLE_DEVICES"] = "-1"
-        logging.info("Backend: Vulkan - hiding ROCm via HIP_VISIBLE_DEVICES=-1")
-    elif backend == "rocm":
-        # Hide CUDA to prefer ROCm (though you don't have NVIDIA GPU)
-        current_env["CUDA_VISIBLE_DEVICES"] = "-1"
-        logging.info("Backend: ROCm - hiding CUDA via CUDA_VISIBLE_DEVICES=-1")
-    elif backend == "cuda":
-        # Hide ROCm to prefer CUDA
-        current_env["HIP_VISIBLE_DEVICES"] = "-1"
-        logging.info("Backend: CUDA - hiding ROCm via HIP_VISIBLE_DEVICES=-1")
-    elif backend == "cpu":
-        # Hide all GPU backends to force CPU
-        current_env["CUDA_VISIBLE_DEVICES"] = "-1"
-        current_env["HIP_VISIBLE_DEVICES"] = "-1"
-        logging.info("Backend: CPU - hiding all GPU backends")
-    # For "auto" or unrecognized, don't set any env vars
-    
-    # Log command for debugging
-    full_cmd = f'$env:LLAMA_CACHE="{cache_path}"; {server_path} ' + " ".join(args)
-    logging.info(f"Executing command: {full_cmd}")
+    try:
+        instance = instances.start(name, spec)
+        if os.path.isfile(model_file):
+            prewarmer.track_launch(instance, model_file)
+        draft_pairings.track(instance)
+        if data.get("wait"):
+            # Block until the model is loaded (or the launch fails) instead of returning at spawn
+            state = instance.startup.wait(float(data.get("timeout", 300)))
+            summary = instance.startup.summary()
+            if state != "ready":
+                return jsonify({"error": summary["reason"] or f"Not ready after {data.get('timeout', 300)}s",
+                                "name": name, "startup": summary}), 500 if state == "failed" else 504
+            return jsonify({"status": "ready", "name": name, "command": spec["command"],
+                            "draft_model": spec["draft_model"], "flag_changes": spec.get("flag_changes", []), "startup": summary})
+        return jsonify({"status": "started", "name": name, "command": spec["command"], "draft_model": spec["draft_model"],
+                        "flag_changes": spec.get("flag_changes", [])})
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logging.error(f"Error in start_server: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/reload-server', methods=['POST'])
+def reload_server():
+    """Blue/green reload of a running instance with new launch parameters (a /start-server payload).
+
+    The new process starts on another port, takes over gateway traffic once ready, and the old one is
+    stopped after its in-flight requests finish (or drain_timeout seconds pass).
+    """
+    data = request.get_json(silent=True) or {}
+    if data.get("profile"):
+        profile = launch_profiles.get(data["profile"])
+        if profile is None:
+            return jsonify({"error": f"No launch profile named '{data['profile']}'"}), 404
+        data = dict(profile, **{k: v for k, v in data.items() if k != "profile"})
+    name = data.get("name") or DEFAULT_INSTANCE
+    instance = instances.get(name)
+    if not instance or not instance.is_running():
+        return jsonify({"error": f"Instance '{name}' is not running; use /start-server"}), 404
+
+    server_path = data.get("serverPath") or LLAMA_SERVER_PATH
+    if not server_path:
+        return jsonify({"error": "llama-server executable not found. Please specify the path in settings."}), 500
+    host = data.get("host", instance.spec["host"])
+    if int(data.get("port", instance.spec["port"])) == instance.spec["port"] and host == instance.spec["host"]:
+        # Both processes run side by side until the switch, so the new one needs its own port
+        data = dict(data, port=free_port("127.0.0.1" if host in ("0.0.0.0", "::") else host))
 
     try:
-        # Configure startup info to hide window
-        startupinfo = None
-        creationflags = 0
-        if platform.system() == "Windows":
-            startupinfo = subprocess.STARTUPINFO()
-            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-            startupinfo.wShowWindow = subprocess.SW_HIDE
-            creationflags = subprocess.CREATE_NO_WINDOW
+        spec = build_launch(resolve_draft(data), server_path)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-        # Use subprocess directly (V0.3 logic - working)
-        final_args = [server_path] + args
-        
-        server_process = subprocess.Popen(
-            final_args,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1,
-            env=current_env,
-            startupinfo=startupinfo,
-            creationflags=creationflags
-        )
-        
-        stop_event.clear()
-        log_thread = threading.Thread(target=read_logs, args=(server_process,), daemon=True)
-        log_thread.start()
-        
-        return jsonify({"status": "started", "command": full_cmd})
+    try:
+        report = instances.reload(name, spec, float(data.get("timeout", 300)),
+                                  float(data.get("drain_timeout", DEFAULT_DRAIN_TIMEOUT)))
+        draft_pairings.track(instances.get(name))
+        return jsonify(dict(report, status="reloaded", name=name, command=spec["command"],
+                            draft_model=spec["draft_model"], flag_changes=spec.get("flag_changes", [])))
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        logging.error(f"Error in start_server: {e}")
+        logging.error(f"Error in reload_server: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/prewarm", methods=["POST"])
+def start_prewarm():
+    """Read a model file into the OS page cache ahead of a launch. Replaces any prewarm of another model."""
+    data = request.get_json(silent=True) or {}
+    model = data.get("model", "")
+    if not os.path.isfile(model):
+        return jsonify({"error": f"Model file not found: {model}"}), 400
+    try:
+        return jsonify(prewarmer.start(model).status())
+    except Exception as e:
+        logging.error(f"Error in start_prewarm: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/prewarm")
+def prewarm_status():
+    job = prewarmer.current()
+    return jsonify(job.status() if job else {"state": "idle"})
+
+@app.route("/prewarm/cancel", methods=["POST"])
+def cancel_prewarm():
+    job = prewarmer.cancel()
+    return jsonify(job.status() if job else {"state": "idle"})
+
+@app.route("/prewarm/stats")
+def prewarm_stats():
+    """Prewarm throughput and launch times with and without a prewarm for ?model=."""
+    model = request.args.get("model")
+    if not model:
+        return jsonify({"error": "model is required"}), 400
+    return jsonify(prewarmer.summary(model))
+
+@app.route("/profiles")
+def list_profiles():
+    return jsonify({"profiles": launch_profiles.all()})
+
+@app.route("/profiles", methods=["POST"])
+def save_profile():
+    try:
+        data = request.get_json(silent=True) or {}
+        if not data.get("name") or not isinstance(data.get("params"), dict):
+            return jsonify({"error": "name and params are required"}), 400
+        launch_profiles.put(data["name"], data["params"], source="manual")
+        return jsonify({"status": "saved", "name": data["name"]})
+    except Exception as e:
+        logging.error(f"Error in save_profile: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route("/profiles/delete", methods=["POST"])
+def delete_profile():
+    data = request.get_json(silent=True) or {}
+    if not launch_profiles.delete(data.get("name", "")):
+        return jsonify({"error": f"No launch profile named '{data.get('name')}'"}), 404
+    return jsonify({"status": "deleted", "name": data["name"]})
+
+@app.route("/tune", methods=["POST"])
+def start_tuning():
+    """Queue a tuning job: a /start-server payload plus grid ({param: [values]}), optional workload
+    ({prompt, n_predict, repeats}), vram_gb and rank_by."""
+    try:
+        data = request.get_json(silent=True) or {}
+        base_params = {k: v for k, v in data.items() if k not in ("grid", "workload", "vram_gb", "rank_by")}
+        vram_bytes = int(float(data["vram_gb"]) * 1024 ** 3) if data.get("vram_gb") else None
+        job = TuningJob(instances, data.get("serverPath") or LLAMA_SERVER_PATH, base_params, data.get("grid"),
+                        data.get("workload"), vram_bytes, data.get("rank_by", "generation_tps"))
+        auto_tuner.submit(job)
+        return jsonify({"id": job.id, "candidates": len(job.candidates)})
+    except TuningError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logging.error(f"Error in start_tuning: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/tune")
+def list_tuning_jobs():
+    jobs = [job.status() for job in auto_tuner.all()]
+    return jsonify({"jobs": [dict(job, results=job["results"][:1]) for job in jobs]})
+
+@app.route("/tune/results")
+def tuning_results():
+    """Persisted ranked tables; ?model=<path> for one model."""
+    return jsonify({"runs": auto_tuner.store.for_model(request.args.get("model"))})
+
+@app.route("/tune/<job_id>")
+def tuning_job(job_id):
+    job = auto_tuner.get(job_id)
+    if not job:
+        return jsonify({"error": f"No tuning job '{job_id}'"}), 404
+    return jsonify(job.status())
+
+@app.route("/tune/<job_id>/cancel", methods=["POST"])
+def cancel_tuning(job_id):
+    job = auto_tuner.get(job_id)
+    if not job:
+        return jsonify({"error": f"No tuning job '{job_id}'"}), 404
+    job.cancel()
+    return jsonify({"status": "cancelling", "id": job_id})
+
+@app.route("/tune/<job_id>/apply", methods=["POST"])
+def apply_tuning(job_id):
+    """Save the candidate at rank (default 1) as a launch profile."""
+    job = auto_tuner.get(job_id)
+    if not job:
+        return jsonify({"error": f"No tuning job '{job_id}'"}), 404
+    try:
+        data = request.get_json(silent=True) or {}
+        params = job.winner_params(int(data.get("rank", 1)))
+        name = data.get("profile") or job.base_params.get("name") or DEFAULT_INSTANCE
+        launch_profiles.put(name, params, source=f"tune:{job_id}")
+        return jsonify({"status": "applied", "profile": name, "params": params})
+    except TuningError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logging.error(f"Error in apply_tuning: {e}")
+        return jsonify({"error": str(e)}), 500
+
+# Minimum seconds between /batch/events updates
+BATCH_EVENT_INTERVAL = 0.5
+
+@app.route("/batch", methods=["POST"])
+def start_batch():
+    """Run a JSONL file of requests through an instance: {input, output, name, endpoint, concurrency, overwrite}.
+
+    Resumes from the output's checkpoint when one exists; concurrency defaults to the instance's slot count.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        if not data.get("input") or not data.get("output"):
+            return jsonify({"error": "Missing input or output path"}), 400
+        job = batch_runner.submit(data.get("name") or DEFAULT_INSTANCE, data["input"], data["output"],
+                                  data.get("endpoint") or BATCH_ENDPOINT, data.get("concurrency"),
+                                  bool(data.get("overwrite")))
+        return jsonify(job.status())
+    except BatchError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logging.error(f"Error in start_batch: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/batch")
+def list_batches():
+    return jsonify({"jobs": [job.status() for job in batch_runner.all()]})
+
+@app.route("/batch/<job_id>")
+def batch_job(job_id):
+    job = batch_runner.get(job_id)
+    if not job:
+        return jsonify({"error": f"No batch job '{job_id}'"}), 404
+    return jsonify(job.status())
+
+@app.route("/batch/<job_id>/<action>", methods=["POST"])
+def control_batch(job_id, action):
+    """pause (checkpoint and stop, resumable), resume, or cancel."""
+    try:
+        if action == "resume":
+            job = batch_runner.resume(job_id)
+        elif action in ("pause", "cancel"):
+            job = batch_runner.stop(job_id, "paused" if action == "pause" else "cancelled")
+        else:
+            return jsonify({"error": f"Unknown action {action}"}), 404
+        if job is None:
+            return jsonify({"error": f"No batch job '{job_id}'"}), 404
+        return jsonify(job.status())
+    except BatchError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logging.error(f"Error in control_batch: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/batch/events")
+def batch_events():
+    """SSE stream of all batch jobs with live rows/s and tokens/s, sent as rows complete."""
+    def generate():
+        version = -1
+        yield "retry: 2000\n\n"
+        while True:
+            latest = batch_runner.wait_for_change(version, timeout=LOG_KEEPALIVE_SECONDS)
+            if latest == version:
+                yield ": keep-alive\n\n"
+                continue
+            version = latest
+            jobs = [job.status() for job in batch_runner.all()]
+            yield f"event: batch\ndata: {json.dumps(jobs)}\n\n"
+            # At most a few updates per second however fast rows complete
+            time.sleep(BATCH_EVENT_INTERVAL)
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(generate(), mimetype="text/event-stream", headers=headers)
+
 @app.route("/stop-server", methods=["POST"])
 def stop_server():
     try:
-        global server_process
-        if server_process:
-            # We need to kill the process and its children
-            subprocess.run(["taskkill", "/F", "/T", "/PID", str(server_process.pid)], 
-                           creationflags=subprocess.CREATE_NO_WINDOW if platform.system() == "Windows" else 0)
-            server_process = None
-        return jsonify({"status": "stopped"})
+        data = request.get_json(silent=True) or {}
+        name = data.get("name") or DEFAULT_INSTANCE
+        # drain_timeout: refuse new gateway requests and let in-flight ones finish before stopping
+        instance = instances.get(name)
+        dropped = instance.stop(float(data.get("drain_timeout") or 0)) if instance else 0
+        return jsonify({"status": "stopped", "name": name, "dropped_requests": dropped})
     except Exception as e:
         logging.error(f"Error in stop_server: {e}")
         return jsonify({"error": str(e)})
 
-def read_logs(process):
-    """Read logs from the server process and put them in the log queue."""
-    if process and process.stdout:
-        for line in iter(process.stdout.readline, ""):
-            if line:
-                log_queue.put(line.strip())
-            else:
-                break
+@app.route("/instances")
+def list_instances():
+    try:
+        return jsonify({"instances": [instance.info() for instance in instances.public()]})
+    except Exception as e:
+        logging.error(f"Error in list_instances: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/instances/<name>/startup")
+def instance_startup(name):
+    """Lifecycle state and per-phase timeline of the instance's latest launch."""
+    instance = instances.get(name)
+    if not instance or not instance.startup:
+        return jsonify({"error": f"Instance '{name}' has not been started"}), 404
+    return jsonify(dict(instance.startup.summary(), name=name))
+
+@app.route("/instances/<name>/wait-ready")
+def instance_wait_ready(name):
+    """Block until the instance is ready (200), has failed (500) or ?timeout= seconds pass (504)."""
+    instance = instances.get(name)
+    if not instance or not instance.startup:
+        return jsonify({"error": f"Instance '{name}' has not been started"}), 404
+    try:
+        timeout = float(request.args.get("timeout", 60))
+    except ValueError:
+        return jsonify({"error": "timeout must be a number"}), 400
+    state = instance.startup.wait(timeout)
+    summary = dict(instance.startup.summary(), name=name)
+    if state == "ready":
+        return jsonify(summary)
+    return jsonify(dict(summary, error=summary["reason"] or "Timed out waiting for readiness")), \
+        500 if state == "failed" else 504
+
+@app.route("/instances/<name>/slots/<action>", methods=["POST"])
+def instance_slots(name, action):
+    """Save (snapshot) or restore the KV slots of an instance launched with slot_persist."""
+    instance = instances.get(name)
+    if not instance or not instance.is_running():
+        return jsonify({"error": f"Instance '{name}' is not running"}), 404
+    if not instance.persists_slots():
+        return jsonify({"error": f"Instance '{name}' was not started with slot_persist"}), 400
+    try:
+        if action == "save":
+            result = instance.save_slots()
+            if result is None:
+                return jsonify({"error": f"Instance '{name}' is not ready yet"}), 409
+            return jsonify(result)
+        if action == "restore":
+            return jsonify(instance.restore_slots())
+        return jsonify({"error": f"Unknown action {action}"}), 404
+    except Exception as e:
+        logging.error(f"Error in instance_slots: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/slot-cache")
+def slot_cache_status():
+    return jsonify(slot_store.status())
+
+@app.route("/slot-cache/config", methods=["POST"])
+def configure_slot_cache():
+    """Set the snapshot directory's size bound (max_gb); least recently used snapshots are evicted past it."""
+    data = request.get_json(silent=True) or {}
+    try:
+        slot_store.configure(float(data["max_gb"]) * 1024 ** 3)
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "max_gb must be a number"}), 400
+    return jsonify(slot_store.status())
+
+@app.route("/slot-cache/clear", methods=["POST"])
+def clear_slot_cache():
+    data = request.get_json(silent=True) or {}
+    return jsonify({"deleted": slot_store.delete(data.get("instance"))})
+
+@app.route("/response-cache")
+def response_cache_status():
+    """Hit ratio, generation time saved and tier usage of the response cache."""
+    return jsonify(response_cache.status())
+
+@app.route("/response-cache/config", methods=["POST"])
+def configure_response_cache():
+    """Enable or disable the cache and set its memory_mb / disk_mb bounds."""
+    data = request.get_json(silent=True) or {}
+    try:
+        response_cache.configure(
+            enabled=data.get("enabled"),
+            memory_bytes=float(data["memory_mb"]) * 1024 ** 2 if data.get("memory_mb") is not None else None,
+            disk_bytes=float(data["disk_mb"]) * 1024 ** 2 if data.get("disk_mb") is not None else None)
+    except (TypeError, ValueError):
+        return jsonify({"error": "memory_mb and disk_mb must be numbers"}), 400
+    return jsonify(response_cache.status())
+
+@app.route("/response-cache/clear", methods=["POST"])
+def clear_response_cache():
+    response_cache.clear()
+    return jsonify(response_cache.status())
+
+@app.route("/metrics")
+def metrics():
+    """Prometheus text exposition of parsed and polled llama-server telemetry."""
+    try:
+        collectors = [({"instance": instance.name, "model": instance.telemetry.model}, instance.telemetry)
+                      for instance in instances.all() if instance.telemetry]
+        cache = response_cache.status()
+        cache_lines = [
+            "# HELP llamaforge_response_cache_hits_total Requests answered from the response cache.",
+            "# TYPE llamaforge_response_cache_hits_total counter",
+            f"llamaforge_response_cache_hits_total {cache['hits']}",
+            "# HELP llamaforge_response_cache_misses_total Cacheable requests sent to llama-server.",
+            "# TYPE llamaforge_response_cache_misses_total counter",
+            f"llamaforge_response_cache_misses_total {cache['misses']}",
+            "# HELP llamaforge_response_cache_saved_seconds_total Generation time the cached responses originally took.",
+            "# TYPE llamaforge_response_cache_saved_seconds_total counter",
+            f"llamaforge_response_cache_saved_seconds_total {cache['saved_seconds']}",
+        ]
+        if startup_seconds is not None:
+            cache_lines += [
+                "# HELP llamaforge_startup_seconds Time from importing LlamaForge to accepting connections.",
+                "# TYPE llamaforge_startup_seconds gauge",
+                f"llamaforge_startup_seconds {startup_seconds}",
+            ]
+        return Response(render_prometheus(collectors) + "\n".join(cache_lines) + "\n",
+                        mimetype="text/plain; version=0.0.4")
+    except Exception as e:
+        logging.error(f"Error in metrics: {e}")
+        return "Internal Server Error", 500
+
+@app.route("/telemetry")
+def telemetry_series():
+    """JSON time series for the dashboard; ?since=<unix ts> returns only newer samples."""
+    try:
+        since = float(request.args.get("since", 0))
+        models = [dict(instance.telemetry.snapshot(since), instance=instance.name)
+                  for instance in instances.all() if instance.telemetry]
+        return jsonify({"models": models})
+    except Exception as e:
+        logging.error(f"Error in telemetry: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/pool")
+def pool_status():
+    try:
+        return jsonify(model_pool.status())
+    except Exception as e:
+        logging.error(f"Error in pool_status: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/pool/config", methods=["POST"])
+def pool_config():
+    """Enable the warm model pool. budget_gb of 0 or null disables it; params are the shared launch options."""
+    try:
+        data = request.get_json(silent=True) or {}
+        budget_gb = data.get("budget_gb")
+        budget_bytes = int(float(budget_gb) * 1024 ** 3) if budget_gb else None
+        port_range = (int(data.get("port_start", DEFAULT_PORT_RANGE[0])),
+                      int(data.get("port_end", DEFAULT_PORT_RANGE[1])))
+        server_path = data.get("serverPath") or LLAMA_SERVER_PATH
+        model_pool.configure(budget_bytes, data.get("params", {}), port_range, server_path)
+        return jsonify(model_pool.status())
+    except Exception as e:
+        logging.error(f"Error in pool_config: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/pool/load", methods=["POST"])
+def pool_load():
+    try:
+        data = request.get_json(silent=True) or {}
+        if not model_pool.enabled():
+            return jsonify({"error": "Model pool is not configured."}), 400
+        instance = model_pool.ensure(data.get("model", ""))
+        return jsonify({"status": "ready", "instance": instance.info()})
+    except PoolError as e:
+        return jsonify({"error": str(e)}), e.status
+    except Exception as e:
+        logging.error(f"Error in pool_load: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/pool/evict", methods=["POST"])
+def pool_evict():
+    try:
+        data = request.get_json(silent=True) or {}
+        name = data.get("name", "")
+        if not model_pool.evict(name):
+            return jsonify({"error": f"No instance named '{name}'"}), 404
+        return jsonify({"status": "evicted", "name": name})
+    except Exception as e:
+        logging.error(f"Error in pool_evict: {e}")
+        return jsonify({"error": str(e)}), 500
+
+def openai_error(message, status):
+    return jsonify({"error": {"message": message, "type": "invalid_request_error", "code": status}}), status
+
+@app.route("/v1/models")
+def proxy_models():
+    """Every running instance, addressable by name in the 'model' field."""
+    data = []
+    for instance in instances.public():
+        if instance.is_running() or instance.sleeping:
+            data.append({
+                "id": instance.name,
+                "object": "model",
+                "owned_by": "llamaforge",
+                "created": int(instance.started_at),
+                "meta": {"model": instance.spec["model"], "port": instance.spec["port"], "sleeping": instance.sleeping},
+            })
+    return jsonify({"object": "list", "data": data})
+
+@app.route("/v1/<path:subpath>", methods=["POST"])
+def proxy_openai(subpath):
+    """OpenAI-compatible endpoint routed by the request's 'model' field to the matching instance."""
+    timer = proxy.ProxyTimer()
+    body = request.get_data()
+    payload = request.get_json(silent=True) or {}
+    # X-Priority: interactive (default) or batch
+    priority = request.headers.get("X-Priority", "interactive").lower()
+    model = payload.get("model")
+    try:
+        instance = proxy.resolve_instance(instances.public(), model, fallback_single=not model_pool.enabled())
+        if model_pool.is_loading(instance.name) or (instance.sleeping and instance.pool_managed):
+            # Let the pool finish (or redo, within its budget) the load
+            raise proxy.ProxyError(f"Model '{model}' is not loaded.", 503)
+    except proxy.ProxyError as e:
+        if not (model_pool.enabled() and model):
+            return openai_error(str(e), e.status)
+        try:
+            # Load on demand (or wait for a load in progress), evicting idle pooled models if the budget requires it
+            instance = model_pool.ensure(model)
+        except PoolError as pe:
+            return openai_error(str(pe), pe.status)
+        except Exception as pe:
+            logging.error(f"Error in model pool: {pe}")
+            return openai_error(str(pe), 500)
+    if instance.draining:
+        return openai_error(f"Instance '{instance.name}' is shutting down.", 503)
+    instance.touch()
+
+    # Deterministic requests already answered are replayed without touching the backend
+    cache_key = None
+    if response_cache.enabled and request.headers.get("Cache-Control") != "no-cache":
+        cache_key = response_cache.key_for(instance.spec, subpath, payload)
+    if cache_key:
+        entry = response_cache.get(cache_key)
+        if entry:
+            return Response(rcache.replay(entry), status=entry["status"],
+                            headers=entry["headers"] + [("X-LlamaForge-Cache", "hit")])
+
+    admission = instance.admission
+    try:
+        admission.acquire(priority)
+    except AdmissionRejected as e:
+        return openai_error(str(e), 429)
+
+    inflight = None
+    handed_off = False
+    try:
+        if instance.sleeping:
+            # Scaled to zero after its idle timeout; the caller waits for the relaunch instead of failing
+            try:
+                instance.wake()
+            except Exception as e:
+                logging.error(f"Error waking instance {instance.name}: {e}")
+                return openai_error(str(e), 503)
+
+        # Pin the request to the process that is live now; a reload waits for it before stopping that process
+        spec, inflight = instance.checkout()
+        try:
+            upstream_path = "/v1/" + subpath
+            if request.query_string:
+                upstream_path += "?" + request.query_string.decode("latin-1")
+            pool, conn, response = proxy.open_upstream(instance, "POST", upstream_path, body, request.headers,
+                                                       timer, spec)
+        except proxy.ProxyError as e:
+            return openai_error(str(e), e.status)
+
+        collector = instance.telemetry
+        headers = proxy.relay_headers(response)
+        recorder = None
+        if cache_key:
+            recorder = rcache.Recorder(response_cache, cache_key, response.status, headers,
+                                       bool(payload.get("stream")), timer)
+
+        def on_done(ok):
+            instance.touch()
+            inflight.done()
+            admission.release()
+            if recorder:
+                recorder.finish(ok)
+            if collector:
+                collector.record_proxy(timer.sample(), ok)
+
+        body_iter = proxy.relay(pool, conn, response, on_done)
+        if recorder:
+            body_iter = recorder.wrap(body_iter)
+            headers = headers + [("X-LlamaForge-Cache", "miss")]
+        streamed = Response(
+            body_iter,
+            status=response.status,
+            headers=headers,
+            direct_passthrough=True,
+        )
+        handed_off = True
+        return streamed
+    finally:
+        # Until the relay owns the request (and its on_done), every exit gives the slot and in-flight count back
+        if not handed_off:
+            if inflight:
+                inflight.done()
+            admission.release()
+
+# /logs streaming defaults
+LOG_KEEPALIVE_SECONDS = 15
+LOG_FLUSH_MS = 100
+LOG_MAX_BATCH = 500
 
 @app.route("/logs")
 def logs():
+    """SSE log stream.
+
+    Query parameters:
+      levels    comma-separated subset of error,warn,token,system (default: all)
+      batch     1 to coalesce lines into one "batch" event per flush window
+      flush_ms  batch flush window in milliseconds
+      compress  1 to gzip the stream when the client accepts it
+      instance  name of the server instance to follow (default: "default")
+    """
     try:
+        log_bus = instances.log_bus(request.args.get("instance") or DEFAULT_INSTANCE)
+
+        # EventSource sends Last-Event-ID on reconnect; ?since= allows explicit resume
+        since = request.headers.get("Last-Event-ID") or request.args.get("since") or 0
+        try:
+            since = int(since)
+        except ValueError:
+            since = 0
+
+        levels = request.args.get("levels")
+        wanted = set(levels.split(",")) & set(LOG_LEVELS) if levels else set(LOG_LEVELS)
+        batch = request.args.get("batch") == "1"
+        try:
+            flush_ms = int(request.args.get("flush_ms", LOG_FLUSH_MS))
+        except ValueError:
+            flush_ms = LOG_FLUSH_MS
+        flush = max(0, flush_ms) / 1000.0
+        compress = (request.args.get("compress") == "1"
+                    and "gzip" in request.headers.get("Accept-Encoding", ""))
+
+        def collect(last_seq):
+            missed, entries = log_bus.read_since(last_seq, timeout=LOG_KEEPALIVE_SECONDS)
+            if batch and entries:
+                # Keep reading until the flush window closes so load bursts become one frame
+                deadline = time.monotonic() + flush
+                while len(entries) < LOG_MAX_BATCH:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    _, more = log_bus.read_since(entries[-1][0], timeout=remaining)
+                    if not more:
+                        break
+                    entries.extend(more)
+            return missed, entries
+
         def generate():
+            last_seq = since
+            yield "retry: 2000\n\n"
             while True:
-                try:
-                    line = log_queue.get(timeout=1)
-                    # Parse color
-                    color = "blue" # Default system log
-                    lower_line = line.lower()
-                    
-                    if "error" in lower_line or "failed" in lower_line:
-                        color = "red"
-                    elif "warning" in lower_line or "warn" in lower_line:
-                        color = "yellow"
-                    elif "token" in lower_line or "eval time" in lower_line or "prompt eval" in lower_line:
-                        color = "green"
-                    
-                    yield f"data: {color}|{line}\n\n"
-                except queue.Empty:
-                    yield "data: \n\n"
-
-        return Response(generate(), mimetype="text/event-stream")
+                missed, entries = collect(last_seq)
+                if missed and last_seq:
+                    yield f"data: yellow|[LlamaForge] {missed} log lines dropped (buffer overflow)\n\n"
+                if not entries:
+                    yield ": keep-alive\n\n"
+                    continue
+                last_seq = entries[-1][0]
+                visible = [(seq, line, level) for seq, line, level in entries if level in wanted]
+                if not visible:
+                    continue
+                if batch:
+                    payload = json.dumps([[level, line] for _, line, level in visible])
+                    yield f"id: {last_seq}\nevent: batch\ndata: {payload}\n\n"
+                else:
+                    yield "".join(f"id: {seq}\ndata: {LEVEL_COLORS[level]}|{line}\n\n"
+                                  for seq, line, level in visible)
+
+        def generate_gzip():
+            # Sync-flush after every frame so the browser can decode it immediately
+            compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+            for chunk in generate():
+                yield compressor.compress(chunk.encode("utf-8")) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+        headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        if compress:
+            headers["Content-Encoding"] = "gzip"
+            headers["Vary"] = "Accept-Encoding"
+            return Response(generate_gzip(), mimetype="text/event-stream", headers=headers)
+        return Response(generate(), mimetype="text/event-stream", headers=headers)
     except Exception as e:
         logging.error(f"Error in logs: {e}")
         return "Internal Server Error", 500
 
+@app.route("/resources")
+def resources():
+    """CPU, RSS, page fault and thread samples of each llama-server and its children.
+
+    Query parameters: instance (default: all), since (unix time; only newer samples).
+    """
+    try:
+        since = float(request.args.get("since", 0))
+        return jsonify(resource_sampler.status(request.args.get("instance"), since))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logging.error(f"Error in resources: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/resources/config", methods=["POST"])
+def configure_resources():
+    try:
+        data = request.get_json(silent=True) or {}
+        return jsonify(resource_sampler.configure(data.get("interval", resource_sampler.interval)))
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route("/resources/events")
+def resource_events():
+    """SSE stream of new resource samples, one "resources" event per sampling pass."""
+    name = request.args.get("instance")
+
+    def generate():
+        version, since = -1, time.time()
+        yield "retry: 2000\n\n"
+        while True:
+            latest = resource_sampler.wait_for_change(version, timeout=LOG_KEEPALIVE_SECONDS)
+            if latest == version:
+                yield ": keep-alive\n\n"
+                continue
+            version = latest
+            status = resource_sampler.status(name, since)
+            samples = [point["t"] for entry in status["instances"] for point in entry["samples"]]
+            if samples:
+                since = max(samples)
+                yield f"event: resources\ndata: {json.dumps(status)}\n\n"
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(generate(), mimetype="text/event-stream", headers=headers)
+
 def resource_path(relative_path):
     """ Get absolute path to resource, works for dev and for PyInstaller """
     try:
@@ -656,19 +1228,44 @@ def create_icon():
         if not os.path.exists(icon_path):
              icon_path = resource_path("icons/LlamaForge_32.png")
         
+        from PIL import Image
         img = Image.open(icon_path)
         return img
     except Exception as e:
         # Fallback to blue square + log error
         logging.error(f"Failed to load icon: {e}")
+        from PIL import Image
         img = Image.new("RGB", (32, 32), color="blue")
         return img
 
 def setup_tray():
     global tray_icon
+    import pystray
     icon = create_icon()
     tray_icon = pystray.Icon("LlamaForge", icon, "LlamaForge: Stopped", get_menu())
     tray_icon.run()
 
+def main():
+    parser = argparse.ArgumentParser(description="LlamaForge: a control panel and gateway for llama-server.")
+    parser.add_argument("--headless", action="store_true",
+                        help="serve the HTTP API only: no tray icon and no GUI dependencies")
+    parser.add_argument("--host", default="127.0.0.1", help="address to bind in headless mode")
+    parser.add_argument("--port", type=int, default=5000, help="port to bind in headless mode")
+    args = parser.parse_args()
+    if not args.headless:
+        setup_tray()
+        return
+    # No tray to look at: mirror the log to the console (or the service manager's journal)
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+    console.setLevel(logging.INFO)
+    logging.getLogger().addHandler(console)
+    try:
+        serve(args.host, args.port)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        instances.stop_all()
+
 if __name__ == "__main__":
-    setup_tray()
+    main()
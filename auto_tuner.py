@@ -0,0 +1,304 @@
+import http.client
+import itertools
+import json
+import logging
+import socket
+import statistics
+import threading
+import time
+import uuid
+
+from fit_planner import plan_launch, PlanError
+from instances import build_launch, INTERNAL_PREFIX
+from profiles import write_json_atomic
+
+TUNING_RESULTS_FILE = "tuning_results.json"
+# Runs remembered per model in the results file
+TUNING_HISTORY = 10
+
+# Launch parameters a tuning grid may vary
+TUNABLE_PARAMS = ("threads", "batch_size", "flash_attn", "cache_type_k", "cache_type_v", "gpu_layers")
+MAX_CANDIDATES = 64
+
+TUNE_INSTANCE = INTERNAL_PREFIX + "tune"
+TUNE_LOAD_TIMEOUT = 600
+TUNE_REQUEST_TIMEOUT = 600
+
+# Fixed workload so runs are comparable across configurations and days
+DEFAULT_PROMPT = (
+    "You are reviewing a pull request for a small web service. The change adds a cache in front of a "
+    "database query that is called on every page load. Explain what could go wrong with cache "
+    "invalidation, how you would test it, and what metrics you would watch after deploying it. "
+) * 4
+DEFAULT_N_PREDICT = 128
+DEFAULT_REPEATS = 3
+
+# Ranking keys and whether higher is better
+RANK_KEYS = {"generation_tps": True, "prompt_tps": True, "ttft_seconds": False}
+
+
+class TuningError(Exception):
+    pass
+
+
+def expand_grid(grid):
+    """Cartesian product of a {param: [values]} grid as a list of dicts."""
+    if not grid:
+        raise TuningError("The parameter grid is empty.")
+    unknown = [name for name in grid if name not in TUNABLE_PARAMS]
+    if unknown:
+        raise TuningError(f"Cannot tune {', '.join(unknown)}; tunable parameters are {', '.join(TUNABLE_PARAMS)}.")
+    names = sorted(grid)
+    values = [grid[name] if isinstance(grid[name], list) else [grid[name]] for name in names]
+    candidates = [dict(zip(names, combo)) for combo in itertools.product(*values)]
+    if len(candidates) > MAX_CANDIDATES:
+        raise TuningError(f"The grid has {len(candidates)} combinations; the limit is {MAX_CANDIDATES}.")
+    return candidates
+
+
+def free_port(host="127.0.0.1"):
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind((host, 0))
+        return s.getsockname()[1]
+
+
+def measure_completion(host, port, prompt, n_predict):
+    """Stream one /completion request and return TTFT, total time and llama-server's own throughput timings."""
+    conn = http.client.HTTPConnection(host, port, timeout=TUNE_REQUEST_TIMEOUT)
+    body = json.dumps({"prompt": prompt, "n_predict": n_predict, "stream": True,
+                       # Re-process the prompt every time so prompt throughput is measured, not the cache
+                       "cache_prompt": False})
+    try:
+        start = time.perf_counter()
+        conn.request("POST", "/completion", body=body, headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        if response.status != 200:
+            raise TuningError(f"/completion returned HTTP {response.status}")
+        ttft = None
+        timings = {}
+        for raw in response:
+            line = raw.decode("utf-8", errors="replace").strip()
+            if not line.startswith("data: "):
+                continue
+            payload = line[6:]
+            if payload == "[DONE]":
+                break
+            chunk = json.loads(payload)
+            if ttft is None and chunk.get("content"):
+                ttft = time.perf_counter() - start
+            if chunk.get("timings"):
+                timings = chunk["timings"]
+            if chunk.get("stop"):
+                break
+        total = time.perf_counter() - start
+    finally:
+        conn.close()
+    return {
+        "ttft_seconds": ttft if ttft is not None else total,
+        "total_seconds": total,
+        "prompt_tps": timings.get("prompt_per_second"),
+        "generation_tps": timings.get("predicted_per_second"),
+    }
+
+
+def _median(samples, key):
+    values = [sample[key] for sample in samples if sample.get(key) is not None]
+    return statistics.median(values) if values else None
+
+
+class TuningStore:
+    """Ranked tuning runs persisted per model path."""
+
+    def __init__(self, path=TUNING_RESULTS_FILE):
+        self.path = path
+        self.runs = {}
+        self.lock = threading.Lock()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.runs = json.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable tuning results {self.path}: {e}")
+
+    def record(self, model, run):
+        with self.lock:
+            history = self.runs.setdefault(model, [])
+            history.insert(0, run)
+            del history[TUNING_HISTORY:]
+            try:
+                write_json_atomic(self.path, self.runs)
+            except Exception as e:
+                logging.error(f"Failed to write tuning results {self.path}: {e}")
+
+    def for_model(self, model=None):
+        with self.lock:
+            if model is None:
+                return dict(self.runs)
+            return list(self.runs.get(model, []))
+
+
+class TuningJob:
+    """Launches every grid candidate in turn on a private instance and benchmarks it with a fixed workload."""
+
+    def __init__(self, registry, server_path, base_params, grid, workload=None, vram_bytes=None,
+                 rank_by="generation_tps"):
+        if not base_params.get("model"):
+            raise TuningError("No model specified.")
+        if rank_by not in RANK_KEYS:
+            raise TuningError(f"rank_by must be one of {', '.join(RANK_KEYS)}.")
+        workload = workload or {}
+        self.id = uuid.uuid4().hex[:8]
+        self.registry = registry
+        self.server_path = server_path
+        self.base_params = dict(base_params)
+        self.model = self.base_params["model"]
+        self.grid = grid
+        self.candidates = expand_grid(grid)
+        self.prompt = workload.get("prompt") or DEFAULT_PROMPT
+        self.n_predict = int(workload.get("n_predict") or DEFAULT_N_PREDICT)
+        self.repeats = max(1, int(workload.get("repeats") or DEFAULT_REPEATS))
+        self.vram_bytes = vram_bytes
+        self.rank_by = rank_by
+        self.state = "queued"
+        self.results = []
+        self.current = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+
+    def run(self):
+        self.state = "running"
+        try:
+            for candidate in self.candidates:
+                if self.cancel_event.is_set():
+                    break
+                self.current = candidate
+                self.results.append(self._run_candidate(candidate))
+            self.state = "cancelled" if self.cancel_event.is_set() else "done"
+        except Exception as e:
+            logging.error(f"Tuning job {self.id} failed: {e}")
+            self.state = "failed"
+            self.error = str(e)
+        finally:
+            self.current = None
+            self.finished_at = time.time()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def _run_candidate(self, candidate):
+        params = dict(self.base_params, **candidate)
+        params.update(host="127.0.0.1", port=free_port(), idle_timeout=0)
+        result = {"params": candidate, "status": "ok"}
+
+        if self.vram_bytes is not None:
+            try:
+                plan = plan_launch(params, self.vram_bytes)
+                if not plan["fits"]:
+                    result.update(status="skipped", reason=" ".join(plan["problems"]))
+                    return result
+            except PlanError as e:
+                logging.warning(f"Tuning job {self.id}: fit check unavailable: {e}")
+
+        spec = build_launch(params, self.server_path)
+        start = time.perf_counter()
+        try:
+            instance = self.registry.start(TUNE_INSTANCE, spec, internal=True)
+            if not instance.wait_ready(TUNE_LOAD_TIMEOUT):
+                result.update(status="failed", reason="llama-server exited or did not become ready")
+                return result
+            result["load_seconds"] = time.perf_counter() - start
+
+            # Untimed warm-up so the first sample does not pay for lazy initialisation
+            measure_completion("127.0.0.1", spec["port"], self.prompt, 8)
+            samples = []
+            for _ in range(self.repeats):
+                if self.cancel_event.is_set():
+                    break
+                samples.append(measure_completion("127.0.0.1", spec["port"], self.prompt, self.n_predict))
+            for key in ("prompt_tps", "generation_tps", "ttft_seconds", "total_seconds"):
+                result[key] = _median(samples, key)
+            result["samples"] = len(samples)
+        except Exception as e:
+            result.update(status="failed", reason=str(e))
+        finally:
+            self.registry.stop(TUNE_INSTANCE)
+        logging.info(f"Tuning job {self.id}: {candidate} -> {result['status']} "
+                     f"pp {result.get('prompt_tps')} tg {result.get('generation_tps')} t/s")
+        return result
+
+    def ranked(self):
+        higher_is_better = RANK_KEYS[self.rank_by]
+        scored = [r for r in self.results if r["status"] == "ok" and r.get(self.rank_by) is not None]
+        scored.sort(key=lambda r: r[self.rank_by], reverse=higher_is_better)
+        unscored = [r for r in self.results if r not in scored]
+        return [dict(r, rank=i + 1) for i, r in enumerate(scored)] + unscored
+
+    def winner_params(self, rank=1):
+        """Full launch parameters of the candidate at rank (1 = best)."""
+        ranked = [r for r in self.ranked() if r.get("rank") == rank]
+        if not ranked:
+            raise TuningError(f"No successful candidate at rank {rank}.")
+        return dict(self.base_params, **ranked[0]["params"])
+
+    def status(self):
+        return {
+            "id": self.id,
+            "model": self.model,
+            "state": self.state,
+            "error": self.error,
+            "grid": self.grid,
+            "rank_by": self.rank_by,
+            "progress": {"done": len(self.results), "total": len(self.candidates)},
+            "current": self.current,
+            "results": self.ranked(),
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class AutoTuner:
+    """Runs tuning jobs one at a time (they compete for the same hardware) and persists their rankings."""
+
+    def __init__(self, registry, store=None):
+        self.registry = registry
+        self.store = store or TuningStore()
+        self.jobs = {}
+        self.queue = []
+        self.lock = threading.Lock()
+        self.worker = None
+
+    def submit(self, job):
+        with self.lock:
+            self.jobs[job.id] = job
+            self.queue.append(job)
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(target=self._work, daemon=True)
+                self.worker.start()
+        return job
+
+    def _work(self):
+        while True:
+            with self.lock:
+                if not self.queue:
+                    self.worker = None
+                    return
+                job = self.queue.pop(0)
+            if job.cancel_event.is_set():
+                job.state = "cancelled"
+                continue
+            job.run()
+            if job.results:
+                summary = job.status()
+                summary.pop("current")
+                self.store.record(job.model, summary)
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def all(self):
+        with self.lock:
+            return list(self.jobs.values())
@@ -0,0 +1,483 @@
+import collections
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+import proxy
+from admission import AdmissionRejected
+from profiles import write_json_atomic
+
+BATCH_JOBS_FILE = "batch_jobs.json"
+CHECKPOINT_SUFFIX = ".checkpoint.json"
+DEFAULT_ENDPOINT = "/v1/chat/completions"
+# Progress is made durable at most this often
+CHECKPOINT_SECONDS = 2.0
+ROW_ATTEMPTS = 3
+RETRY_BACKOFF = 2
+ADMISSION_TIMEOUT = 600
+# How long resume waits for a stopped run's in-flight rows before refusing
+STOP_WAIT_SECONDS = 30
+# Window of the live rows/s and tokens/s rates
+RATE_WINDOW = 10.0
+
+
+class BatchError(Exception):
+    pass
+
+
+def row_request(row, default_endpoint):
+    """(custom_id, endpoint, body) of one input row: an OpenAI batch line ({custom_id, url, body}) or a bare request body."""
+    if not isinstance(row, dict):
+        raise BatchError("Row is not a JSON object.")
+    if isinstance(row.get("body"), dict):
+        endpoint = row.get("url") or default_endpoint
+        body = dict(row["body"])
+    else:
+        endpoint = default_endpoint
+        body = {k: v for k, v in row.items() if k != "custom_id"}
+    if not endpoint.startswith("/v1/"):
+        raise BatchError(f"Unsupported endpoint {endpoint}; batch rows go to /v1/ endpoints.")
+    # One JSON result per row
+    body["stream"] = False
+    return row.get("custom_id"), endpoint, body
+
+
+class _RowFailed(Exception):
+    def __init__(self, message, status=None, retryable=True):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+
+
+class BatchJob:
+    """Streams a JSONL file of requests through one instance and appends one result line per row.
+
+    Rows are read lazily and sent by as many workers as the instance has slots, at batch priority in
+    its admission queue. Results are appended in completion order, each tagged with its input line.
+    A checkpoint next to the output records how far the input is done (a byte offset, plus rows
+    finished beyond it) and how much of the output is valid, so a stopped or crashed job resumes
+    without repeating or losing rows.
+    """
+
+    def __init__(self, registry, instance_name, input_path, output_path, endpoint=DEFAULT_ENDPOINT,
+                 concurrency=None, job_id=None):
+        self.id = job_id or uuid.uuid4().hex[:8]
+        self.registry = registry
+        self.instance_name = instance_name
+        self.input_path = os.path.abspath(input_path)
+        self.output_path = os.path.abspath(output_path)
+        self.checkpoint_path = self.output_path + CHECKPOINT_SUFFIX
+        self.endpoint = endpoint
+        self.concurrency = concurrency
+        self.state = "queued"
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.counts = {"rows_done": 0, "rows_failed": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        self.recent = collections.deque()
+        self.resumed_from = None
+        self.input_size = 0
+        self.offset = 0
+        self._reader = None
+        self._output = None
+        self._next_line = 0
+        self._skip = set()
+        self._inflight = {}
+        self._completed = set()
+        self._last_checkpoint = 0.0
+        self._fatal = None
+        self._on_change = None
+        self._thread = None
+
+    def describe(self):
+        """What is needed to recreate the job after a restart."""
+        return {"id": self.id, "instance": self.instance_name, "input": self.input_path,
+                "output": self.output_path, "endpoint": self.endpoint, "concurrency": self.concurrency,
+                "state": self.state, "error": self.error, "created_at": self.created_at,
+                "finished_at": self.finished_at}
+
+    def _load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                checkpoint = json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            raise BatchError(f"Unreadable checkpoint {self.checkpoint_path}: {e}")
+        st = os.stat(self.input_path)
+        if checkpoint.get("input") != self.input_path or checkpoint.get("input_size") != st.st_size \
+                or checkpoint.get("input_mtime") != st.st_mtime:
+            raise BatchError("The input file changed since the checkpoint was written; "
+                             "delete the output and its checkpoint to start over.")
+        return checkpoint
+
+    def prepare(self, overwrite=False):
+        """Open the input and output, resuming from the checkpoint when there is one."""
+        if not os.path.isfile(self.input_path):
+            raise BatchError(f"Input file not found: {self.input_path}")
+        checkpoint = None if overwrite else self._load_checkpoint()
+        if checkpoint is None and os.path.exists(self.output_path) and not overwrite:
+            raise BatchError(f"{self.output_path} already exists without a checkpoint; pass overwrite to replace it.")
+        self.input_size = os.path.getsize(self.input_path)
+        self.offset = self._next_line = 0
+        self._skip, self._inflight, self._completed = set(), {}, set()
+        self.recent.clear()
+        self._fatal = None
+        self.stop_event.clear()
+        self._reader = open(self.input_path, "rb")
+        os.makedirs(os.path.dirname(self.output_path), exist_ok=True)
+        if checkpoint:
+            self._output = open(self.output_path, "r+b" if os.path.exists(self.output_path) else "w+b")
+            # Rows written after the last checkpoint are dropped and sent again
+            self._output.truncate(checkpoint["output_bytes"])
+            self._output.seek(checkpoint["output_bytes"])
+            self._reader.seek(checkpoint["offset"])
+            self.offset = checkpoint["offset"]
+            self._next_line = checkpoint["line"]
+            self._skip = set(checkpoint["done_after"])
+            self.counts = dict(self.counts, **checkpoint["counts"])
+            self.resumed_from = checkpoint["line"]
+        else:
+            self._output = open(self.output_path, "wb")
+            self.counts = {key: 0 for key in self.counts}
+            self._checkpoint(force=True)
+
+    def run(self):
+        self.state = "running"
+        self.started_at = time.time()
+        try:
+            instance = self.registry.get(self.instance_name)
+            if instance is None or not (instance.is_running() or instance.sleeping):
+                raise BatchError(f"Instance '{self.instance_name}' is not running.")
+            workers = max(1, int(self.concurrency or instance.spec["parallel"]))
+            threads = [threading.Thread(target=self._work, daemon=True) for _ in range(workers)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            if self._fatal:
+                raise self._fatal
+            if self.stop_event.is_set():
+                self._checkpoint(force=True)
+                self.state = "paused" if self.state == "running" else self.state
+            else:
+                self._finish()
+                self.state = "done"
+        except Exception as e:
+            logging.error(f"Batch job {self.id} failed: {e}")
+            self.error = str(e)
+            self.state = "failed"
+            if self._output:
+                self._checkpoint(force=True)
+        finally:
+            self.finished_at = time.time()
+            for f in (self._reader, self._output):
+                if f:
+                    f.close()
+            self._reader = self._output = None
+            self._changed()
+        logging.info(f"Batch job {self.id} {self.state}: {self.counts['rows_done']} rows "
+                     f"({self.counts['rows_failed']} failed)")
+
+    def _next_row(self):
+        """(line number, start offset, raw bytes) of the next row to send, or None at the end of the input."""
+        with self.lock:
+            while not self.stop_event.is_set():
+                start = self._reader.tell()
+                raw = self._reader.readline()
+                if not raw:
+                    return None
+                line = self._next_line
+                self._next_line += 1
+                self.offset = self._reader.tell()
+                if line in self._skip or not raw.strip():
+                    self._completed.add(line)
+                    continue
+                self._inflight[line] = start
+                return line, start, raw
+            return None
+
+    def _work(self):
+        while not self.stop_event.is_set():
+            row = self._next_row()
+            if row is None:
+                return
+            line, _, raw = row
+            try:
+                custom_id, endpoint, body = row_request(json.loads(raw), self.endpoint)
+            except (ValueError, BatchError) as e:
+                if not self._record(line, {"line": line, "error": {"message": f"Invalid row: {e}", "status": None}},
+                                    (0, 0)):
+                    return
+                continue
+            result = {"line": line, "custom_id": custom_id}
+            tokens = (0, 0)
+            started = time.perf_counter()
+            try:
+                response = self._send(endpoint, body)
+                result["response"] = response
+                result["seconds"] = round(time.perf_counter() - started, 3)
+                usage = response.get("usage") or {}
+                tokens = (usage.get("prompt_tokens") or 0, usage.get("completion_tokens") or 0)
+            except _RowFailed as e:
+                if self.stop_event.is_set():
+                    # Left unfinished (not written), so the row is sent again on resume
+                    return
+                result["error"] = {"message": str(e), "status": e.status}
+            except Exception as e:
+                # The instance went away (or something unexpected broke): stop the whole job, resumable
+                self._fatal = e
+                self.stop_event.set()
+                return
+            if not self._record(line, result, tokens):
+                return
+
+    def _send(self, endpoint, body):
+        data = json.dumps(body).encode("utf-8")
+        for attempt in range(ROW_ATTEMPTS):
+            try:
+                return self._send_once(endpoint, data)
+            except _RowFailed as e:
+                if not e.retryable or attempt + 1 == ROW_ATTEMPTS or self.stop_event.is_set():
+                    raise
+                logging.warning(f"Batch job {self.id}: attempt {attempt + 1} failed: {e}")
+                self.stop_event.wait(RETRY_BACKOFF * (attempt + 1))
+
+    def _send_once(self, endpoint, data):
+        instance = self.registry.get(self.instance_name)
+        if instance is None or not (instance.is_running() or instance.sleeping):
+            raise BatchError(f"Instance '{self.instance_name}' stopped.")
+        if instance.draining:
+            raise _RowFailed(f"Instance '{self.instance_name}' is draining.")
+        admission = instance.admission
+        try:
+            admission.acquire("batch", ADMISSION_TIMEOUT, cancel=self.stop_event)
+        except AdmissionRejected as e:
+            raise _RowFailed(str(e), 429)
+        inflight = None
+        try:
+            if instance.sleeping:
+                instance.wake()
+            spec, inflight = instance.checkout()
+            pool, conn, response = proxy.open_upstream(instance, "POST", endpoint, data,
+                                                       {"Content-Type": "application/json"}, None, spec)
+            payload = b"".join(proxy.relay(pool, conn, response))
+        except proxy.ProxyError as e:
+            raise _RowFailed(str(e), e.status)
+        finally:
+            if inflight:
+                inflight.done()
+            admission.release()
+            instance.touch()
+        if response.status >= 400:
+            raise _RowFailed(payload.decode("utf-8", "replace")[:500], response.status,
+                             retryable=response.status >= 500 or response.status == 429)
+        try:
+            return json.loads(payload)
+        except ValueError:
+            raise _RowFailed("llama-server returned a body that is not JSON.", response.status, retryable=False)
+
+    def _record(self, line, result, tokens):
+        """Append one result. Returns False once the job is stopping; the row stays unfinished and is sent again on resume."""
+        now = time.monotonic()
+        with self.lock:
+            if self.stop_event.is_set():
+                return False
+            self._output.write(json.dumps(result, ensure_ascii=False).encode("utf-8") + b"\n")
+            self._inflight.pop(line, None)
+            self._completed.add(line)
+            self.counts["rows_done"] += 1
+            if "error" in result:
+                self.counts["rows_failed"] += 1
+            self.counts["prompt_tokens"] += tokens[0]
+            self.counts["completion_tokens"] += tokens[1]
+            self.recent.append((now, tokens[1]))
+            while self.recent and self.recent[0][0] < now - RATE_WINDOW:
+                self.recent.popleft()
+        self._checkpoint()
+        self._changed()
+        return True
+
+    def _checkpoint(self, force=False):
+        with self.lock:
+            if not force and time.monotonic() - self._last_checkpoint < CHECKPOINT_SECONDS:
+                return
+            self._last_checkpoint = time.monotonic()
+            # Everything before the oldest unfinished row is done; finished rows after it are listed
+            if self._inflight:
+                line = min(self._inflight)
+                offset = self._inflight[line]
+            else:
+                line, offset = self._next_line, self._reader.tell()
+            self._completed = {done for done in self._completed if done >= line}
+            self._output.flush()
+            os.fsync(self._output.fileno())
+            st = os.stat(self.input_path)
+            checkpoint = {"input": self.input_path, "input_size": st.st_size, "input_mtime": st.st_mtime,
+                          "line": line, "offset": offset, "done_after": sorted(self._completed | self._skip),
+                          "output_bytes": self._output.tell(), "counts": dict(self.counts), "saved_at": time.time()}
+        try:
+            write_json_atomic(self.checkpoint_path, checkpoint)
+        except OSError as e:
+            logging.error(f"Batch job {self.id}: failed to write checkpoint: {e}")
+
+    def _finish(self):
+        with self.lock:
+            self._output.flush()
+            os.fsync(self._output.fileno())
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+    def _changed(self):
+        if self._on_change:
+            self._on_change()
+
+    def stop(self, state="paused"):
+        self.state = state
+        self.stop_event.set()
+
+    def wait_stopped(self, timeout=STOP_WAIT_SECONDS):
+        """Wait for the previous run's thread to exit. Returns False if it is still finishing rows."""
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+            return not thread.is_alive()
+        return True
+
+    def rates(self):
+        """Rows/s and generated tokens/s over the last RATE_WINDOW seconds and since the job (re)started."""
+        now = time.monotonic()
+        with self.lock:
+            recent = [entry for entry in self.recent if entry[0] >= now - RATE_WINDOW]
+        elapsed = (self.finished_at or time.time()) - self.started_at if self.started_at else 0
+        window = min(RATE_WINDOW, elapsed) if self.state == "running" else 0
+        return {
+            "rows_per_second": len(recent) / window if window else None,
+            "tokens_per_second": sum(tokens for _, tokens in recent) / window if window else None,
+            "elapsed_seconds": elapsed,
+        }
+
+    def status(self):
+        return dict(self.describe(), **self.counts, **self.rates(),
+                    input_bytes=self.input_size, input_offset=self.offset,
+                    percent=round(self.offset / self.input_size * 100, 1) if self.input_size else None,
+                    resumed_from_line=self.resumed_from, started_at=self.started_at)
+
+
+class BatchRunner:
+    """Batch jobs by id. Each job runs on its own thread; their definitions persist so interrupted jobs can resume."""
+
+    def __init__(self, registry, path=BATCH_JOBS_FILE):
+        self.registry = registry
+        self.path = path
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.cond = threading.Condition(self.lock)
+        self.version = 0
+        # Serialises resumes so two of them cannot prepare the same job at once
+        self.control = threading.Lock()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for saved in json.load(f):
+                    job = BatchJob(registry, saved["instance"], saved["input"], saved["output"],
+                                   saved["endpoint"], saved["concurrency"], saved["id"])
+                    job.created_at, job.finished_at, job.error = saved["created_at"], saved["finished_at"], saved["error"]
+                    # Jobs cut off by a restart wait for an explicit resume
+                    job.state = "interrupted" if saved["state"] in ("queued", "running") else saved["state"]
+                    job._on_change = self.notify
+                    self.jobs[job.id] = job
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable batch job list {self.path}: {e}")
+
+    def _persist(self):
+        with self.lock:
+            jobs = [job.describe() for job in self.jobs.values()]
+        try:
+            write_json_atomic(self.path, jobs)
+        except OSError as e:
+            logging.error(f"Failed to write batch job list {self.path}: {e}")
+
+    def submit(self, instance_name, input_path, output_path, endpoint=DEFAULT_ENDPOINT, concurrency=None,
+               overwrite=False):
+        job = BatchJob(self.registry, instance_name, input_path, output_path, endpoint, concurrency)
+        with self.lock:
+            for other in self.jobs.values():
+                if other.output_path == job.output_path and other.state not in ("done", "cancelled"):
+                    raise BatchError(f"Batch job {other.id} ({other.state}) owns {job.output_path}; resume it instead.")
+            previous = [other for other in self.jobs.values() if other.output_path == job.output_path]
+        # A cancelled job may still be writing its last rows to the same file
+        for other in previous:
+            if not other.wait_stopped():
+                raise BatchError(f"Batch job {other.id} is still stopping; try again shortly.")
+        job.prepare(overwrite)
+        job._on_change = self.notify
+        with self.lock:
+            self.jobs[job.id] = job
+        self._start(job)
+        return job
+
+    def _start(self, job):
+        def run():
+            job.run()
+            self._persist()
+
+        job.state = "running"
+        self._persist()
+        job._thread = threading.Thread(target=run, daemon=True)
+        job._thread.start()
+        self.notify()
+
+    def resume(self, job_id):
+        job = self.get(job_id)
+        if job is None:
+            return None
+        with self.control:
+            return self._resume(job)
+
+    def _resume(self, job):
+        if job.state == "running":
+            return job
+        if job.state == "done":
+            raise BatchError("The job already finished.")
+        # prepare() reopens and truncates the files the previous run closes on its way out
+        if not job.wait_stopped():
+            raise BatchError("The job is still finishing its in-flight rows; try again shortly.")
+        job.error = None
+        job.finished_at = None
+        job.prepare()
+        self._start(job)
+        return job
+
+    def stop(self, job_id, state="paused"):
+        job = self.get(job_id)
+        if job and job.state == "running":
+            job.stop(state)
+            self.notify()
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def all(self):
+        with self.lock:
+            return list(self.jobs.values())
+
+    def notify(self):
+        with self.cond:
+            self.version += 1
+            self.cond.notify_all()
+
+    def wait_for_change(self, version, timeout):
+        """Block until anything changes after version (or timeout). Returns the current version."""
+        with self.cond:
+            self.cond.wait_for(lambda: self.version != version, timeout)
+            return self.version
@@ -0,0 +1,379 @@
+"""Benchmarks for LlamaForge's own overhead, using benchmarks/fake_llama_server.py instead of a real model.
+
+Measures:
+  startup     time from launching an instance to its first log line on the bus, and to /health 200
+  ingestion   log lines per second through ServerInstance._read_logs (pipe read, classify, telemetry)
+  sse         publish-to-receive latency of lines streamed over /logs, per line and batched
+  scan        /scan-models cost on a large synthetic tree: cold, repeat, and after a restart
+  app         `app.py --headless` from process start to accepting connections, and its own import-to-listening time
+  sampler     CPU cost of the /proc resource sampler with ten instances running (Linux only)
+
+Usage:
+  python benchmarks/bench_overhead.py [--only startup,ingestion,sse,scan,app,sampler] [--json results.json]
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import shutil
+import socket
+import stat
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from instances import InstanceRegistry, build_launch  # noqa: E402
+from model_index import ModelIndex, ModelScanner  # noqa: E402
+from resource_sampler import ResourceSampler, proc_available  # noqa: E402
+
+STUB = os.path.join(ROOT, "benchmarks", "fake_llama_server.py")
+BENCHMARKS = ("startup", "ingestion", "sse", "scan", "app", "sampler")
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentiles(values):
+    ordered = sorted(values)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]  # noqa: E731
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "max": ordered[-1], "n": len(ordered)}
+
+
+def make_launcher(workdir):
+    """An executable 'llama-server' that runs the stub with this interpreter, as LlamaForge launches it."""
+    if platform.system() == "Windows":
+        path = os.path.join(workdir, "llama-server.cmd")
+        with open(path, "w") as f:
+            f.write(f'@"{sys.executable}" -u "{STUB}" %*\n')
+    else:
+        path = os.path.join(workdir, "llama-server")
+        with open(path, "w") as f:
+            f.write(f'#!/bin/sh\nexec "{sys.executable}" -u "{STUB}" "$@"\n')
+        os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return path
+
+
+def launch_spec(launcher, **env):
+    spec = build_launch({"model": "bench.gguf", "port": free_port()}, launcher)
+    spec["env"].update({key: str(value) for key, value in env.items()})
+    return spec
+
+
+def wait_for_line(bus, since, predicate, timeout=60):
+    """Follow the bus from since until predicate(line) matches; returns (seq, perf_counter time)."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        _, entries = bus.read_since(since, timeout=0.5)
+        for seq, line, _ in entries:
+            if predicate(line):
+                return seq, time.perf_counter()
+        if entries:
+            since = entries[-1][0]
+    raise TimeoutError("Expected log line never arrived")
+
+
+def bench_startup(launcher, repeats):
+    registry = InstanceRegistry()
+    first_line, ready = [], []
+    try:
+        for _ in range(repeats):
+            bus = registry.log_bus("bench")
+            since = bus.last_seq
+            spec = launch_spec(launcher, FAKE_LLAMA_LOAD_SECONDS=0)
+            start = time.perf_counter()
+            instance = registry.start("bench", spec)
+            _, seen = wait_for_line(bus, since, lambda line: True)
+            first_line.append(seen - start)
+            if not instance.wait_ready(30):
+                raise RuntimeError("Stub server never became ready")
+            ready.append(time.perf_counter() - start)
+            registry.stop("bench")
+    finally:
+        registry.stop_all()
+    return {"first_log_line_seconds": percentiles(first_line), "ready_seconds": percentiles(ready)}
+
+
+def bench_ingestion(launcher, lines):
+    registry = InstanceRegistry()
+    try:
+        bus = registry.log_bus("bench")
+        instance = registry.start("bench", launch_spec(launcher, FAKE_LLAMA_LOAD_SECONDS=0, FAKE_LLAMA_FLOOD_LINES=lines))
+        # The flood follows the "all slots are idle" line printed once the stub is listening
+        seq, start = wait_for_line(bus, 0, lambda line: "all slots are idle" in line)
+        target = seq + lines
+        deadline = time.monotonic() + 120
+        with bus.cond:
+            bus.cond.wait_for(lambda: bus.last_seq >= target, timeout=max(0, deadline - time.monotonic()))
+            received = bus.last_seq - seq
+        elapsed = time.perf_counter() - start
+        parsed = instance.telemetry.counters["requests_total"] if instance.telemetry else 0
+    finally:
+        registry.stop_all()
+    return {"lines": received, "seconds": elapsed, "lines_per_second": received / elapsed,
+            "requests_parsed": parsed}
+
+
+def _read_sse(response, expected, batch, latencies):
+    """Collect publish-to-receive latencies from a /logs stream until expected bench lines arrive."""
+    data = []
+    while len(latencies) < expected:
+        raw = response.readline()
+        if not raw:
+            break
+        line = raw.decode("utf-8").rstrip("\n")
+        if line.startswith("data: "):
+            data.append(line[6:])
+            continue
+        if line or not data:
+            continue
+        received = time.perf_counter_ns()
+        payload = "\n".join(data)
+        data = []
+        texts = [text for _, text in json.loads(payload)] if batch else [payload.split("|", 1)[-1]]
+        for text in texts:
+            if text.startswith("bench "):
+                latencies.append((received - int(text.split()[2])) / 1e9)
+
+
+def bench_sse(lines, rate):
+    try:
+        import app as llamaforge
+        from werkzeug.serving import make_server
+    except Exception as e:
+        # app.py pulls in the tray/GUI stack, which may be unavailable (e.g. headless CI)
+        return {"skipped": f"cannot import app: {e}"}
+
+    server = make_server("127.0.0.1", 0, llamaforge.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    results = {}
+    try:
+        for mode, batch in (("per_line", False), ("batched", True)):
+            name = f"bench-sse-{mode}"
+            bus = llamaforge.instances.log_bus(name)
+            conn = http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=30)
+            query = f"/logs?instance={name}&since={bus.last_seq}" + ("&batch=1" if batch else "")
+            conn.request("GET", query)
+            response = conn.getresponse()
+            response.readline()  # retry: directive
+            latencies = []
+            reader = threading.Thread(target=_read_sse, args=(response, lines, batch, latencies), daemon=True)
+            reader.start()
+
+            start = time.perf_counter()
+            burst = max(1, rate // 100)
+            for i in range(0, lines, burst):
+                for j in range(i, min(lines, i + burst)):
+                    bus.publish(f"bench {j} {time.perf_counter_ns()} eval time = 1.00 ms /  1 tokens")
+                time.sleep(0.01)
+            reader.join(timeout=30)
+            elapsed = time.perf_counter() - start
+            conn.close()
+            results[mode] = {"lines": len(latencies), "lines_per_second": len(latencies) / elapsed,
+                             "latency_seconds": percentiles(latencies) if latencies else None}
+    finally:
+        server.shutdown()
+    return results
+
+
+def write_gguf(path, name, layers=32):
+    """Smallest GGUF the index will summarize: a few metadata keys and no tensors."""
+    def string(value):
+        data = value.encode("utf-8")
+        return struct.pack("<Q", len(data)) + data
+
+    kvs = [
+        string("general.architecture") + struct.pack("<I", 8) + string("llama"),
+        string("general.name") + struct.pack("<I", 8) + string(name),
+        string("general.file_type") + struct.pack("<I", 4) + struct.pack("<I", 15),
+        string("llama.block_count") + struct.pack("<I", 4) + struct.pack("<I", layers),
+        string("llama.context_length") + struct.pack("<I", 4) + struct.pack("<I", 8192),
+    ]
+    with open(path, "wb") as f:
+        f.write(b"GGUF" + struct.pack("<IQQ", 3, 0, len(kvs)) + b"".join(kvs))
+
+
+def bench_scan(workdir, dirs, files_per_dir, models_per_dir):
+    root = os.path.join(workdir, "models")
+    for d in range(dirs):
+        folder = os.path.join(root, f"org{d % 20}", f"repo{d}")
+        os.makedirs(folder, exist_ok=True)
+        for i in range(files_per_dir):
+            if i < models_per_dir:
+                write_gguf(os.path.join(folder, f"model-{d}-{i}.Q4_K_M.gguf"), f"model {d}/{i}")
+            else:
+                with open(os.path.join(folder, f"README-{i}.md"), "w") as f:
+                    f.write("not a model\n")
+
+    index_file = os.path.join(workdir, "model_index.json")
+    index = ModelIndex(cache_file=index_file)
+    scanner = ModelScanner(index)
+
+    start = time.perf_counter()
+    models = scanner.scan(root)
+    cold = time.perf_counter() - start
+    index.save()
+
+    start = time.perf_counter()
+    scanner.scan(root)
+    repeat = time.perf_counter() - start
+
+    # A fresh process: header cache loaded from disk, no directory snapshot
+    start = time.perf_counter()
+    ModelScanner(ModelIndex(cache_file=index_file)).scan(root)
+    restart = time.perf_counter() - start
+
+    return {"directories": dirs, "files": dirs * files_per_dir, "models": len(models),
+            "cold_seconds": cold, "repeat_seconds": repeat, "restart_seconds": restart,
+            "cold_models_per_second": len(models) / cold}
+
+
+def bench_app(workdir, repeats):
+    """Launch app.py --headless repeatedly; app.log and other state files go to a scratch directory."""
+    cwd = os.path.join(workdir, "app")
+    os.makedirs(cwd, exist_ok=True)
+    listening, reported = [], []
+    for _ in range(repeats):
+        port = free_port()
+        start = time.perf_counter()
+        process = subprocess.Popen([sys.executable, os.path.join(ROOT, "app.py"), "--headless", "--port", str(port)],
+                                   cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            deadline = time.monotonic() + 60
+            while True:
+                if process.poll() is not None:
+                    raise RuntimeError(f"app.py exited with code {process.returncode}")
+                try:
+                    socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+                    break
+                except OSError:
+                    if time.monotonic() > deadline:
+                        raise TimeoutError("app.py never started listening")
+                    time.sleep(0.005)
+            listening.append(time.perf_counter() - start)
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=10) as resp:
+                for line in resp.read().decode("utf-8").splitlines():
+                    if line.startswith("llamaforge_startup_seconds "):
+                        reported.append(float(line.split()[1]))
+        finally:
+            process.terminate()
+            process.wait(10)
+    return {"listening_seconds": percentiles(listening),
+            "import_to_listening_seconds": percentiles(reported) if reported else None}
+
+
+def bench_sampler(launcher, instances, interval, seconds):
+    if not proc_available():
+        return {"skipped": "no /proc on this platform"}
+    registry = InstanceRegistry()
+    try:
+        for i in range(instances):
+            registry.start(f"bench{i}", launch_spec(launcher, FAKE_LLAMA_LOAD_SECONDS=0))
+        sampler = ResourceSampler(registry, interval)
+        sampler.start()
+        time.sleep(seconds)
+        overhead = sampler.overhead()
+        samples = sum(len(entry["samples"]) for entry in sampler.status()["instances"])
+    finally:
+        registry.stop_all()
+    return {"instances": instances, "interval": interval, "seconds": seconds, "samples": samples,
+            "cpu_percent_of_one_core": overhead["cpu_percent_of_one_core"],
+            "cpu_ms_per_pass": overhead["cpu_seconds"] / overhead["samples"] * 1000 if overhead["samples"] else None}
+
+
+def report(results):
+    def ms(value):
+        return f"{value * 1000:8.2f} ms"
+
+    if "startup" in results:
+        r = results["startup"]
+        print(f"startup    first log line  p50 {ms(r['first_log_line_seconds']['p50'])}  "
+              f"p95 {ms(r['first_log_line_seconds']['p95'])}")
+        print(f"           ready           p50 {ms(r['ready_seconds']['p50'])}  p95 {ms(r['ready_seconds']['p95'])}")
+    if "ingestion" in results:
+        r = results["ingestion"]
+        print(f"ingestion  {r['lines']} lines in {r['seconds']:.2f}s  -> {r['lines_per_second']:,.0f} lines/s "
+              f"({r['requests_parsed']} request timings parsed)")
+    if "sse" in results:
+        r = results["sse"]
+        if "skipped" in r:
+            print(f"sse        skipped: {r['skipped']}")
+        for mode in ("per_line", "batched"):
+            if mode in r and r[mode]["latency_seconds"]:
+                lat = r[mode]["latency_seconds"]
+                print(f"sse        {mode:9s} {r[mode]['lines']} lines  p50 {ms(lat['p50'])}  p95 {ms(lat['p95'])}  "
+                      f"p99 {ms(lat['p99'])}")
+    if "scan" in results:
+        r = results["scan"]
+        print(f"scan       {r['files']} files / {r['models']} models  cold {ms(r['cold_seconds'])}  "
+              f"repeat {ms(r['repeat_seconds'])}  restart {ms(r['restart_seconds'])}")
+    if "app" in results:
+        r = results["app"]
+        print(f"app        process to listening p50 {ms(r['listening_seconds']['p50'])}  "
+              f"p95 {ms(r['listening_seconds']['p95'])}")
+        if r["import_to_listening_seconds"]:
+            print(f"           import to listening  p50 {ms(r['import_to_listening_seconds']['p50'])}")
+    if "sampler" in results:
+        r = results["sampler"]
+        if "skipped" in r:
+            print(f"sampler    skipped: {r['skipped']}")
+        else:
+            print(f"sampler    {r['instances']} instances every {r['interval']}s: {r['cpu_percent_of_one_core']:.3f}% "
+                  f"of one core, {r['cpu_ms_per_pass']:.2f} ms CPU per pass ({r['samples']} samples)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", default=",".join(BENCHMARKS), help="comma-separated benchmarks to run")
+    parser.add_argument("--repeats", type=int, default=10, help="startup launches (instances, and app.py for 'app')")
+    parser.add_argument("--lines", type=int, default=200000, help="log lines for the ingestion benchmark")
+    parser.add_argument("--sse-lines", type=int, default=5000)
+    parser.add_argument("--sse-rate", type=int, default=2000, help="lines per second published during the SSE benchmark")
+    parser.add_argument("--scan-dirs", type=int, default=500)
+    parser.add_argument("--scan-files", type=int, default=10, help="files per directory")
+    parser.add_argument("--scan-models", type=int, default=2, help="GGUF files per directory")
+    parser.add_argument("--sampler-instances", type=int, default=10)
+    parser.add_argument("--sampler-interval", type=float, default=1.0, help="seconds between resource samples")
+    parser.add_argument("--sampler-seconds", type=float, default=20)
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+
+    selected = [name.strip() for name in args.only.split(",") if name.strip()]
+    workdir = tempfile.mkdtemp(prefix="llamaforge-bench-")
+    results = {}
+    try:
+        launcher = make_launcher(workdir)
+        if "startup" in selected:
+            results["startup"] = bench_startup(launcher, args.repeats)
+        if "ingestion" in selected:
+            results["ingestion"] = bench_ingestion(launcher, args.lines)
+        if "sse" in selected:
+            results["sse"] = bench_sse(args.sse_lines, args.sse_rate)
+        if "scan" in selected:
+            results["scan"] = bench_scan(workdir, args.scan_dirs, args.scan_files, args.scan_models)
+        if "app" in selected:
+            results["app"] = bench_app(workdir, args.repeats)
+        if "sampler" in selected:
+            results["sampler"] = bench_sampler(launcher, args.sampler_instances, args.sampler_interval,
+                                               args.sampler_seconds)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
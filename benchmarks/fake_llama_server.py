@@ -0,0 +1,313 @@
+"""Stand-in llama-server for benchmarking LlamaForge without a model or a GPU.
+
+Accepts (and mostly ignores) llama-server's command line. On start it replays the load log from
+In-App-log.txt, answers /health with 503 until "loaded", then serves /health, /metrics, /slots,
+/v1/models and completion requests, printing llama-server style request logs for each one. With
+--slot-save-path it also answers POST /slots/<id>?action=save|restore like llama-server does.
+
+Behaviour is tuned with environment variables:
+  FAKE_LLAMA_LOAD_SECONDS   time spent "loading the model" before /health turns 200 (default 0.2)
+  FAKE_LLAMA_FLOOD_LINES    extra request-log lines printed right after loading, for ingestion benchmarks
+  FAKE_LLAMA_TOKENS         tokens generated per completion (default 16)
+  FAKE_LLAMA_TOKEN_SECONDS  delay between streamed tokens (default 0)
+  FAKE_LLAMA_HELP           "legacy" prints the --help of an older build (-fa as a switch, --draft,
+                            no --kv-unified or --swa-full)
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+SAMPLE_LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "In-App-log.txt")
+# The sample log holds a failed launch first; the successful load starts at its second backend probe
+SAMPLE_LOG_START = 16
+
+DEVICES = "Available devices:\n  ROCm0: AMD Radeon RX 6800 XT (16368 MiB, 16226 MiB free)\n"
+
+# The options LlamaForge uses, as a recent llama-server lists them in --help
+HELP = """----- common params -----
+
+-h,    --help, --usage                  print usage and exit
+--version                               show version and build info
+-t,    --threads N                      number of CPU threads to use during generation (default: -1)
+                                        (env: LLAMA_ARG_THREADS)
+-c,    --ctx-size N                     size of the prompt context (default: 4096, 0 = loaded from model)
+                                        (env: LLAMA_ARG_CTX_SIZE)
+-b,    --batch-size N                   logical maximum batch size (default: 2048)
+                                        (env: LLAMA_ARG_BATCH)
+-fa,   --flash-attn [on|off|auto]       set Flash Attention use ('on', 'off', or 'auto', default: 'auto')
+                                        (env: LLAMA_ARG_FLASH_ATTN)
+--rope-freq-base N                      RoPE base frequency, used by NTK-aware scaling (default: loaded from model)
+--rope-freq-scale N                     RoPE frequency scaling factor, expands context by a factor of 1/N
+-kvu,  --kv-unified                     use single unified KV buffer for the KV cache of all sequences
+                                        (env: LLAMA_ARG_KV_UNIFIED)
+--swa-full                              use full-size SWA cache (default: false)
+-ctk,  --cache-type-k TYPE              KV cache data type for K
+                                        allowed values: f32, f16, bf16, q8_0, q4_0, q4_1, iq4_nl, q5_0, q5_1
+                                        (default: f16)
+-ctv,  --cache-type-v TYPE              KV cache data type for V
+                                        allowed values: f32, f16, bf16, q8_0, q4_0, q4_1, iq4_nl, q5_0, q5_1
+                                        (default: f16)
+-np,   --parallel N                     number of parallel sequences to decode (default: 1)
+-cb,   --cont-batching                  enable continuous batching (a.k.a dynamic batching) (default: enabled)
+-nocb, --no-cont-batching               disable continuous batching
+--mlock                                 force system to keep model in RAM rather than swapping or compressing
+--no-mmap                               do not memory-map model (slower load but may reduce pageouts if not using mlock)
+--list-devices                          print list of available devices and exit
+-ngl,  --gpu-layers, --n-gpu-layers N   max. number of layers to store in VRAM (default: -1)
+-sm,   --split-mode {none,layer,row}    how to split the model across multiple GPUs, one of:
+                                        - none: use one GPU only
+                                        - layer (default): split layers and KV across GPUs
+                                        - row: split rows across GPUs
+-m,    --model FNAME                    model path to load
+-hf,   -hfr, --hf-repo <user>/<model>[:quant]
+                                        Hugging Face model repository
+--temp N                                temperature (default: 0.8)
+--top-k N                               top-k sampling (default: 40, 0 = disabled)
+--top-p N                               top-p sampling (default: 0.9, 1.0 = disabled)
+--min-p N                               min-p sampling (default: 0.1, 0.0 = disabled)
+--repeat-penalty N                      penalize repeat sequence of tokens (default: 1.0, 1.0 = disabled)
+
+----- example-specific params -----
+
+--host HOST                             ip address to listen, or bind to an UNIX socket (default: 127.0.0.1)
+--port PORT                             port to listen (default: 8080)
+--metrics                               enable prometheus compatible metrics endpoint (default: disabled)
+--slot-save-path PATH                   path to save slot kv cache (default: disabled)
+--jinja                                 use jinja template for chat (default: disabled)
+-md,   --model-draft FNAME              draft model for speculative decoding (default: unused)
+--draft-max, --draft, --draft-n N       number of tokens to draft for speculative decoding (default: 16)
+--draft-min, --draft-n-min N            minimum number of draft tokens to use for speculative decoding (default: 0)
+--draft-p-min P                         minimum speculative decoding probability (greedy) (default: 0.8)
+-cd,   --ctx-size-draft N               size of the prompt context for the draft model (default: 0)
+-ngld, --gpu-layers-draft, --n-gpu-layers-draft N
+                                        number of layers to store in VRAM for the draft model
+"""
+
+# The same options as an older build printed them
+LEGACY_HELP = (HELP
+               .replace("-fa,   --flash-attn [on|off|auto]       set Flash Attention use ('on', 'off', or 'auto', default: 'auto')",
+                        "-fa,   --flash-attn                     enable Flash Attention (default: disabled)")
+               .replace("--draft-max, --draft, --draft-n N", "--draft N                        ")
+               .replace("-kvu,  --kv-unified", "").replace("--swa-full", ""))
+
+task_ids = itertools.count(1)
+stdout_lock = threading.Lock()
+
+
+def emit(lines):
+    with stdout_lock:
+        sys.stdout.write("".join(line + "\n" for line in lines))
+        sys.stdout.flush()
+
+
+def request_log(slot, task, prompt_tokens, generated, prompt_ms, eval_ms):
+    """The lines llama-server prints for one completed request."""
+    total = prompt_tokens + generated
+    return [
+        f"slot launch_slot_: id  {slot} | task {task} | processing task",
+        f"slot update_slots: id  {slot} | task {task} | new prompt, n_ctx_slot = 4096, n_keep = 0, "
+        f"n_prompt_tokens = {prompt_tokens}",
+        f"slot update_slots: id  {slot} | task {task} | prompt done, n_past = {prompt_tokens}, n_tokens = {prompt_tokens}",
+        f"slot print_timing: id  {slot} | task {task} | ",
+        f"prompt eval time = {prompt_ms:10.2f} ms / {prompt_tokens:5d} tokens "
+        f"({prompt_ms / prompt_tokens:8.2f} ms per token, {prompt_tokens / prompt_ms * 1000:8.2f} tokens per second)",
+        f"       eval time = {eval_ms:10.2f} ms / {generated:5d} tokens "
+        f"({eval_ms / generated:8.2f} ms per token, {generated / eval_ms * 1000:8.2f} tokens per second)",
+        f"      total time = {prompt_ms + eval_ms:10.2f} ms / {total:5d} tokens",
+        f"slot      release: id  {slot} | task {task} | stop processing: n_past = {total - 1}, truncated = 0",
+        "srv  update_slots: all slots are idle",
+    ]
+
+
+def flood(count):
+    """Print count lines of request logs in bulk, as a busy server would."""
+    block = []
+    while count > 0:
+        task = next(task_ids)
+        lines = request_log(task % 4, task, 52, 128, 35.1, 1234.5)[:count]
+        block.extend(lines)
+        count -= len(lines)
+        if len(block) >= 1000:
+            emit(block)
+            block = []
+    if block:
+        emit(block)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    ready = threading.Event()
+    options = None
+    # Tokens held in each slot's KV cache, as llama-server's n_past
+    slot_tokens = {}
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, content_type="application/json"):
+        data = body.encode() if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == "/health":
+            if self.ready.is_set():
+                return self._send(200, '{"status":"ok"}')
+            return self._send(503, '{"error":{"code":503,"message":"Loading model","type":"unavailable_error"}}')
+        if self.path == "/metrics":
+            return self._send(200, "llamacpp:prompt_tokens_total 0\nllamacpp:tokens_predicted_total 0\n"
+                                   "llamacpp:requests_processing 0\n", "text/plain")
+        if self.path == "/slots":
+            return self._send(200, json.dumps([{"id": i, "is_processing": False, "n_past": self.slot_tokens.get(i, 0)}
+                                               for i in range(self.options.np)]))
+        if self.path == "/v1/models":
+            return self._send(200, json.dumps({"object": "list", "data": [{"id": self.options.m, "object": "model"}]}))
+        self._send(404, '{"error":"not found"}')
+
+    def _slot_action(self, slot, action, filename):
+        if not self.options.slot_save_path:
+            return self._send(501, '{"error":{"code":501,"message":"This server does not support slots action."}}')
+        path = os.path.join(self.options.slot_save_path, os.path.basename(filename))
+        start = time.perf_counter()
+        if action == "save":
+            tokens = self.slot_tokens.get(slot, 0)
+            # Like llama-server, the save path must already exist
+            try:
+                with open(path, "wb") as f:
+                    f.write(tokens.to_bytes(4, "little") + b"\0" * (tokens * 64))
+            except OSError:
+                return self._send(500, '{"error":{"code":500,"message":"failed to save slot"}}')
+            return self._send(200, json.dumps({"id_slot": slot, "filename": filename, "n_saved": tokens,
+                                               "n_written": 4 + tokens * 64,
+                                               "timings": {"save_ms": (time.perf_counter() - start) * 1000}}))
+        if action == "restore":
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+            except OSError:
+                return self._send(400, '{"error":{"code":400,"message":"failed to restore slot"}}')
+            self.slot_tokens[slot] = int.from_bytes(data[:4], "little")
+            return self._send(200, json.dumps({"id_slot": slot, "filename": filename,
+                                               "n_restored": self.slot_tokens[slot], "n_read": len(data),
+                                               "timings": {"restore_ms": (time.perf_counter() - start) * 1000}}))
+        self._send(400, '{"error":{"code":400,"message":"Invalid action"}}')
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if not self.ready.is_set():
+            return self._send(503, '{"error":{"code":503,"message":"Loading model","type":"unavailable_error"}}')
+        if self.path.startswith("/slots/"):
+            slot, _, query = self.path[len("/slots/"):].partition("?action=")
+            return self._slot_action(int(slot), query, body.get("filename", ""))
+
+        tokens = int(body.get("n_predict") or body.get("max_tokens") or os.environ.get("FAKE_LLAMA_TOKENS", 16))
+        token_delay = float(os.environ.get("FAKE_LLAMA_TOKEN_SECONDS", 0))
+        task = next(task_ids)
+        start = time.perf_counter()
+        chat = self.path.endswith("/chat/completions")
+        native = self.path == "/completion"
+
+        def piece(text, final=False):
+            if native:
+                payload = {"content": text, "stop": final}
+            elif chat:
+                payload = {"choices": [{"index": 0, "delta": {"content": text}, "finish_reason": "stop" if final else None}]}
+            else:
+                payload = {"choices": [{"index": 0, "text": text, "finish_reason": "stop" if final else None}]}
+            return payload
+
+        timings = {"prompt_per_second": 1480.0, "predicted_per_second": 100.0}
+        if body.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for i in range(tokens):
+                self._chunk(f"data: {json.dumps(piece(f'tok{i} '))}\n\n".encode())
+                if token_delay:
+                    time.sleep(token_delay)
+            final = dict(piece("", True), timings=timings)
+            self._chunk(f"data: {json.dumps(final)}\n\n".encode())
+            if not native:
+                self._chunk(b"data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        else:
+            if token_delay:
+                time.sleep(token_delay * tokens)
+            text = " ".join(f"tok{i}" for i in range(tokens))
+            if native:
+                payload = {"content": text, "stop": True, "timings": timings}
+            else:
+                message = {"message": {"role": "assistant", "content": text}} if chat else {"text": text}
+                payload = {"object": "chat.completion" if chat else "text_completion", "model": body.get("model"),
+                           "choices": [dict(message, index=0, finish_reason="stop")],
+                           "usage": {"prompt_tokens": 52, "completion_tokens": tokens, "total_tokens": 52 + tokens},
+                           "timings": timings}
+            self._send(200, json.dumps(payload))
+
+        self.slot_tokens[0] = 52 + tokens
+        elapsed_ms = max((time.perf_counter() - start) * 1000, 0.01)
+        lines = request_log(0, task, 52, max(tokens, 1), 35.1, elapsed_ms)
+        if self.options.md:
+            # Printed after the timings when a draft model is loaded
+            drafted = max(tokens, 1)
+            accepted = drafted * 3 // 4
+            lines.insert(-2, f"draft acceptance rate = {accepted / drafted:0.5f} ({accepted:5d} accepted / {drafted:5d} generated)")
+        emit(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--list-devices", action="store_true")
+    parser.add_argument("-h", "--help", action="store_true")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("-m", "--model", dest="m", default="model.gguf")
+    parser.add_argument("-np", "--parallel", dest="np", type=int, default=1)
+    parser.add_argument("--slot-save-path", default=None)
+    parser.add_argument("-md", "--model-draft", dest="md", default=None)
+    options, _ = parser.parse_known_args()
+
+    if options.list_devices:
+        sys.stdout.write(DEVICES)
+        return
+    if options.help:
+        sys.stdout.write(LEGACY_HELP if os.environ.get("FAKE_LLAMA_HELP") == "legacy" else HELP)
+        return
+
+    Handler.options = options
+    server = ThreadingHTTPServer((options.host, options.port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    try:
+        with open(SAMPLE_LOG, "r", encoding="utf-8", errors="replace") as f:
+            load_log = f.read().splitlines()[SAMPLE_LOG_START:]
+    except OSError:
+        load_log = ["main: loading model"]
+    emit(load_log)
+    time.sleep(float(os.environ.get("FAKE_LLAMA_LOAD_SECONDS", 0.2)))
+    Handler.ready.set()
+    emit([f"main: server is listening on http://{options.host}:{options.port} - starting the main loop",
+          "srv  update_slots: all slots are idle"])
+
+    flood(int(os.environ.get("FAKE_LLAMA_FLOOD_LINES", 0)))
+    while True:
+        time.sleep(3600)
+
+
+if __name__ == "__main__":
+    main()
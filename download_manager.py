@@ -0,0 +1,569 @@
+import collections
+import hashlib
+import http.client
+import json
+import logging
+import os
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+
+from profiles import write_json_atomic
+
+HF_ENDPOINT = os.environ.get("HF_ENDPOINT", "https://huggingface.co")
+
+DEFAULT_MAX_ACTIVE = 2
+DEFAULT_CONNECTIONS = 4
+MAX_CONNECTIONS = 16
+
+# Files are split into about four segments per connection, within these bounds
+MIN_SEGMENT_SIZE = 1024 * 1024
+MAX_SEGMENT_SIZE = 64 * 1024 * 1024
+READ_CHUNK = 1024 * 1024
+HASH_CHUNK = 4 * 1024 * 1024
+
+REQUEST_TIMEOUT = 30
+MAX_REDIRECTS = 10
+SEGMENT_RETRIES = 5
+RETRY_BACKOFF = 2.0
+STATE_SAVE_INTERVAL = 2.0
+PROGRESS_INTERVAL = 0.5
+SPEED_WINDOW = 5.0
+
+PART_SUFFIX = ".part"
+STATE_SUFFIX = ".part.json"
+
+ACTIVE_STATES = ("queued", "downloading", "verifying")
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+
+class DownloadError(Exception):
+    pass
+
+
+def hf_url(repo_id, filename, revision="main"):
+    quote = urllib.parse.quote
+    return f"{HF_ENDPOINT}/{repo_id}/resolve/{quote(revision, safe='')}/{quote(filename)}"
+
+
+def hf_token():
+    """HF_TOKEN, or the token saved by `huggingface-cli login` when huggingface_hub is installed."""
+    token = os.environ.get("HF_TOKEN")
+    if token:
+        return token
+    try:
+        from huggingface_hub import get_token
+        return get_token()
+    except Exception:
+        return None
+
+
+def _same_host(a, b):
+    return urllib.parse.urlsplit(a).netloc == urllib.parse.urlsplit(b).netloc
+
+
+def probe(url, headers=None):
+    """HEAD url, following redirects by hand so Hugging Face's X-Linked-* headers on the redirect are kept.
+
+    Returns the final URL, size, whether byte ranges are accepted, the validator (ETag / Last-Modified)
+    and, for Hugging Face LFS files, the expected sha256.
+    """
+    headers = headers or {}
+    origin = url
+    info = {"url": url, "size": None, "ranges": False, "validator": None, "sha256": None}
+    for _ in range(MAX_REDIRECTS):
+        parts = urllib.parse.urlsplit(url)
+        conn_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        conn = conn_class(parts.netloc, timeout=REQUEST_TIMEOUT)
+        target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        try:
+            # Credentials only go to the host they were meant for, not to a CDN it redirects to
+            conn.request("HEAD", target, headers=headers if _same_host(url, origin) else {})
+            resp = conn.getresponse()
+            resp.read()
+        except OSError as e:
+            raise DownloadError(f"Cannot reach {parts.netloc}: {e}")
+        finally:
+            conn.close()
+
+        linked_etag = (resp.getheader("X-Linked-Etag") or "").strip('"').lower()
+        if len(linked_etag) == 64 and all(c in "0123456789abcdef" for c in linked_etag):
+            info["sha256"] = linked_etag
+        if resp.getheader("X-Linked-Size"):
+            info["size"] = int(resp.getheader("X-Linked-Size"))
+
+        if resp.status in REDIRECT_CODES:
+            url = urllib.parse.urljoin(url, resp.getheader("Location"))
+            continue
+        if resp.status == 401 or resp.status == 403:
+            raise DownloadError(f"Access denied ({resp.status}); gated repositories need HF_TOKEN.")
+        if resp.status >= 400:
+            raise DownloadError(f"{parts.netloc} answered HTTP {resp.status}.")
+        if info["size"] is None and resp.getheader("Content-Length"):
+            info["size"] = int(resp.getheader("Content-Length"))
+        info["url"] = url
+        info["ranges"] = "bytes" in (resp.getheader("Accept-Ranges") or "").lower()
+        info["validator"] = resp.getheader("ETag") or resp.getheader("Last-Modified")
+        return info
+    raise DownloadError(f"Too many redirects for {origin}.")
+
+
+def plan_segments(size, connections):
+    """Split size bytes into [start, end, done] segments small enough to keep every connection busy."""
+    segment = min(MAX_SEGMENT_SIZE, max(MIN_SEGMENT_SIZE, size // (connections * 4) or 1))
+    return [[start, min(start + segment, size), 0] for start in range(0, size, segment)] or [[0, 0, 0]]
+
+
+class DownloadJob:
+    """One file fetched into <dest>.part with parallel range requests, hashed in order as bytes land.
+
+    Progress per segment is saved to <dest>.part.json, so a paused, failed or interrupted job continues
+    where it stopped as long as the remote file is unchanged.
+    """
+
+    def __init__(self, source, dest, connections=DEFAULT_CONNECTIONS, sha256=None, headers=None,
+                 repo_id=None, filename=None):
+        self.id = uuid.uuid4().hex[:8]
+        self.source = source
+        self.dest = dest
+        self.part_path = dest + PART_SUFFIX
+        self.state_path = dest + STATE_SUFFIX
+        self.connections = max(1, min(int(connections), MAX_CONNECTIONS))
+        self.expected_sha256 = sha256.lower() if sha256 else None
+        self.headers = headers or {}
+        self.repo_id = repo_id
+        self.filename = filename or os.path.basename(dest)
+        self.state = "queued"
+        self.error = None
+        self.size = None
+        self.segments = []
+        self.bytes_done = 0
+        self.resumed_bytes = 0
+        self.hashed_bytes = 0
+        self.sha256 = None
+        self.verified = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.lock = threading.Lock()
+        self.cond = threading.Condition(self.lock)
+        self.stop_event = threading.Event()
+        self.stop_reason = None
+        self.samples = collections.deque()
+        self.on_progress = None
+        self._last_progress = 0.0
+        self._last_save = 0.0
+        self._save_lock = threading.Lock()
+        self._url = source
+        self._failures = []
+
+    def stop(self, reason):
+        """Ask a running job to stop; reason is "paused" or "cancelled"."""
+        self.stop_reason = reason
+        self.stop_event.set()
+        with self.cond:
+            self.cond.notify_all()
+
+    def _notify(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_progress < PROGRESS_INTERVAL:
+            return
+        self._last_progress = now
+        if self.on_progress:
+            self.on_progress()
+
+    def _set_state(self, state, error=None):
+        self.state = state
+        self.error = error
+        self._notify(force=True)
+
+    def _load_state(self, info):
+        """Segments saved by an earlier attempt, if they describe the same remote file."""
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return None
+        same_file = (saved.get("source") == self.source and saved.get("size") == info["size"]
+                     and saved.get("validator") == info["validator"]
+                     and os.path.exists(self.part_path) and os.path.getsize(self.part_path) == info["size"])
+        if not same_file:
+            logging.info(f"Download {self.id}: remote file changed or partial data missing, starting over")
+            return None
+        return [list(segment) for segment in saved["segments"]]
+
+    def _save_state(self, info, force=False):
+        if not force and time.monotonic() - self._last_save < STATE_SAVE_INTERVAL:
+            return
+        # Workers share one temp file, so only one of them writes at a time
+        if not self._save_lock.acquire(blocking=force):
+            return
+        try:
+            self._last_save = time.monotonic()
+            with self.lock:
+                segments = [list(segment) for segment in self.segments]
+            write_json_atomic(self.state_path, {"source": self.source, "size": info["size"],
+                                                "validator": info["validator"], "segments": segments})
+        except OSError as e:
+            logging.warning(f"Download {self.id}: cannot save resume state: {e}")
+        finally:
+            self._save_lock.release()
+
+    def _discard_partial(self):
+        for path in (self.part_path, self.state_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def run(self):
+        self.stop_event.clear()
+        self.stop_reason = None
+        self.started_at = time.time()
+        self.finished_at = None
+        self._failures = []
+        self._set_state("downloading")
+        try:
+            info = probe(self.source, self.headers)
+            self._url = info["url"]
+            self.expected_sha256 = self.expected_sha256 or info["sha256"]
+            self._prepare(info)
+            self._transfer(info)
+            if self.stop_event.is_set():
+                if self.stop_reason == "cancelled":
+                    self._discard_partial()
+                else:
+                    self._save_state(info, force=True)
+                self._set_state(self.stop_reason)
+                return
+            if self._failures:
+                self._save_state(info, force=True)
+                raise DownloadError(self._failures[0])
+            self._finish()
+        except Exception as e:
+            logging.error(f"Download {self.id} ({self.filename}) failed: {e}")
+            self._set_state("failed", str(e))
+        finally:
+            self.finished_at = time.time()
+
+    def _prepare(self, info):
+        os.makedirs(os.path.dirname(self.dest) or ".", exist_ok=True)
+        resumable = info["ranges"] and info["size"] is not None
+        segments = self._load_state(info) if resumable else None
+        if segments is None:
+            self._discard_partial()
+            if resumable:
+                segments = plan_segments(info["size"], self.connections)
+            else:
+                # No ranges or unknown length: one plain stream that restarts from zero
+                segments = [[0, info["size"], 0]]
+            with open(self.part_path, "wb") as f:
+                if info["size"]:
+                    f.truncate(info["size"])
+        with self.lock:
+            self.size = info["size"]
+            self.segments = segments
+            self.bytes_done = self.resumed_bytes = sum(segment[2] for segment in segments)
+            self.hashed_bytes = 0
+            self.samples.clear()
+            self.samples.append((time.monotonic(), self.bytes_done))
+        if self.resumed_bytes:
+            logging.info(f"Download {self.id}: resuming {self.filename} at {self.resumed_bytes} bytes")
+
+    def _transfer(self, info):
+        pending = collections.deque(i for i, segment in enumerate(self.segments)
+                                    if segment[1] is None or segment[2] < segment[1] - segment[0])
+        workers = [threading.Thread(target=self._segment_worker, args=(pending, info), daemon=True)
+                   for _ in range(min(self.connections, len(pending)))]
+        hasher = threading.Thread(target=self._hash_worker, daemon=True)
+        hasher.start()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        with self.cond:
+            self.cond.notify_all()
+        hasher.join()
+
+    def _segment_worker(self, pending, info):
+        while not self.stop_event.is_set() and not self._failures:
+            with self.lock:
+                if not pending:
+                    return
+                index = pending.popleft()
+            for attempt in range(SEGMENT_RETRIES):
+                try:
+                    self._fetch_segment(index, info)
+                    break
+                except (OSError, http.client.HTTPException, DownloadError) as e:
+                    if self.stop_event.is_set():
+                        return
+                    logging.warning(f"Download {self.id}: segment {index} attempt {attempt + 1} failed: {e}")
+                    # Client errors will not go away, and without ranges a broken stream cannot be continued
+                    retryable = (not (isinstance(e, urllib.error.HTTPError) and e.code < 500)
+                                 and (info["ranges"] or self.segments[index][2] == 0))
+                    if attempt + 1 == SEGMENT_RETRIES or not retryable:
+                        self._failures.append(str(e))
+                        return
+                    self.stop_event.wait(RETRY_BACKOFF * (attempt + 1))
+
+    def _fetch_segment(self, index, info):
+        segment = self.segments[index]
+        start, end = segment[0], segment[1]
+        offset = start + segment[2]
+        headers = dict(self.headers) if _same_host(self._url, self.source) else {}
+        if offset or (end is not None and info["ranges"]):
+            if not info["ranges"]:
+                raise DownloadError("The server does not support resuming.")
+            headers["Range"] = f"bytes={offset}-" + (str(end - 1) if end is not None else "")
+        request = urllib.request.Request(self._url, headers=headers)
+        with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as resp:
+            if "Range" in headers and resp.status != 206:
+                raise DownloadError(f"Expected a partial response, got HTTP {resp.status}.")
+            # Unbuffered so the hasher can read back everything counted as done
+            with open(self.part_path, "r+b", buffering=0) as f:
+                f.seek(offset)
+                while not self.stop_event.is_set():
+                    want = READ_CHUNK if end is None else min(READ_CHUNK, end - offset)
+                    if want <= 0:
+                        break
+                    chunk = resp.read(want)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    offset += len(chunk)
+                    with self.cond:
+                        segment[2] += len(chunk)
+                        self.bytes_done += len(chunk)
+                        self.cond.notify_all()
+                    self._notify()
+                    self._save_state(info)
+        if end is None:
+            with self.lock:
+                segment[1] = offset
+                self.size = offset
+        elif offset < end and not self.stop_event.is_set():
+            raise DownloadError(f"Connection closed at byte {offset} of segment ending at {end}.")
+
+    def _contiguous_bytes(self):
+        """Bytes from the start of the file that have all been written."""
+        total = 0
+        for start, end, done in self.segments:
+            total = start + done
+            if end is None or done < end - start:
+                break
+        return total
+
+    def _hash_worker(self):
+        try:
+            self._hash_in_order()
+        except Exception as e:
+            self._failures.append(f"Cannot hash the partial file: {e}")
+
+    def _hash_in_order(self):
+        """sha256 of the file, computed in order while segments are still arriving."""
+        hasher = hashlib.sha256()
+        # Unbuffered: a buffered reader would keep read-ahead bytes from before they were written
+        with open(self.part_path, "rb", buffering=0) as f:
+            while True:
+                with self.cond:
+                    available = self._contiguous_bytes()
+                    while available <= self.hashed_bytes and not self.stop_event.is_set():
+                        if self._transfer_finished():
+                            self.sha256 = hasher.hexdigest()
+                            return
+                        self.cond.wait(PROGRESS_INTERVAL)
+                        available = self._contiguous_bytes()
+                    if self.stop_event.is_set():
+                        return
+                f.seek(self.hashed_bytes)
+                data = f.read(min(HASH_CHUNK, available - self.hashed_bytes))
+                if not data:
+                    raise DownloadError("the file is shorter than the bytes written to it")
+                hasher.update(data)
+                with self.lock:
+                    self.hashed_bytes += len(data)
+
+    def _transfer_finished(self):
+        # Called with the lock held
+        if self._failures:
+            return True
+        return all(end is not None and done >= end - start for start, end, done in self.segments)
+
+    def _finish(self):
+        self._set_state("verifying")
+        if self.expected_sha256 and self.sha256 != self.expected_sha256:
+            # The bad bytes could be anywhere, so the partial data cannot be trusted for a resume
+            self._discard_partial()
+            raise DownloadError(f"Checksum mismatch: expected {self.expected_sha256}, got {self.sha256}.")
+        self.verified = bool(self.expected_sha256)
+        os.replace(self.part_path, self.dest)
+        try:
+            os.remove(self.state_path)
+        except FileNotFoundError:
+            pass
+        logging.info(f"Download {self.id}: saved {self.dest} (sha256 {self.sha256})")
+        self._set_state("done")
+
+    def speed(self):
+        with self.lock:
+            now = time.monotonic()
+            self.samples.append((now, self.bytes_done))
+            while len(self.samples) > 2 and now - self.samples[0][0] > SPEED_WINDOW:
+                self.samples.popleft()
+            (t0, b0), (t1, b1) = self.samples[0], self.samples[-1]
+        return (b1 - b0) / (t1 - t0) if t1 > t0 else 0.0
+
+    def status(self):
+        running = self.state == "downloading"
+        speed = self.speed() if running else 0.0
+        remaining = (self.size - self.bytes_done) if self.size is not None else None
+        return {
+            "id": self.id,
+            "source": self.source,
+            "repo_id": self.repo_id,
+            "filename": self.filename,
+            "path": self.dest,
+            "state": self.state,
+            "error": self.error,
+            "size": self.size,
+            "bytes_done": self.bytes_done,
+            "resumed_bytes": self.resumed_bytes,
+            "hashed_bytes": self.hashed_bytes,
+            "percent": round(self.bytes_done * 100.0 / self.size, 1) if self.size else None,
+            "bytes_per_second": speed,
+            "eta_seconds": remaining / speed if running and speed and remaining is not None else None,
+            "connections": self.connections,
+            "segments": len(self.segments),
+            "sha256": self.sha256,
+            "expected_sha256": self.expected_sha256,
+            "verified": self.verified,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class DownloadManager:
+    """Background download queue. Runs up to max_active jobs at once and adds finished files to the model index."""
+
+    def __init__(self, index, max_active=DEFAULT_MAX_ACTIVE, connections=DEFAULT_CONNECTIONS):
+        self.index = index
+        self.max_active = max_active
+        self.connections = connections
+        self.jobs = {}
+        self.queue = []
+        self.active = set()
+        self.lock = threading.Lock()
+        self.cond = threading.Condition(self.lock)
+        self.version = 0
+
+    def configure(self, max_active=None, connections=None):
+        with self.lock:
+            if max_active is not None:
+                self.max_active = max(1, int(max_active))
+            if connections is not None:
+                self.connections = max(1, min(int(connections), MAX_CONNECTIONS))
+        self._schedule()
+        return {"max_active": self.max_active, "connections": self.connections}
+
+    def submit(self, source, save_dir, filename=None, repo_id=None, sha256=None, connections=None):
+        """Queue source for download into save_dir. Returns the job (an existing one for the same file)."""
+        filename = filename or os.path.basename(urllib.parse.urlsplit(source).path)
+        if not filename:
+            raise DownloadError("Cannot tell the file name from the URL; pass filename.")
+        root = os.path.abspath(save_dir or ".")
+        dest = os.path.abspath(os.path.join(root, filename))
+        if os.path.commonpath([root, dest]) != root:
+            raise DownloadError("filename must stay inside saveDir.")
+        if os.path.exists(dest):
+            raise DownloadError(f"{dest} already exists.")
+        token = hf_token() if repo_id else None
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+
+        with self.lock:
+            for job in self.jobs.values():
+                if job.dest == dest and job.state in ACTIVE_STATES:
+                    return job
+            job = DownloadJob(source, dest, connections or self.connections, sha256, headers, repo_id, filename)
+            job.on_progress = self.notify
+            self.jobs[job.id] = job
+            self.queue.append(job)
+        logging.info(f"Queued download {job.id}: {source} -> {dest}")
+        self._schedule()
+        return job
+
+    def _schedule(self):
+        with self.lock:
+            while self.queue and len(self.active) < self.max_active:
+                job = self.queue.pop(0)
+                self.active.add(job.id)
+                threading.Thread(target=self._run, args=(job,), daemon=True).start()
+        self.notify()
+
+    def _run(self, job):
+        try:
+            job.run()
+            if job.state == "done" and job.dest.lower().endswith(".gguf"):
+                self.index.lookup(job.dest)
+                self.index.save()
+        except Exception as e:
+            logging.error(f"Download {job.id}: cannot index {job.dest}: {e}")
+        finally:
+            with self.lock:
+                self.active.discard(job.id)
+            self._schedule()
+
+    def _control(self, job_id, action):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            if job in self.queue and action in ("paused", "cancelled"):
+                self.queue.remove(job)
+                job.state = action
+                if action == "cancelled":
+                    job._discard_partial()
+            elif job.id in self.active and action in ("paused", "cancelled"):
+                job.stop(action)
+            elif action == "resume" and job.state in ("paused", "failed"):
+                job.state = "queued"
+                job.error = None
+                self.queue.append(job)
+            elif action == "cancelled" and job.state in ("paused", "failed"):
+                job.state = "cancelled"
+                job._discard_partial()
+        self._schedule()
+        return job
+
+    def pause(self, job_id):
+        return self._control(job_id, "paused")
+
+    def cancel(self, job_id):
+        return self._control(job_id, "cancelled")
+
+    def resume(self, job_id):
+        return self._control(job_id, "resume")
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def notify(self):
+        with self.cond:
+            self.version += 1
+            self.cond.notify_all()
+
+    def wait_for_change(self, version, timeout):
+        """Block until anything changes after version (or timeout). Returns the current version."""
+        with self.cond:
+            self.cond.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+    def status(self):
+        with self.lock:
+            jobs = list(self.jobs.values())
+            config = {"max_active": self.max_active, "connections": self.connections}
+        return dict(config, downloads=[job.status() for job in jobs])
@@ -0,0 +1,207 @@
+import functools
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+from model_index import read_gguf_tokens
+from profiles import write_json_atomic
+
+DRAFT_PAIRINGS_FILE = "draft_pairings.json"
+# llama.cpp refuses drafts whose vocabulary differs more than this from the target's, and compares
+# the token strings from this id on (common/speculative.cpp)
+VOCAB_MAX_SIZE_DIFFERENCE = 128
+VOCAB_CHECK_START_TOKEN_ID = 5
+# A draft bigger than this share of the target rarely generates fast enough to pay for itself
+MAX_DRAFT_RATIO = 0.25
+# How often a running launch's request timings are folded into its pairing stats
+TRACK_INTERVAL = 30
+LAUNCH_TIMEOUT = 1800
+
+
+class AdvisorError(Exception):
+    pass
+
+
+def architecture_family(arch):
+    """Architecture without its generation number or MoE suffix: qwen2, qwen3moe -> qwen; gemma3 -> gemma."""
+    return re.sub(r"\d*(moe)?\d*$", "", (arch or "").lower()) or None
+
+
+@functools.lru_cache(maxsize=16)
+def _tokens(path, size, mtime_ns):
+    return read_gguf_tokens(path)
+
+
+def _vocabulary(path):
+    st = os.stat(path)
+    return _tokens(os.path.abspath(path), st.st_size, st.st_mtime_ns)
+
+
+def vocab_compatible(target_path, target, draft_path, draft):
+    """(compatible, reason) using the checks llama-server applies before it accepts a draft model."""
+    if target.get("tokenizer_model") != draft.get("tokenizer_model"):
+        return False, f"tokenizer {draft.get('tokenizer_model')} differs from {target.get('tokenizer_model')}"
+    for key in ("bos_token_id", "eos_token_id"):
+        if target.get(key) != draft.get(key):
+            return False, f"{key} {draft.get(key)} differs from {target.get(key)}"
+    if not target.get("vocab_size") or not draft.get("vocab_size"):
+        return False, "vocabulary size unknown"
+    if abs(target["vocab_size"] - draft["vocab_size"]) > VOCAB_MAX_SIZE_DIFFERENCE:
+        return False, f"vocabulary size {draft['vocab_size']} is too far from {target['vocab_size']}"
+    if target.get("vocab_hash") and target.get("vocab_hash") == draft.get("vocab_hash"):
+        return True, "identical vocabulary"
+    # Same size class but not byte-identical (padding tokens, for example): compare the shared ids
+    try:
+        target_tokens, draft_tokens = _vocabulary(target_path), _vocabulary(draft_path)
+    except Exception as e:
+        return False, f"could not read vocabulary: {e}"
+    for token_id in range(VOCAB_CHECK_START_TOKEN_ID, min(len(target_tokens), len(draft_tokens))):
+        if target_tokens[token_id] != draft_tokens[token_id]:
+            return False, f"token {token_id} differs ({draft_tokens[token_id]!r} vs {target_tokens[token_id]!r})"
+    return True, "vocabularies match"
+
+
+class PairingStats:
+    """Measured generation speed and draft acceptance per (target, draft) pair, draft None being the baseline.
+
+    Fed from the request timings and "draft acceptance rate" lines llama-server logs for each launch.
+    """
+
+    def __init__(self, path=DRAFT_PAIRINGS_FILE):
+        self.path = path
+        self.pairs = {}
+        self.lock = threading.Lock()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.pairs = json.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable draft pairing stats {self.path}: {e}")
+
+    @staticmethod
+    def _key(target, draft):
+        return f"{os.path.abspath(target)}|{os.path.abspath(draft) if draft else ''}"
+
+    def track(self, instance):
+        """Fold the request timings of the instance's current launch into its pairing until the process exits."""
+        process, telemetry, spec = instance.process, instance.telemetry, instance.spec
+        if not os.path.isfile(spec["model"]) or telemetry is None:
+            return
+
+        def fold(since, settle=1.0):
+            # The acceptance line follows the timings, so very recent samples may still be incomplete
+            cutoff = time.time() - settle
+            samples = [s for s in telemetry.snapshot(since)["requests"] if s.get("eval_ms") and s["ts"] <= cutoff]
+            if samples:
+                self.record(spec["model"], spec.get("draft_model"), samples)
+                return samples[-1]["ts"]
+            return since
+
+        def run():
+            since = time.time()
+            if instance.startup.wait(LAUNCH_TIMEOUT) != "ready":
+                return
+            while process.poll() is None:
+                time.sleep(TRACK_INTERVAL)
+                since = fold(since)
+            fold(since, settle=0)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def record(self, target, draft, samples):
+        key = self._key(target, draft)
+        with self.lock:
+            pair = self.pairs.setdefault(key, {
+                "target": os.path.abspath(target), "draft": os.path.abspath(draft) if draft else None,
+                "requests": 0, "generated_tokens": 0, "eval_seconds": 0.0,
+                "draft_accepted": 0, "draft_generated": 0,
+            })
+            for sample in samples:
+                pair["requests"] += 1
+                pair["generated_tokens"] += sample.get("generated_tokens", 0)
+                pair["eval_seconds"] += sample["eval_ms"] / 1000.0
+                pair["draft_accepted"] += sample.get("draft_accepted", 0)
+                pair["draft_generated"] += sample.get("draft_generated", 0)
+            pair["updated"] = time.time()
+            try:
+                write_json_atomic(self.path, self.pairs)
+            except Exception as e:
+                logging.error(f"Failed to write draft pairing stats {self.path}: {e}")
+
+    def summary(self, target, draft):
+        """Effective tokens/s, acceptance rate and speedup over the same target without a draft, or None."""
+        with self.lock:
+            pair = self.pairs.get(self._key(target, draft))
+            baseline = self.pairs.get(self._key(target, None))
+            pair, baseline = dict(pair) if pair else None, dict(baseline) if baseline else None
+        if pair is None:
+            return None
+
+        def rate(p):
+            return p["generated_tokens"] / p["eval_seconds"] if p and p["eval_seconds"] else None
+
+        tps, base_tps = rate(pair), rate(baseline)
+        return dict(pair, effective_tokens_per_second=tps,
+                    acceptance_rate=pair["draft_accepted"] / pair["draft_generated"] if pair["draft_generated"] else None,
+                    baseline_tokens_per_second=base_tps,
+                    speedup=tps / base_tps if tps and base_tps and draft else None)
+
+
+class DraftAdvisor:
+    """Finds models in the index that can serve as speculative decoding drafts for a target model."""
+
+    def __init__(self, index, stats=None):
+        self.index = index
+        self.stats = stats or PairingStats()
+
+    def candidates(self, target_path, max_ratio=MAX_DRAFT_RATIO):
+        """Compatible drafts (best first) and the same-family models that were ruled out, with the reason."""
+        target_path = os.path.abspath(target_path)
+        try:
+            target = self.index.lookup(target_path)
+        except OSError as e:
+            raise AdvisorError(f"Model file not found: {e}")
+        if "error" in target:
+            raise AdvisorError(f"Could not read GGUF header: {target['error']}")
+        family = architecture_family(target.get("architecture"))
+        drafts, rejected = [], []
+        for path, meta in self.index.models():
+            if path == target_path or architecture_family(meta.get("architecture")) != family:
+                continue
+            entry = {"path": path, "name": meta.get("name"), "architecture": meta.get("architecture"),
+                     "parameter_count": meta.get("parameter_count"), "quant_type": meta.get("quant_type"),
+                     "file_size": meta.get("file_size")}
+            # Parameter counts when both are known, else file sizes; with neither the size check is skipped
+            size_key = "parameter_count" if meta.get("parameter_count") and target.get("parameter_count") else "file_size"
+            if meta.get(size_key) and target.get(size_key) and meta[size_key] > target[size_key] * max_ratio:
+                rejected.append(dict(entry, reason=f"larger than {max_ratio:.0%} of the target"))
+                continue
+            compatible, reason = vocab_compatible(target_path, target, path, meta)
+            if not compatible:
+                rejected.append(dict(entry, reason=reason))
+                continue
+            drafts.append(dict(entry, reason=reason, measured=self.stats.summary(target_path, path)))
+
+        def rank(entry):
+            # Measured speedups first, then unmeasured drafts smallest first (fastest to run, least memory),
+            # then drafts measured no faster than running without one
+            speedup = (entry["measured"] or {}).get("speedup")
+            if speedup is None:
+                return (1, 0, entry["parameter_count"] or 0)
+            return (0 if speedup > 1 else 2, -speedup, entry["parameter_count"] or 0)
+
+        drafts.sort(key=rank)
+        return {"target": target_path, "architecture": target.get("architecture"),
+                "baseline": self.stats.summary(target_path, None), "drafts": drafts, "rejected": rejected}
+
+    def best(self, target_path):
+        """Path of the recommended draft for target_path, or None. A pairing measured slower than no draft is skipped."""
+        for draft in self.candidates(target_path)["drafts"]:
+            speedup = (draft["measured"] or {}).get("speedup")
+            if speedup is None or speedup > 1:
+                return draft["path"]
+        return None
@@ -0,0 +1,243 @@
+import ctypes
+import functools
+import math
+import os
+import platform
+import re
+
+from instances import DEFAULT_CTX_SIZE
+from model_index import read_gguf_header, summarize_header
+
+# ggml tensor types: (elements per block, bytes per block)
+GGML_TYPE_SIZES = {
+    0: (1, 4),        # F32
+    1: (1, 2),        # F16
+    2: (32, 18),      # Q4_0
+    3: (32, 20),      # Q4_1
+    6: (32, 22),      # Q5_0
+    7: (32, 24),      # Q5_1
+    8: (32, 34),      # Q8_0
+    9: (32, 36),      # Q8_1
+    10: (256, 84),    # Q2_K
+    11: (256, 110),   # Q3_K
+    12: (256, 144),   # Q4_K
+    13: (256, 176),   # Q5_K
+    14: (256, 210),   # Q6_K
+    15: (256, 292),   # Q8_K
+    16: (256, 66),    # IQ2_XXS
+    17: (256, 74),    # IQ2_XS
+    18: (256, 98),    # IQ3_XXS
+    19: (256, 50),    # IQ1_S
+    20: (32, 18),     # IQ4_NL
+    21: (256, 110),   # IQ3_S
+    22: (256, 82),    # IQ2_S
+    23: (256, 136),   # IQ4_XS
+    24: (1, 1),       # I8
+    25: (1, 2),       # I16
+    26: (1, 4),       # I32
+    27: (1, 8),       # I64
+    28: (1, 8),       # F64
+    29: (256, 56),    # IQ1_M
+    30: (1, 2),       # BF16
+    34: (256, 54),    # TQ1_0
+    35: (256, 66),    # TQ2_0
+    39: (32, 17),     # MXFP4
+}
+
+# Bytes per KV cache element for --cache-type-k/v (block-quantized types include their scales)
+CACHE_TYPE_BYTES = {
+    "f32": 4.0, "f16": 2.0, "bf16": 2.0,
+    "q8_0": 34 / 32, "q5_1": 24 / 32, "q5_0": 22 / 32,
+    "q4_1": 20 / 32, "q4_0": 18 / 32, "iq4_nl": 18 / 32,
+}
+
+# Driver/context overhead reserved on a GPU before anything is allocated, and llama.cpp's default ubatch
+GPU_RESERVE_BYTES = 384 * 1024 * 1024
+DEFAULT_UBATCH = 512
+
+LAYER_TENSOR_RE = re.compile(r"^blk\.(\d+)\.")
+
+
+class PlanError(Exception):
+    pass
+
+
+def tensor_bytes(tensor):
+    elements = math.prod(tensor["dims"]) if tensor["dims"] else 1
+    block, size = GGML_TYPE_SIZES.get(tensor["type"], (1, 2))
+    return -(-elements // block) * size
+
+
+def _geometry_value(meta, key):
+    # Per-layer values (e.g. head_count_kv arrays on OpenELM) come back as array stubs; treat as unknown
+    value = meta.get(key)
+    return value if isinstance(value, (int, float)) else None
+
+
+def kv_bytes_per_token(meta, cache_type_k="f16", cache_type_v="f16"):
+    """KV cache bytes for one token in one layer."""
+    n_head = _geometry_value(meta, "head_count") or 0
+    n_head_kv = _geometry_value(meta, "head_count_kv") or n_head
+    n_embd = _geometry_value(meta, "embedding_length") or 0
+    head_dim = n_embd // n_head if n_head else 0
+    key_length = _geometry_value(meta, "key_length") or head_dim
+    value_length = _geometry_value(meta, "value_length") or head_dim
+    k_bytes = CACHE_TYPE_BYTES.get(cache_type_k, 2.0)
+    v_bytes = CACHE_TYPE_BYTES.get(cache_type_v, 2.0)
+    return n_head_kv * (key_length * k_bytes + value_length * v_bytes)
+
+
+@functools.lru_cache(maxsize=64)
+def _layout(path, size, mtime_ns):
+    header = read_gguf_header(path)
+    meta = summarize_header(header)
+    layers = {}
+    output = embeddings = other = 0
+    for tensor in header["tensors"]:
+        nbytes = tensor_bytes(tensor)
+        match = LAYER_TENSOR_RE.match(tensor["name"])
+        if match:
+            index = int(match.group(1))
+            layers[index] = layers.get(index, 0) + nbytes
+        elif tensor["name"].startswith("output"):
+            output += nbytes
+        elif tensor["name"].startswith("token_embd"):
+            embeddings += nbytes
+        else:
+            other += nbytes
+    n_layer = meta.get("layer_count") or (max(layers) + 1 if layers else 0)
+    layer_bytes = tuple(layers.get(i, 0) for i in range(n_layer))
+    return meta, layer_bytes, output, embeddings, other
+
+
+def model_layout(path):
+    """(meta, per-layer weight bytes, output bytes, token embedding bytes, other bytes); cached per file version."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        raise PlanError(f"Model file not found: {path}")
+    try:
+        return _layout(os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    except Exception as e:
+        raise PlanError(f"Could not read GGUF header: {e}")
+
+
+def compute_buffer_bytes(meta, ctx_size, batch_size, flash_attn):
+    """Rough size of llama.cpp's compute graph buffer for one ubatch."""
+    ubatch = min(int(batch_size or DEFAULT_UBATCH), DEFAULT_UBATCH)
+    n_embd = _geometry_value(meta, "embedding_length") or 0
+    n_vocab = meta.get("vocab_size") or 0
+    n_head = _geometry_value(meta, "head_count") or 0
+    activations = ubatch * (n_vocab + 4 * n_embd) * 4
+    # Without flash attention the full KQ score matrix for one layer is materialized
+    scores = 0 if flash_attn else ubatch * ctx_size * n_head * 4
+    return int(activations + scores)
+
+
+def system_memory():
+    """(total, available) physical RAM in bytes, or (None, None) if unknown."""
+    try:
+        if platform.system() == "Windows":
+            class MEMORYSTATUSEX(ctypes.Structure):
+                _fields_ = [("dwLength", ctypes.c_ulong), ("dwMemoryLoad", ctypes.c_ulong),
+                            ("ullTotalPhys", ctypes.c_ulonglong), ("ullAvailPhys", ctypes.c_ulonglong),
+                            ("ullTotalPageFile", ctypes.c_ulonglong), ("ullAvailPageFile", ctypes.c_ulonglong),
+                            ("ullTotalVirtual", ctypes.c_ulonglong), ("ullAvailVirtual", ctypes.c_ulonglong),
+                            ("ullAvailExtendedVirtual", ctypes.c_ulonglong)]
+            status = MEMORYSTATUSEX()
+            status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+            ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status))
+            return status.ullTotalPhys, status.ullAvailPhys
+        values = {}
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                values[key] = int(rest.split()[0]) * 1024
+        return values.get("MemTotal"), values.get("MemAvailable")
+    except Exception:
+        return None, None
+
+
+def _split(layer_bytes, output, embeddings, other, kv_per_layer, compute, gpu_layers):
+    """Bytes on GPU and in RAM when the last gpu_layers repeating layers are offloaded."""
+    n_layer = len(layer_bytes)
+    offloaded = min(gpu_layers, n_layer)
+    gpu_weights = sum(layer_bytes[n_layer - offloaded:])
+    # llama.cpp offloads the output layer only once every repeating layer is on the GPU
+    if gpu_layers > n_layer:
+        gpu_weights += output
+    total_weights = sum(layer_bytes) + output + embeddings + other
+    gpu = gpu_weights + kv_per_layer * offloaded
+    cpu = total_weights - gpu_weights + kv_per_layer * (n_layer - offloaded)
+    if gpu_layers > 0:
+        gpu += compute + GPU_RESERVE_BYTES
+    else:
+        cpu += compute
+    return int(gpu), int(cpu)
+
+
+def plan_launch(params, vram_bytes=None, ram_bytes=None):
+    """Estimate memory for a start_server() payload and the largest -ngl that fits vram_bytes.
+
+    Works from GGUF tensor sizes and attention geometry only; nothing is loaded. Returns a dict with
+    the weight / KV / compute breakdown, GPU and RAM totals for the requested -ngl, whether it fits,
+    and suggested_gpu_layers.
+    """
+    meta, layer_bytes, output, embeddings, other = model_layout(params.get("model", ""))
+    n_layer = len(layer_bytes)
+    # Same default as build_launch; -c 0 makes llama-server use the model's trained context
+    ctx_size = int(params.get("ctx_size", DEFAULT_CTX_SIZE) or meta.get("context_length") or DEFAULT_CTX_SIZE)
+    parallel = max(1, int(params.get("parallel", 1)))
+    cache_type_k = params.get("cache_type_k", "f16")
+    cache_type_v = params.get("cache_type_v", "f16")
+    gpu_layers = int(params.get("gpu_layers", 0))
+    if gpu_layers < 0:
+        gpu_layers = n_layer + 1
+
+    # -c is the total context shared by all -np slots
+    kv_per_layer = int(kv_bytes_per_token(meta, cache_type_k, cache_type_v) * ctx_size)
+    compute = compute_buffer_bytes(meta, ctx_size, params.get("batch_size"), params.get("flash_attn"))
+    weights = sum(layer_bytes) + output + embeddings + other
+
+    gpu, cpu = _split(layer_bytes, output, embeddings, other, kv_per_layer, compute, gpu_layers)
+
+    suggested = None
+    if vram_bytes is not None:
+        suggested = 0
+        for candidate in range(n_layer + 1, 0, -1):
+            if _split(layer_bytes, output, embeddings, other, kv_per_layer, compute, candidate)[0] <= vram_bytes:
+                suggested = candidate
+                break
+
+    problems = []
+    warnings = []
+    if vram_bytes is not None and gpu > vram_bytes:
+        problems.append(f"-ngl {gpu_layers} needs {gpu / 2**30:.2f} GiB of GPU memory but only "
+                        f"{vram_bytes / 2**30:.2f} GiB is available; -ngl {suggested} fits.")
+    if ram_bytes is not None and cpu > ram_bytes:
+        problems.append(f"Needs {cpu / 2**30:.2f} GiB of system memory but only {ram_bytes / 2**30:.2f} GiB is available.")
+    if meta.get("context_length") and ctx_size > meta["context_length"]:
+        warnings.append(f"Context {ctx_size} exceeds the model's trained context of {meta['context_length']}.")
+    if ctx_size // parallel < 512:
+        warnings.append(f"Each of the {parallel} slots gets only {ctx_size // parallel} tokens of context.")
+    if gpu_layers == 0 and params.get("flash_attn"):
+        warnings.append("Flash attention has little effect with no layers offloaded.")
+
+    return {
+        "model": meta.get("name") or os.path.basename(params.get("model", "")),
+        "layer_count": n_layer,
+        "ctx_size": ctx_size,
+        "ctx_per_slot": ctx_size // parallel,
+        "gpu_layers": min(gpu_layers, n_layer + 1),
+        "weights_bytes": int(weights),
+        "kv_cache_bytes": kv_per_layer * n_layer,
+        "compute_bytes": compute,
+        "gpu_bytes": gpu,
+        "ram_bytes": cpu,
+        "vram_budget_bytes": vram_bytes,
+        "ram_budget_bytes": ram_bytes,
+        "fits": not problems,
+        "problems": problems,
+        "warnings": warnings,
+        "suggested_gpu_layers": suggested,
+    }
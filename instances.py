@@ -0,0 +1,664 @@
+import collections
+import logging
+import os
+import platform
+import subprocess
+import threading
+import time
+
+from admission import AdmissionQueue, DEFAULT_MAX_QUEUE
+from log_bus import LogBus
+from readiness import StartupTracker
+from slot_store import SLOT_CACHE_DIR
+from telemetry import TelemetryCollector
+
+DEFAULT_INSTANCE = "default"
+# Names of LlamaForge's own instances (e.g. the auto-tuner's); /start-server cannot take them
+INTERNAL_PREFIX = "llamaforge-"
+# Wake-ups remembered per instance for reporting cold-start latency
+COLD_START_HISTORY = 50
+# How often the registry checks instances against their idle timeout
+IDLE_CHECK_INTERVAL = 15
+# Seconds a reload or draining stop waits for in-flight requests before stopping the old process anyway
+DEFAULT_DRAIN_TIMEOUT = 120
+# -c when a launch does not set ctx_size; the planners size the KV cache for the same default
+DEFAULT_CTX_SIZE = 4096
+
+
+def hidden_window_flags():
+    """startupinfo/creationflags that keep child consoles hidden on Windows."""
+    startupinfo = None
+    creationflags = 0
+    if platform.system() == "Windows":
+        startupinfo = subprocess.STARTUPINFO()
+        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+        startupinfo.wShowWindow = subprocess.SW_HIDE
+        creationflags = subprocess.CREATE_NO_WINDOW
+    return startupinfo, creationflags
+
+
+def display_command(server_path, args, cache_path):
+    """The launch as a PowerShell line, for logs and the UI."""
+    return f'$env:LLAMA_CACHE="{cache_path}"; {server_path} ' + " ".join(args)
+
+
+def build_launch(data, server_path):
+    """Turn UI/API launch parameters into a llama-server launch spec (args, env, display command)."""
+    # Basic Parameters
+    model_path = data.get("model", "")
+    if not model_path:
+        raise ValueError("No model specified")
+        
+    threads = data.get("threads", os.cpu_count())
+    gpu_layers = data.get("gpu_layers", 0)
+    port = data.get("port", 8080)
+    host = data.get("host", "127.0.0.1")
+    
+    # Advanced Parameters
+    ctx_size = data.get("ctx_size", DEFAULT_CTX_SIZE)
+    split_mode = data.get("split_mode", "none")
+    parallel = data.get("parallel", 1)
+    batch_size = data.get("batch_size", 512)
+    no_mmap = data.get("no_mmap", False)
+    mlock = data.get("mlock", False)
+    flash_attn = data.get("flash_attn", False)
+    jinja = data.get("jinja", False)
+    # Newer performance flags; the UI only offers them when the selected binary lists them in --help
+    cont_batching = data.get("cont_batching", False)
+    kv_unified = data.get("kv_unified", False)
+    swa_full = data.get("swa_full", False)
+    cache_type_k = data.get("cache_type_k", "f16")
+    cache_type_v = data.get("cache_type_v", "f16")
+    slot_persist = data.get("slot_persist", False)
+
+    # Speculative decoding: a small draft model proposes tokens the main model verifies in one batch
+    draft_model = data.get("draft_model") or None
+    draft_max = data.get("draft_max")
+    draft_min = data.get("draft_min")
+    draft_p_min = data.get("draft_p_min")
+    draft_gpu_layers = data.get("draft_gpu_layers")
+    draft_ctx_size = data.get("draft_ctx_size")
+    
+    # Sampling Parameters
+    temp = data.get("temp", 0.8)
+    top_k = data.get("top_k", 40)
+    top_p = data.get("top_p", 0.9)
+    min_p = data.get("min_p", 0.05)
+    repeat_penalty = data.get("repeat_penalty", 1.1)
+    
+    # RoPE Parameters
+    rope_freq_base = data.get("rope_freq_base", 0)
+    rope_freq_scale = data.get("rope_freq_scale", 0)
+    
+    # Backend Selection Logic (V0.4 feature - improved)
+    backend = data.get("backend", "auto")
+    logging.info(f"User preferred backend: {backend}")
+    
+    # If CPU is forced, ensure ngl is 0
+    if backend == "cpu":
+        gpu_layers = 0
+        draft_gpu_layers = 0
+
+    # Construct Command Arguments (V0.3 logic - working)
+    args = []
+    
+    # Handle model input
+    model_args = []
+    if "-hf" in model_path:
+        parts = model_path.split("-hf")
+        if len(parts) > 1:
+            repo = parts[1].strip().split()[0]
+            model_args = ["-hf", repo]
+    elif "-m" in model_path:
+         parts = model_path.split("-m")
+         if len(parts) > 1:
+             path = parts[1].strip().split()[0]
+             model_args = ["-m", path]
+    else:
+        model_args = ["-m", model_path]
+
+    args.extend(model_args)
+    args.extend(["-t", str(threads)])
+    args.extend(["-ngl", str(gpu_layers)])
+    args.extend(["--port", str(port)])
+    args.extend(["--host", host])
+    args.extend(["-c", str(ctx_size)])
+    args.extend(["-sm", split_mode])
+    args.extend(["-np", str(parallel)])
+    args.extend(["-b", str(batch_size)])
+    
+    if no_mmap: args.append("--no-mmap")
+    if mlock: args.append("--mlock")
+    if flash_attn: args.extend(["-fa", "on"])  # V0.6.1: Fixed to use value format
+    if jinja: args.append("--jinja")
+    if cont_batching: args.append("-cb")
+    if kv_unified: args.append("--kv-unified")
+    if swa_full: args.append("--swa-full")
+    
+    args.extend(["--cache-type-k", cache_type_k])
+    args.extend(["--cache-type-v", cache_type_v])
+    
+    args.extend(["--temp", str(temp)])
+    args.extend(["--top-k", str(top_k)])
+    args.extend(["--top-p", str(top_p)])
+    args.extend(["--min-p", str(min_p)])
+    args.extend(["--repeat-penalty", str(repeat_penalty)])
+    
+    if rope_freq_base != 0: args.extend(["--rope-freq-base", str(rope_freq_base)])
+    if rope_freq_scale != 0: args.extend(["--rope-freq-scale", str(rope_freq_scale)])
+
+    if draft_model:
+        args.extend(["-md", draft_model])
+        if draft_max is not None: args.extend(["--draft-max", str(draft_max)])
+        if draft_min is not None: args.extend(["--draft-min", str(draft_min)])
+        if draft_p_min is not None: args.extend(["--draft-p-min", str(draft_p_min)])
+        if draft_gpu_layers is not None: args.extend(["-ngld", str(draft_gpu_layers)])
+        if draft_ctx_size: args.extend(["-cd", str(draft_ctx_size)])
+
+    # Let llama-server save and restore KV slots, so prefilled prompts survive a restart
+    if slot_persist:
+        # llama-server writes into the directory but does not create it
+        os.makedirs(SLOT_CACHE_DIR, exist_ok=True)
+        args.extend(["--slot-save-path", os.path.abspath(SLOT_CACHE_DIR)])
+
+    # Expose llama-server's Prometheus endpoint for the telemetry poller
+    args.append("--metrics")
+
+    # Prepare Environment
+    cache_path = data.get("cache_path", ".")
+    current_env = os.environ.copy()
+    current_env["LLAMA_CACHE"] = cache_path
+    
+    # V0.7.4: Correct backend forcing via environment variables
+    # Backend selection happens based on which GPU backends are VISIBLE
+    if backend == "vulkan":
+        # Hide ROCm to force Vulkan (Vulkan has no env var control)
+        current_env["HIP_VISIBLE_DEVICES"] = "-1"
+        logging.info("Backend: Vulkan - hiding ROCm via HIP_VISIBLE_DEVICES=-1")
+    elif backend == "rocm":
+        # Hide CUDA to prefer ROCm (though you don't have NVIDIA GPU)
+        current_env["CUDA_VISIBLE_DEVICES"] = "-1"
+        logging.info("Backend: ROCm - hiding CUDA via CUDA_VISIBLE_DEVICES=-1")
+    elif backend == "cuda":
+        # Hide ROCm to prefer CUDA
+        current_env["HIP_VISIBLE_DEVICES"] = "-1"
+        logging.info("Backend: CUDA - hiding ROCm via HIP_VISIBLE_DEVICES=-1")
+    elif backend == "cpu":
+        # Hide all GPU backends to force CPU
+        current_env["CUDA_VISIBLE_DEVICES"] = "-1"
+        current_env["HIP_VISIBLE_DEVICES"] = "-1"
+        logging.info("Backend: CPU - hiding all GPU backends")
+    # For "auto" or unrecognized, don't set any env vars
+    
+    # Log command for debugging
+    full_cmd = display_command(server_path, args, cache_path)
+
+    return {
+        "server_path": server_path,
+        "args": args,
+        "env": current_env,
+        "host": host,
+        "port": int(port),
+        "parallel": int(parallel),
+        # Requests allowed to wait for a slot before new ones are rejected
+        "max_queue": int(data.get("max_queue", DEFAULT_MAX_QUEUE)),
+        # Seconds without requests before the process is shut down until the next one (0 = never)
+        "idle_timeout": float(data.get("idle_timeout") or 0),
+        "model": model_args[-1] if model_args else model_path,
+        "cache_type_k": cache_type_k,
+        "cache_type_v": cache_type_v,
+        "slot_persist": bool(slot_persist),
+        "draft_model": draft_model,
+        # Server-side sampling defaults, which apply to requests that do not set their own
+        "sampling": {"temperature": temp, "top_k": top_k, "top_p": top_p, "min_p": min_p,
+                     "repeat_penalty": repeat_penalty},
+        "command": full_cmd,
+    }
+
+
+def _kill(process):
+    """Stop a llama-server process: SIGTERM with a grace period on POSIX, taskkill of the tree on Windows."""
+    if not process or process.poll() is not None:
+        return
+    if platform.system() == "Windows":
+        # We need to kill the process and its children
+        subprocess.run(["taskkill", "/F", "/T", "/PID", str(process.pid)],
+                       creationflags=subprocess.CREATE_NO_WINDOW)
+    else:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def base_url_for(spec):
+    host = spec["host"]
+    if host in ("0.0.0.0", "::"):
+        host = "127.0.0.1"
+    return f"http://{host}:{spec['port']}"
+
+
+class InflightCounter:
+    """Requests relayed to one llama-server process that have not finished yet."""
+
+    def __init__(self):
+        self.count = 0
+        self.cond = threading.Condition()
+
+    def add(self):
+        with self.cond:
+            self.count += 1
+
+    def done(self):
+        with self.cond:
+            self.count -= 1
+            self.cond.notify_all()
+
+    def wait_idle(self, timeout):
+        """Block until nothing is in flight. Returns False if requests were still running at timeout."""
+        with self.cond:
+            return self.cond.wait_for(lambda: self.count <= 0, timeout)
+
+
+class ServerInstance:
+    """One named llama-server process with its own port, environment, log stream and telemetry."""
+
+    def __init__(self, name, log_bus, slot_store=None, flag_cache=None):
+        self.name = name
+        self.log_bus = log_bus
+        self.slot_store = slot_store
+        self.flag_cache = flag_cache
+        self.spec = None
+        self.process = None
+        self.telemetry = None
+        self.admission = None
+        self.log_thread = None
+        self.startup = None
+        self.started_at = None
+        self.last_used = None
+        # Started on demand by the model pool (and therefore evictable by it)
+        self.pool_managed = False
+        # Stopped for idleness; the next proxied request relaunches it from self.spec
+        self.sleeping = False
+        self.wake_lock = threading.Lock()
+        # Held from the is_running() check until the new process is published, so concurrent starts spawn one
+        self.start_lock = threading.Lock()
+        self.cold_starts = collections.deque(maxlen=COLD_START_HISTORY)
+        self.last_slot_save = None
+        self.last_slot_restore = None
+        self.inflight = InflightCounter()
+        # Guards switching the live process during a reload against requests picking their backend
+        self.swap_lock = threading.Lock()
+        self.reload_lock = threading.Lock()
+        # Set while a stop waits for in-flight requests; the gateway turns new requests away
+        self.draining = False
+        self.last_reload = None
+        # Started by LlamaForge itself: never routed to and not listed
+        self.internal = name.startswith(INTERNAL_PREFIX)
+
+    @property
+    def base_url(self):
+        return base_url_for(self.spec)
+
+    def is_running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def _launch(self, spec, on_healthy=None):
+        """Spawn llama-server for spec with its own telemetry, readiness tracking and log reader."""
+        if self.flag_cache:
+            # Rewrites spec's args for the installed build so an unknown flag does not waste a model load
+            for change in self.flag_cache.adapt(spec):
+                logging.warning(f"[{self.name}] {change}")
+        logging.info(f"[{self.name}] Executing command: {spec['command']}")
+        startupinfo, creationflags = hidden_window_flags()
+        process = subprocess.Popen(
+            [spec["server_path"]] + spec["args"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1,
+            env=spec["env"],
+            startupinfo=startupinfo,
+            creationflags=creationflags
+        )
+        telemetry = TelemetryCollector(os.path.basename(spec["model"]))
+        telemetry.start_polling(base_url_for(spec))
+        startup = StartupTracker(process, base_url_for(spec), on_healthy)
+        startup.start_polling()
+        log_thread = threading.Thread(target=self._read_logs, args=(process, telemetry, startup), daemon=True)
+        return process, telemetry, startup, log_thread
+
+    def start(self, spec):
+        with self.start_lock:
+            if self.is_running():
+                raise RuntimeError(f"Instance '{self.name}' is already running.")
+            self.spec = spec
+            self.sleeping = False
+            self.draining = False
+            self.started_at = time.time()
+            self.last_used = self.started_at
+
+            if self.telemetry:
+                self.telemetry.stop()
+            on_healthy = self.restore_slots if self.persists_slots() else None
+            process, self.telemetry, self.startup, self.log_thread = self._launch(spec, on_healthy)
+
+            # The queue outlives restarts so requests waiting for a slot are not dropped
+            if self.admission is None:
+                self.admission = AdmissionQueue(spec["parallel"], spec["max_queue"], self.telemetry)
+            else:
+                self.admission.telemetry = self.telemetry
+                self.admission.resize(spec["parallel"], spec["max_queue"])
+            self.inflight = InflightCounter()
+
+            # Published last: is_running() must not be true before the instance can take requests
+            self.process = process
+            self.log_thread.start()
+
+    def checkout(self):
+        """The spec of the live process and its in-flight counter, counted as one more request on it.
+
+        Callers must call counter.done() when the request finishes, however it ends.
+        """
+        with self.swap_lock:
+            counter = self.inflight
+            counter.add()
+            return self.spec, counter
+
+    def reload(self, spec, ready_timeout=300, drain_timeout=DEFAULT_DRAIN_TIMEOUT):
+        """Blue/green restart: launch spec beside the running process, switch traffic once it is ready,
+        then let requests already on the old process finish before stopping it.
+
+        spec must use a different port than the running process. Returns a report of the reload.
+        """
+        with self.reload_lock:
+            if not self.is_running():
+                raise RuntimeError(f"Instance '{self.name}' is not running.")
+            if spec["port"] == self.spec["port"] and spec["host"] == self.spec["host"]:
+                raise RuntimeError("The new configuration needs a port of its own until the switch.")
+            start = time.perf_counter()
+            self.log_bus.publish(f"LlamaForge: reloading on port {spec['port']}; the current server keeps serving")
+            restore = bool(self.slot_store and spec.get("slot_persist"))
+
+            def hand_over_slots():
+                # Snapshot the old process as late as possible and load it into the new one before it
+                # becomes ready, so traffic only moves once the KV state has come across
+                self._save_slots_logged("before reloading")
+                if restore:
+                    self.restore_slots(spec)
+
+            on_healthy = hand_over_slots if restore or self.persists_slots() else None
+            process, telemetry, startup, log_thread = self._launch(spec, on_healthy)
+            log_thread.start()
+            if startup.wait(ready_timeout) != "ready":
+                reason = startup.summary()["reason"] or f"not ready after {ready_timeout}s"
+                telemetry.stop()
+                startup.abort("Reload abandoned")
+                _kill(process)
+                self.log_bus.publish(f"LlamaForge: reload failed ({reason}); still serving the old configuration")
+                raise RuntimeError(f"New configuration failed to start: {reason}")
+            ready_seconds = time.perf_counter() - start
+
+            # Switch: the process and spec change together, so every request lands on exactly one side.
+            # The admission queue is replaced after them; requests still waiting in the old queue are
+            # admitted as the old process's requests finish and go to the new process.
+            with self.swap_lock:
+                old_process, old_telemetry, old_startup = self.process, self.telemetry, self.startup
+                old_spec, old_inflight = self.spec, self.inflight
+                self.spec, self.process, self.telemetry, self.startup = spec, process, telemetry, startup
+                self.inflight = InflightCounter()
+                self.log_thread = log_thread
+                self.started_at = time.time()
+            old_admission = self.admission
+            self.admission = AdmissionQueue(spec["parallel"], spec["max_queue"], telemetry)
+            switched_at = time.perf_counter()
+            in_flight_at_switch = old_inflight.count
+
+            drained = old_inflight.wait_idle(drain_timeout)
+            dropped = 0 if drained else old_inflight.count
+            old_telemetry.stop()
+            old_startup.abort("Replaced by a reload")
+            _kill(old_process)
+            self.last_reload = {
+                "at": time.time(),
+                "old_port": old_spec["port"],
+                "new_port": spec["port"],
+                "ready_seconds": ready_seconds,
+                "drain_seconds": time.perf_counter() - switched_at,
+                "total_seconds": time.perf_counter() - start,
+                "in_flight_at_switch": in_flight_at_switch,
+                "queued_at_switch": len(old_admission.waiting),
+                "dropped_requests": dropped,
+            }
+            logging.info(f"[{self.name}] Reloaded in {self.last_reload['total_seconds']:.2f}s, "
+                         f"{in_flight_at_switch} request(s) drained, {dropped} dropped")
+            self.log_bus.publish(f"LlamaForge: reload complete, now serving on port {spec['port']} "
+                                 f"({dropped} requests dropped)")
+            return self.last_reload
+
+    def persists_slots(self):
+        return bool(self.slot_store and self.spec and self.spec.get("slot_persist"))
+
+    def restore_slots(self, spec=None):
+        """Load the matching KV slot snapshots into the instance, or into the launch of spec during a reload.
+
+        Returns the restore report.
+        """
+        base_url = base_url_for(spec) if spec else None
+        self.last_slot_restore = {"at": time.time(), "slots": self.slot_store.restore(self, spec, base_url)}
+        return self.last_slot_restore
+
+    def save_slots(self):
+        """Snapshot the KV slots of a ready instance. Returns None if there is nothing to save."""
+        if not self.persists_slots() or not self.is_running() or self.startup.state != "ready":
+            return None
+        self.last_slot_save = {"at": time.time(), "slots": self.slot_store.save(self)}
+        return self.last_slot_save
+
+    def _save_slots_logged(self, when):
+        try:
+            self.save_slots()
+        except Exception as e:
+            logging.error(f"[{self.name}] Saving KV slots {when} failed: {e}")
+
+    def touch(self):
+        self.last_used = time.time()
+
+    def wait_ready(self, timeout=300):
+        """Block until this launch is ready. Returns False if it failed or time runs out."""
+        return self.startup is not None and self.startup.wait(timeout) == "ready"
+
+    def is_idle(self):
+        """True once the instance has had no requests in flight or queued for its idle timeout."""
+        timeout = self.spec["idle_timeout"] if self.spec else 0
+        if not timeout or not self.is_running():
+            return False
+        if self.admission and (self.admission.active or self.admission.waiting):
+            return False
+        return time.time() - (self.last_used or self.started_at) > timeout
+
+    def sleep(self):
+        """Stop the process if it is still idle. Returns True if it was put to sleep."""
+        with self.wake_lock:
+            # Checked under the admission lock so a request admitted concurrently sees sleeping and wakes it
+            with self.admission.cond:
+                if not self.is_idle():
+                    return False
+                self.sleeping = True
+            logging.info(f"[{self.name}] Idle for {self.spec['idle_timeout']:.0f}s, shutting down until the next request")
+            self.log_bus.publish("LlamaForge: instance idle, stopped until the next request")
+            self._terminate()
+            return True
+
+    def wake(self, timeout=300):
+        """Relaunch a sleeping instance with its recorded command line and environment and wait until it is ready.
+
+        Concurrent callers share one launch. Returns the cold-start latency in seconds.
+        """
+        with self.wake_lock:
+            if not self.sleeping:
+                if self.is_running():
+                    return 0.0
+                raise RuntimeError(f"Instance '{self.name}' is not running.")
+            start = time.perf_counter()
+            self.start(self.spec)
+            ready = self.wait_ready(timeout)
+            cold_start = time.perf_counter() - start
+            if not ready:
+                self._terminate()
+                self.sleeping = True
+                raise RuntimeError(f"Instance '{self.name}' failed to become ready after waking.")
+            self.cold_starts.append({"ts": time.time(), "seconds": cold_start})
+            self.telemetry.record_cold_start(cold_start)
+            logging.info(f"[{self.name}] Woke in {cold_start:.2f}s")
+            self.log_bus.publish(f"LlamaForge: instance woke in {cold_start:.2f}s")
+            return cold_start
+
+    def _read_logs(self, process, collector, startup):
+        """Read logs from the server process, publish them on the log bus and feed telemetry."""
+        if process and process.stdout:
+            for line in iter(process.stdout.readline, ""):
+                if line:
+                    line = line.strip()
+                    self.log_bus.publish(line)
+                    collector.observe(line)
+                    startup.observe(line)
+                else:
+                    break
+
+    def stop(self, drain_timeout=0):
+        """Stop the process. With drain_timeout, new gateway requests are refused and the ones in flight
+        get that long to finish first. Returns the number of requests cut off."""
+        self.sleeping = False
+        dropped = 0
+        if drain_timeout and self.is_running():
+            self.draining = True
+            if not self.inflight.wait_idle(drain_timeout):
+                dropped = self.inflight.count
+        self._terminate()
+        self.draining = False
+        return dropped
+
+    def _terminate(self):
+        self._save_slots_logged("before stopping")
+        if self.telemetry:
+            self.telemetry.stop()
+        if self.startup:
+            self.startup.abort("Stopped before it became ready")
+        process = self.process
+        self.process = None
+        _kill(process)
+
+    def info(self):
+        running = self.is_running()
+        return {
+            "name": self.name,
+            "running": running,
+            "pid": self.process.pid if running else None,
+            "model": self.spec["model"] if self.spec else None,
+            "host": self.spec["host"] if self.spec else None,
+            "port": self.spec["port"] if self.spec else None,
+            "parallel": self.spec["parallel"] if self.spec else None,
+            "command": self.spec["command"] if self.spec else None,
+            "flag_changes": self.spec.get("flag_changes", []) if self.spec else [],
+            "started_at": self.started_at,
+            "state": self.startup.state if self.startup else None,
+            "last_used": self.last_used,
+            "pool_managed": self.pool_managed,
+            "sleeping": self.sleeping,
+            "idle_timeout": self.spec["idle_timeout"] if self.spec else 0,
+            "cold_starts": list(self.cold_starts),
+            "in_flight": self.inflight.count,
+            "draining": self.draining,
+            "last_reload": self.last_reload,
+            "slot_persist": self.persists_slots(),
+            "last_slot_save": self.last_slot_save,
+            "last_slot_restore": self.last_slot_restore,
+            "admission": self.admission.stats() if self.admission else None,
+        }
+
+
+class InstanceRegistry:
+    """Named llama-server instances managed by this LlamaForge process."""
+
+    def __init__(self, slot_store=None, flag_cache=None):
+        self.slot_store = slot_store
+        self.flag_cache = flag_cache
+        self.instances = {}
+        self.log_buses = {}
+        self.lock = threading.Lock()
+        self.reaper_thread = None
+
+    def log_bus(self, name):
+        """Log bus for name; created on demand so dashboards can subscribe before the first launch."""
+        with self.lock:
+            if name not in self.log_buses:
+                self.log_buses[name] = LogBus()
+            return self.log_buses[name]
+
+    def get(self, name):
+        with self.lock:
+            return self.instances.get(name)
+
+    def all(self):
+        with self.lock:
+            return list(self.instances.values())
+
+    def public(self):
+        """Instances the gateway routes to and the API lists, i.e. all but LlamaForge's internal ones."""
+        with self.lock:
+            return [instance for instance in self.instances.values() if not instance.internal]
+
+    def _check_port(self, name, spec):
+        # Called with the lock held
+        for other in self.instances.values():
+            if (other.name != name and other.is_running()
+                    and other.spec["port"] == spec["port"] and other.spec["host"] == spec["host"]):
+                raise RuntimeError(f"Port {spec['port']} is already used by instance '{other.name}'.")
+
+    def start(self, name, spec, internal=False):
+        if name.startswith(INTERNAL_PREFIX) != internal:
+            raise RuntimeError(f"Instance names starting with '{INTERNAL_PREFIX}' are reserved for LlamaForge.")
+        bus = self.log_bus(name)
+        with self.lock:
+            self._check_port(name, spec)
+            instance = self.instances.get(name)
+            if instance is None:
+                instance = ServerInstance(name, bus, self.slot_store, self.flag_cache)
+                self.instances[name] = instance
+            if self.reaper_thread is None:
+                self.reaper_thread = threading.Thread(target=self._reap_idle, daemon=True)
+                self.reaper_thread.start()
+        instance.start(spec)
+        return instance
+
+    def _reap_idle(self, interval=IDLE_CHECK_INTERVAL):
+        """Put instances to sleep once they exceed their idle timeout."""
+        while True:
+            time.sleep(interval)
+            for instance in self.all():
+                try:
+                    if instance.is_idle():
+                        instance.sleep()
+                except Exception as e:
+                    logging.error(f"Error putting instance '{instance.name}' to sleep: {e}")
+
+    def reload(self, name, spec, ready_timeout=300, drain_timeout=DEFAULT_DRAIN_TIMEOUT):
+        instance = self.get(name)
+        if instance is None or not instance.is_running() or instance.internal:
+            raise RuntimeError(f"Instance '{name}' is not running.")
+        with self.lock:
+            self._check_port(name, spec)
+        return instance.reload(spec, ready_timeout, drain_timeout)
+
+    def stop(self, name, drain_timeout=0):
+        instance = self.get(name)
+        if instance:
+            instance.stop(drain_timeout)
+        return instance
+
+    def stop_all(self):
+        for instance in self.all():
+            instance.stop()
@@ -0,0 +1,63 @@
+import collections
+import itertools
+import re
+import threading
+
+# Number of log lines retained for late joiners and reconnecting clients
+LOG_BUFFER_SIZE = 5000
+
+LOG_LEVELS = ("error", "warn", "token", "system")
+LEVEL_COLORS = {"error": "red", "warn": "yellow", "token": "green", "system": "blue"}
+
+# Checked in order; first match wins, everything else is "system"
+LEVEL_PATTERNS = (
+    ("error", re.compile(r"error|failed", re.IGNORECASE)),
+    ("warn", re.compile(r"warn", re.IGNORECASE)),
+    ("token", re.compile(r"token|eval time|total time", re.IGNORECASE)),
+)
+
+
+def classify_line(line):
+    for level, pattern in LEVEL_PATTERNS:
+        if pattern.search(line):
+            return level
+    return "system"
+
+
+class LogBus:
+    """Bounded, sequence-numbered log ring buffer read independently by any number of subscribers.
+
+    Lines are never consumed: each subscriber tracks the last sequence number it has seen,
+    so memory stays at LOG_BUFFER_SIZE lines no matter how many clients are (or aren't) connected.
+    """
+
+    def __init__(self, capacity=LOG_BUFFER_SIZE):
+        self.buffer = collections.deque(maxlen=capacity)
+        self.last_seq = 0
+        self.cond = threading.Condition()
+
+    def publish(self, line):
+        with self.cond:
+            self.last_seq += 1
+            # Classified once here rather than once per subscriber
+            self.buffer.append((self.last_seq, line, classify_line(line)))
+            self.cond.notify_all()
+            return self.last_seq
+
+    def read_since(self, since, timeout=None):
+        """Return (missed, [(seq, line, level)]) for lines with seq > since, waiting up to timeout for new ones.
+
+        missed is the number of lines that fell out of the ring before this reader got to them.
+        """
+        with self.cond:
+            if since > self.last_seq:
+                # Client remembers a sequence from before LlamaForge restarted
+                since = 0
+            if self.last_seq <= since:
+                self.cond.wait_for(lambda: self.last_seq > since, timeout)
+            if not self.buffer or self.last_seq <= since:
+                return 0, []
+            first = self.buffer[0][0]
+            missed = max(0, first - since - 1)
+            start = max(0, since - first + 1)
+            return missed, list(itertools.islice(self.buffer, start, None))
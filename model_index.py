@@ -0,0 +1,402 @@
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# On-disk cache of parsed GGUF headers, keyed by path and validated by (size, mtime)
+INDEX_CACHE_FILE = "model_index.json"
+INDEX_VERSION = 3
+
+# Directory listing and header parsing are I/O bound (often on network mounts)
+SCAN_WORKERS = min(32, (os.cpu_count() or 4) * 4)
+
+GGUF_MAGIC = b"GGUF"
+# Metadata array fingerprinted (sha1 of its raw bytes) so vocabularies can be compared without re-reading them
+TOKENS_KEY = "tokenizer.ggml.tokens"
+
+# GGUF metadata value types
+GGUF_TYPE_UINT8 = 0
+GGUF_TYPE_INT8 = 1
+GGUF_TYPE_UINT16 = 2
+GGUF_TYPE_INT16 = 3
+GGUF_TYPE_UINT32 = 4
+GGUF_TYPE_INT32 = 5
+GGUF_TYPE_FLOAT32 = 6
+GGUF_TYPE_BOOL = 7
+GGUF_TYPE_STRING = 8
+GGUF_TYPE_ARRAY = 9
+GGUF_TYPE_UINT64 = 10
+GGUF_TYPE_INT64 = 11
+GGUF_TYPE_FLOAT64 = 12
+
+SCALAR_FORMATS = {
+    GGUF_TYPE_UINT8: "<B",
+    GGUF_TYPE_INT8: "<b",
+    GGUF_TYPE_UINT16: "<H",
+    GGUF_TYPE_INT16: "<h",
+    GGUF_TYPE_UINT32: "<I",
+    GGUF_TYPE_INT32: "<i",
+    GGUF_TYPE_FLOAT32: "<f",
+    GGUF_TYPE_BOOL: "<?",
+    GGUF_TYPE_UINT64: "<Q",
+    GGUF_TYPE_INT64: "<q",
+    GGUF_TYPE_FLOAT64: "<d",
+}
+
+# llama_ftype values stored in general.file_type
+FILE_TYPE_NAMES = {
+    0: "F32", 1: "F16", 2: "Q4_0", 3: "Q4_1", 7: "Q8_0", 8: "Q5_0", 9: "Q5_1",
+    10: "Q2_K", 11: "Q3_K_S", 12: "Q3_K_M", 13: "Q3_K_L", 14: "Q4_K_S", 15: "Q4_K_M",
+    16: "Q5_K_S", 17: "Q5_K_M", 18: "Q6_K", 19: "IQ2_XXS", 20: "IQ2_XS", 21: "Q2_K_S",
+    22: "IQ3_XS", 23: "IQ3_XXS", 24: "IQ1_S", 25: "IQ4_NL", 26: "IQ3_S", 27: "IQ3_M",
+    28: "IQ2_S", 29: "IQ2_M", 30: "IQ4_XS", 31: "IQ1_M", 32: "BF16", 36: "TQ1_0",
+    37: "TQ2_0", 38: "MXFP4_MOE",
+}
+
+
+class GGUFError(Exception):
+    pass
+
+
+class _Reader:
+    """Little-endian cursor over an mmap'd GGUF file."""
+
+    def __init__(self, buf):
+        self.buf = buf
+        self.pos = 0
+
+    def unpack(self, fmt):
+        size = struct.calcsize(fmt)
+        if self.pos + size > len(self.buf):
+            raise GGUFError("Unexpected end of file in GGUF header")
+        value = struct.unpack_from(fmt, self.buf, self.pos)[0]
+        self.pos += size
+        return value
+
+    def string(self):
+        length = self.unpack("<Q")
+        if self.pos + length > len(self.buf):
+            raise GGUFError("Unexpected end of file in GGUF string")
+        value = self.buf[self.pos:self.pos + length].decode("utf-8", errors="replace")
+        self.pos += length
+        return value
+
+    def skip_string(self):
+        length = self.unpack("<Q")
+        self.pos += length
+
+    def value(self, value_type):
+        if value_type == GGUF_TYPE_STRING:
+            return self.string()
+        if value_type == GGUF_TYPE_ARRAY:
+            item_type = self.unpack("<I")
+            count = self.unpack("<Q")
+            # Arrays (token lists, merges) are skipped; only their length is kept
+            if item_type == GGUF_TYPE_STRING:
+                for _ in range(count):
+                    self.skip_string()
+            elif item_type in SCALAR_FORMATS:
+                self.pos += struct.calcsize(SCALAR_FORMATS[item_type]) * count
+            else:
+                raise GGUFError(f"Unsupported GGUF array item type: {item_type}")
+            return {"array_type": item_type, "length": count}
+        fmt = SCALAR_FORMATS.get(value_type)
+        if fmt is None:
+            raise GGUFError(f"Unsupported GGUF value type: {value_type}")
+        return self.unpack(fmt)
+
+
+def read_gguf_header(path):
+    """Parse the GGUF header, metadata KV section and tensor infos without touching tensor data."""
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            reader = _Reader(mm)
+            if mm[:4] != GGUF_MAGIC:
+                raise GGUFError("Not a GGUF file")
+            reader.pos = 4
+            version = reader.unpack("<I")
+            if version == 1:
+                raise GGUFError("GGUF v1 files are not supported")
+            tensor_count = reader.unpack("<Q")
+            kv_count = reader.unpack("<Q")
+
+            metadata = {}
+            for _ in range(kv_count):
+                key = reader.string()
+                value_type = reader.unpack("<I")
+                start = reader.pos
+                metadata[key] = reader.value(value_type)
+                if key == TOKENS_KEY and isinstance(metadata[key], dict):
+                    metadata[key]["sha1"] = hashlib.sha1(mm[start:reader.pos]).hexdigest()
+
+            tensors = []
+            for _ in range(tensor_count):
+                name = reader.string()
+                n_dims = reader.unpack("<I")
+                dims = [reader.unpack("<Q") for _ in range(n_dims)]
+                tensor_type = reader.unpack("<I")
+                offset = reader.unpack("<Q")
+                tensors.append({"name": name, "dims": dims, "type": tensor_type, "offset": offset})
+
+            return {
+                "version": version,
+                "metadata": metadata,
+                "tensors": tensors,
+                "header_size": reader.pos,
+            }
+
+
+def read_gguf_tokens(path):
+    """The token strings of a GGUF vocabulary (tokenizer.ggml.tokens), in id order."""
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            reader = _Reader(mm)
+            if mm[:4] != GGUF_MAGIC:
+                raise GGUFError("Not a GGUF file")
+            reader.pos = 4
+            if reader.unpack("<I") == 1:
+                raise GGUFError("GGUF v1 files are not supported")
+            reader.unpack("<Q")
+            kv_count = reader.unpack("<Q")
+            for _ in range(kv_count):
+                key = reader.string()
+                value_type = reader.unpack("<I")
+                if key == TOKENS_KEY and value_type == GGUF_TYPE_ARRAY and reader.unpack("<I") == GGUF_TYPE_STRING:
+                    return [reader.string() for _ in range(reader.unpack("<Q"))]
+                reader.value(value_type)
+    raise GGUFError("No vocabulary in GGUF file")
+
+
+def summarize_header(header):
+    """Reduce a parsed header to the fields the UI and launch planner care about."""
+    metadata = header["metadata"]
+    arch = metadata.get("general.architecture")
+
+    def arch_key(name):
+        return metadata.get(f"{arch}.{name}") if arch else None
+
+    param_count = 0
+    for tensor in header["tensors"]:
+        elements = 1
+        for dim in tensor["dims"]:
+            elements *= dim
+        param_count += elements
+
+    vocab_size = arch_key("vocab_size")
+    tokens = metadata.get("tokenizer.ggml.tokens")
+    if vocab_size is None and isinstance(tokens, dict):
+        vocab_size = tokens["length"]
+
+    file_type = metadata.get("general.file_type")
+
+    return {
+        "gguf_version": header["version"],
+        "name": metadata.get("general.name"),
+        "architecture": arch,
+        "quant_type": FILE_TYPE_NAMES.get(file_type, str(file_type) if file_type is not None else None),
+        "size_label": metadata.get("general.size_label"),
+        "parameter_count": param_count,
+        "layer_count": arch_key("block_count"),
+        "context_length": arch_key("context_length"),
+        "vocab_size": vocab_size,
+        # Tokenizer identity, for pairing speculative decoding draft models
+        "tokenizer_model": metadata.get("tokenizer.ggml.model"),
+        "tokenizer_pre": metadata.get("tokenizer.ggml.pre"),
+        "bos_token_id": metadata.get("tokenizer.ggml.bos_token_id"),
+        "eos_token_id": metadata.get("tokenizer.ggml.eos_token_id"),
+        "vocab_hash": tokens.get("sha1") if isinstance(tokens, dict) else None,
+        "tensor_count": len(header["tensors"]),
+        # Attention geometry, needed for KV cache sizing
+        "embedding_length": arch_key("embedding_length"),
+        "head_count": arch_key("attention.head_count"),
+        "head_count_kv": arch_key("attention.head_count_kv"),
+        "key_length": arch_key("attention.key_length"),
+        "value_length": arch_key("attention.value_length"),
+    }
+
+
+class ModelIndex:
+    """Persistent cache of GGUF summaries. Unchanged files cost a single stat() per scan."""
+
+    def __init__(self, cache_file=INDEX_CACHE_FILE):
+        self.cache_file = cache_file
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == INDEX_VERSION:
+                self.entries = data.get("entries", {})
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable model index {self.cache_file}: {e}")
+
+    def save(self):
+        with self.save_lock:
+            with self.lock:
+                if not self.dirty:
+                    return
+                payload = {"version": INDEX_VERSION, "entries": dict(self.entries)}
+                self.dirty = False
+            tmp_path = self.cache_file + ".tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(payload, f)
+                os.replace(tmp_path, self.cache_file)
+            except Exception as e:
+                logging.error(f"Failed to write model index {self.cache_file}: {e}")
+
+    def lookup(self, path, st=None):
+        """Return cached metadata for path, re-reading the header only if size or mtime changed."""
+        if st is None:
+            st = os.stat(path)
+        key = os.path.abspath(path)
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry and entry["size"] == st.st_size and entry["mtime"] == st.st_mtime:
+            return entry["meta"]
+
+        try:
+            meta = summarize_header(read_gguf_header(path))
+            meta["file_size"] = st.st_size
+        except Exception as e:
+            logging.warning(f"Failed to read GGUF header of {path}: {e}")
+            meta = {"error": str(e)}
+
+        with self.lock:
+            self.entries[key] = {"size": st.st_size, "mtime": st.st_mtime, "meta": meta}
+            self.dirty = True
+        return meta
+
+    def find(self, name):
+        """Resolve a model name (full path, file name, or file name without .gguf) to an indexed path."""
+        if not name:
+            return None
+        with self.lock:
+            paths = [path for path, entry in self.entries.items() if "error" not in entry["meta"]]
+        for path in paths:
+            base = os.path.basename(path)
+            if name in (path, base) or (base.lower().endswith(".gguf") and name == base[:-5]):
+                return path
+        return None
+
+    def models(self):
+        """(path, meta) of every indexed model whose header could be read."""
+        with self.lock:
+            return [(path, entry["meta"]) for path, entry in self.entries.items() if "error" not in entry["meta"]]
+
+    def meta(self, path):
+        with self.lock:
+            entry = self.entries.get(os.path.abspath(path))
+        return entry["meta"] if entry else None
+
+    def prune(self, root, live_paths):
+        """Drop entries for files under a scanned root that no longer exist. Entries of other roots are not touched."""
+        prefix = os.path.join(os.path.abspath(root), "")
+        live = {os.path.abspath(p) for p in live_paths}
+        with self.lock:
+            for key in list(self.entries):
+                if key.startswith(prefix) and key not in live and not os.path.exists(key):
+                    del self.entries[key]
+                    self.dirty = True
+
+
+class ModelScanner:
+    """Parallel os.scandir walker that only re-lists directories whose mtime changed since the last scan."""
+
+    def __init__(self, index, workers=SCAN_WORKERS):
+        self.index = index
+        self.workers = workers
+        # dirpath -> {"mtime": ns, "files": [gguf paths], "dirs": [subdir paths]}
+        self.snapshot = {}
+        self.lock = threading.Lock()
+
+    def _list_dir(self, dirpath):
+        files = []
+        dirs = []
+        stats = {}
+        with os.scandir(dirpath) as it:
+            for entry in it:
+                try:
+                    # Symlinked directories are not followed, matching os.walk defaults
+                    if entry.is_dir(follow_symlinks=False):
+                        dirs.append(entry.path)
+                    elif entry.name.endswith(".gguf") and entry.is_file():
+                        files.append(entry.path)
+                        # On Windows DirEntry.stat() is served from the listing itself
+                        stats[entry.path] = entry.stat()
+                except OSError:
+                    continue
+        return files, dirs, stats
+
+    def _scan_dir(self, dirpath):
+        try:
+            mtime = os.stat(dirpath).st_mtime_ns
+            with self.lock:
+                snap = self.snapshot.get(dirpath)
+            stats = {}
+            if snap and snap["mtime"] == mtime:
+                files, dirs = snap["files"], snap["dirs"]
+            else:
+                files, dirs, stats = self._list_dir(dirpath)
+                with self.lock:
+                    self.snapshot[dirpath] = {"mtime": mtime, "files": files, "dirs": dirs}
+        except OSError as e:
+            logging.warning(f"Skipping unreadable directory {dirpath}: {e}")
+            return dirpath, [], []
+
+        models = []
+        for path in files:
+            try:
+                meta = self.index.lookup(path, stats.get(path))
+            except OSError:
+                # Removed since the snapshot was taken
+                continue
+            models.append({"path": path, **meta})
+        return dirpath, models, dirs
+
+    def scan(self, root, on_model=None):
+        """Walk root and return all .gguf models with metadata. on_model is called as each one is found."""
+        root = os.path.abspath(root)
+        start = time.perf_counter()
+        models = []
+        seen_dirs = set()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            pending = {pool.submit(self._scan_dir, root)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    dirpath, dir_models, subdirs = future.result()
+                    seen_dirs.add(dirpath)
+                    for model in dir_models:
+                        models.append(model)
+                        if on_model:
+                            on_model(model)
+                    for subdir in subdirs:
+                        pending.add(pool.submit(self._scan_dir, subdir))
+
+        # Forget directories under root that disappeared since the last scan
+        prefix = os.path.join(root, "")
+        with self.lock:
+            for dirpath in list(self.snapshot):
+                if (dirpath == root or dirpath.startswith(prefix)) and dirpath not in seen_dirs:
+                    del self.snapshot[dirpath]
+
+        self.index.prune(root, [m["path"] for m in models])
+        self.index.save()
+        models.sort(key=lambda m: m["path"])
+        logging.info(f"Scanned {root}: {len(models)} models in {len(seen_dirs)} directories "
+                     f"({time.perf_counter() - start:.3f}s)")
+        return models
@@ -0,0 +1,243 @@
+import logging
+import os
+import socket
+import threading
+import time
+
+from fit_planner import kv_bytes_per_token
+from instances import build_launch, DEFAULT_CTX_SIZE
+
+# Compute buffers and runtime overhead on top of weights and KV cache
+RUNTIME_OVERHEAD_BYTES = 512 * 1024 * 1024
+
+DEFAULT_PORT_RANGE = (8100, 8199)
+POOL_LOAD_TIMEOUT = 600
+
+
+class PoolError(Exception):
+    def __init__(self, message, status=503):
+        super().__init__(message)
+        self.status = status
+
+
+def estimate_footprint(meta, params):
+    """Rough resident size of a model from its GGUF metadata: weights + KV cache + runtime overhead."""
+    weights = meta.get("file_size") or 0
+    n_layer = meta.get("layer_count") or 0
+    # -c is the total context shared by all -np slots
+    ctx_size = int(params.get("ctx_size", DEFAULT_CTX_SIZE) or meta.get("context_length") or DEFAULT_CTX_SIZE)
+    per_token = kv_bytes_per_token(meta, params.get("cache_type_k", "f16"), params.get("cache_type_v", "f16"))
+    kv_cache = n_layer * ctx_size * per_token
+
+    return int(weights + kv_cache + RUNTIME_OVERHEAD_BYTES)
+
+
+def process_rss(pid):
+    """Resident set size in bytes from /proc, or None where /proc is unavailable."""
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def observed_bytes(instance):
+    """Larger of the process RSS and the buffers llama.cpp logged allocating (covers VRAM)."""
+    if not instance.is_running():
+        return None
+    rss = process_rss(instance.process.pid) or 0
+    allocated = instance.telemetry.allocated_bytes() if instance.telemetry else 0
+    return max(rss, allocated) or None
+
+
+def pool_instance_name(path):
+    base = os.path.basename(path)
+    return base[:-5] if base.lower().endswith(".gguf") else base
+
+
+class ModelPool:
+    """Keeps several llama-server instances warm within a memory budget, evicting the least recently used.
+
+    Models are launched on demand from the model index using a shared set of base launch parameters.
+    Footprints start as GGUF-based estimates and are replaced by observed sizes once an instance is ready;
+    the observed/estimated ratio is remembered per model to correct the next estimate.
+    """
+
+    def __init__(self, registry, index):
+        self.registry = registry
+        self.index = index
+        self.budget_bytes = None
+        self.base_params = {}
+        self.port_range = DEFAULT_PORT_RANGE
+        self.server_path = None
+        self.footprints = {}
+        self.corrections = {}
+        self.loading = {}
+        self.lock = threading.RLock()
+
+    def enabled(self):
+        return self.budget_bytes is not None
+
+    def is_loading(self, name):
+        with self.lock:
+            return name in self.loading
+
+    def configure(self, budget_bytes, base_params, port_range, server_path):
+        with self.lock:
+            self.budget_bytes = budget_bytes
+            self.base_params = dict(base_params or {})
+            self.port_range = port_range or DEFAULT_PORT_RANGE
+            self.server_path = server_path
+
+    def footprint(self, instance):
+        entry = self.footprints.get(instance.name)
+        if entry is None:
+            return observed_bytes(instance) or 0
+        if entry["ready"]:
+            observed = observed_bytes(instance)
+            if observed:
+                entry["observed"] = observed
+                return observed
+        return entry["estimate"]
+
+    def used_bytes(self, exclude=None):
+        """Footprints of running instances plus the space reserved by loads that have not started yet."""
+        with self.lock:
+            running = [instance for instance in self.registry.all()
+                       if instance.is_running() and instance.name != exclude]
+            names = {instance.name for instance in running}
+            reserved = sum(entry["estimate"] for name, entry in self.footprints.items()
+                           if not entry["ready"] and name in self.loading and name not in names and name != exclude)
+            return sum(self.footprint(instance) for instance in running) + reserved
+
+    def ensure(self, model, timeout=POOL_LOAD_TIMEOUT):
+        """Return a running instance for model, loading it (and evicting others) if needed."""
+        path = self.index.find(model)
+        if not path:
+            raise PoolError(f"Model '{model}' is not in the model index. Scan its folder first.", 404)
+        name = pool_instance_name(path)
+
+        with self.lock:
+            instance = self.registry.get(name)
+            loading = self.loading.get(name)
+            if instance and instance.is_running() and not loading:
+                return instance
+            owner = loading is None
+            if owner:
+                loading = self.loading[name] = threading.Event()
+
+        if not owner:
+            # Another request is already loading this model; share its result
+            loading.wait(timeout)
+            instance = self.registry.get(name)
+            if instance and instance.is_running():
+                return instance
+            raise PoolError(f"Model '{model}' failed to load.")
+
+        try:
+            return self._load(name, path, timeout)
+        finally:
+            with self.lock:
+                self.loading.pop(name).set()
+
+    def _load(self, name, path, timeout):
+        params = dict(self.base_params, model=path, port=self._free_port())
+        spec = build_launch(params, self.server_path)
+        raw_estimate = estimate_footprint(self.index.meta(path) or {}, params)
+        estimate = int(raw_estimate * self.corrections.get(path, 1.0))
+
+        with self.lock:
+            self._make_room(estimate, exclude=name)
+            self.footprints[name] = {"model": path, "estimate": estimate, "observed": None, "ready": False}
+
+        start = time.perf_counter()
+        try:
+            instance = self.registry.start(name, spec)
+        except Exception:
+            self._release(name)
+            raise
+        instance.pool_managed = True
+        if not instance.wait_ready(timeout):
+            instance.stop()
+            self._release(name)
+            raise PoolError(f"Model '{name}' did not become ready within {timeout}s.")
+        load_seconds = time.perf_counter() - start
+
+        entry = self.footprints[name]
+        entry["ready"] = True
+        entry["load_seconds"] = load_seconds
+        observed = observed_bytes(instance)
+        if observed and raw_estimate:
+            entry["observed"] = observed
+            self.corrections[path] = observed / raw_estimate
+        logging.info(f"Pool loaded {name} in {load_seconds:.1f}s "
+                     f"(estimated {estimate / 2**30:.2f} GiB, observed {(observed or 0) / 2**30:.2f} GiB)")
+        return instance
+
+    def _release(self, name):
+        """Drop the reservation of a load that failed."""
+        with self.lock:
+            self.footprints.pop(name, None)
+
+    def _make_room(self, needed, exclude=None):
+        while self.used_bytes(exclude) + needed > self.budget_bytes:
+            victims = [i for i in self.registry.all()
+                       if i.pool_managed and i.is_running() and i.name != exclude
+                       and not (i.admission and i.admission.active)]
+            if not victims:
+                raise PoolError(f"Not enough memory budget for {needed / 2**30:.2f} GiB "
+                                f"and nothing idle to evict.", 507)
+            victim = min(victims, key=lambda i: i.last_used or 0)
+            logging.info(f"Pool evicting least recently used instance {victim.name}")
+            self.evict(victim.name)
+
+    def evict(self, name):
+        instance = self.registry.get(name)
+        if instance:
+            instance.stop()
+        self.footprints.pop(name, None)
+        return instance
+
+    def _free_port(self):
+        # Sleeping instances keep their port for the wake-up
+        used = {i.spec["port"] for i in self.registry.all() if (i.is_running() or i.sleeping) and i.spec}
+        host = self.base_params.get("host", "127.0.0.1")
+        for port in range(self.port_range[0], self.port_range[1] + 1):
+            if port in used:
+                continue
+            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+                try:
+                    s.bind((host, port))
+                    return port
+                except OSError:
+                    continue
+        raise PoolError(f"No free port in {self.port_range[0]}-{self.port_range[1]}.")
+
+    def status(self):
+        with self.lock:
+            instances = []
+            for instance in self.registry.all():
+                if not instance.is_running():
+                    continue
+                entry = self.footprints.get(instance.name, {})
+                instances.append({
+                    "name": instance.name,
+                    "model": instance.spec["model"],
+                    "pool_managed": instance.pool_managed,
+                    "last_used": instance.last_used,
+                    "footprint_bytes": self.footprint(instance),
+                    "estimate_bytes": entry.get("estimate"),
+                    "observed_bytes": entry.get("observed"),
+                    "load_seconds": entry.get("load_seconds"),
+                })
+            return {
+                "enabled": self.enabled(),
+                "budget_bytes": self.budget_bytes,
+                "used_bytes": self.used_bytes(),
+                "port_range": list(self.port_range),
+                "loading": sorted(self.loading),
+                "instances": instances,
+            }
@@ -0,0 +1,196 @@
+import json
+import logging
+import os
+import statistics
+import threading
+import time
+import uuid
+
+from fit_planner import system_memory
+from profiles import write_json_atomic
+
+PREWARM_STATS_FILE = "prewarm_stats.json"
+# Prewarms and launches remembered per model
+PREWARM_HISTORY = 20
+
+READ_BLOCK = 8 * 1024 * 1024
+# How far ahead of the reader the kernel is asked to start fetching
+READAHEAD_BYTES = 64 * 1024 * 1024
+# RAM left untouched: warming more than fits in the page cache only evicts the start of the file again
+RAM_HEADROOM_BYTES = 1024 ** 3
+# A launch counts as prewarmed when at least this much of the model was in cache beforehand
+WARM_FRACTION = 0.99
+LAUNCH_TIMEOUT = 1800
+
+
+class PrewarmJob:
+    """Streams one model file through the OS page cache with large sequential reads."""
+
+    def __init__(self, path):
+        self.id = uuid.uuid4().hex[:8]
+        self.path = os.path.abspath(path)
+        self.size = os.path.getsize(self.path)
+        _, available = system_memory()
+        self.limit = self.size if available is None else max(0, min(self.size, available - RAM_HEADROOM_BYTES))
+        self.bytes_read = 0
+        self.state = "queued"
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+
+    def run(self):
+        self.state = "running"
+        self.started_at = time.time()
+        try:
+            # Unbuffered reads straight into one reused block; the data itself is thrown away
+            with open(self.path, "rb", buffering=0) as f:
+                self._read(f)
+            self.state = "cancelled" if self.cancel_event.is_set() else "done"
+        except OSError as e:
+            logging.error(f"Prewarm of {self.path} failed: {e}")
+            self.state = "failed"
+            self.error = str(e)
+        finally:
+            self.finished_at = time.time()
+
+    def _read(self, f):
+        # Readahead hints where the OS offers them (not on Windows)
+        fadvise = getattr(os, "posix_fadvise", None)
+        if fadvise:
+            fadvise(f.fileno(), 0, self.limit, os.POSIX_FADV_SEQUENTIAL)
+        block = memoryview(bytearray(READ_BLOCK))
+        hinted = 0
+        while self.bytes_read < self.limit and not self.cancel_event.is_set():
+            if fadvise and hinted < min(self.bytes_read + READAHEAD_BYTES, self.limit):
+                end = min(hinted + READAHEAD_BYTES, self.limit)
+                fadvise(f.fileno(), hinted, end - hinted, os.POSIX_FADV_WILLNEED)
+                hinted = end
+            n = f.readinto(block[:min(READ_BLOCK, self.limit - self.bytes_read)])
+            if not n:
+                break
+            self.bytes_read += n
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def fraction(self):
+        return self.bytes_read / self.size if self.size else 1.0
+
+    def status(self):
+        elapsed = (self.finished_at or time.time()) - self.started_at if self.started_at else 0.0
+        return {
+            "id": self.id,
+            "path": self.path,
+            "state": self.state,
+            "error": self.error,
+            "size": self.size,
+            "limit": self.limit,
+            "bytes_read": self.bytes_read,
+            "percent": round(self.fraction() * 100, 1),
+            "seconds": elapsed,
+            "mb_per_second": self.bytes_read / elapsed / 1024 ** 2 if elapsed else None,
+        }
+
+
+def _median(values):
+    return statistics.median(values) if values else None
+
+
+class Prewarmer:
+    """Warms one model at a time; asking for another model cancels the current one.
+
+    Records prewarm throughput and how long launches took with and without a prewarm, per model.
+    """
+
+    def __init__(self, stats_path=PREWARM_STATS_FILE):
+        self.stats_path = stats_path
+        self.stats = {}
+        self.job = None
+        self.lock = threading.Lock()
+        try:
+            with open(self.stats_path, "r", encoding="utf-8") as f:
+                self.stats = json.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable prewarm stats {self.stats_path}: {e}")
+
+    def start(self, path):
+        """Prewarm path, reusing a job already running for the same file."""
+        job = PrewarmJob(path)
+        with self.lock:
+            current = self.job
+            if current and current.path == job.path and current.state in ("queued", "running"):
+                return current
+            if current:
+                current.cancel()
+            self.job = job
+        threading.Thread(target=self._run, args=(job,), daemon=True).start()
+        return job
+
+    def _run(self, job):
+        job.run()
+        if job.state == "done":
+            status = job.status()
+            logging.info(f"Prewarmed {job.path}: {job.bytes_read} bytes in {status['seconds']:.1f}s "
+                         f"({status['mb_per_second'] or 0:.0f} MB/s)")
+            self._record(job.path, "prewarms", {"at": job.finished_at, "bytes": job.bytes_read,
+                                                "seconds": status["seconds"],
+                                                "mb_per_second": status["mb_per_second"]})
+
+    def cancel(self, keep_path=None):
+        """Cancel the current prewarm unless it is for keep_path (the model being launched)."""
+        with self.lock:
+            job = self.job
+        if job and job.state in ("queued", "running") and (keep_path is None or job.path != os.path.abspath(keep_path)):
+            job.cancel()
+            return job
+        return None
+
+    def current(self):
+        with self.lock:
+            return self.job
+
+    def warm_fraction(self, path):
+        with self.lock:
+            job = self.job
+        return job.fraction() if job and job.path == os.path.abspath(path) else 0.0
+
+    def track_launch(self, instance, path):
+        """Record the load time of a launch of path once it is ready."""
+        path = os.path.abspath(path)
+        fraction = self.warm_fraction(path)
+
+        def wait():
+            if instance.startup.wait(LAUNCH_TIMEOUT) != "ready":
+                return
+            summary = instance.startup.summary()
+            self._record(path, "loads", {"at": time.time(), "seconds": summary["elapsed"],
+                                         "prewarmed": fraction >= WARM_FRACTION,
+                                         "warm_fraction": round(fraction, 3)})
+
+        threading.Thread(target=wait, daemon=True).start()
+
+    def _record(self, path, kind, entry):
+        with self.lock:
+            history = self.stats.setdefault(path, {"prewarms": [], "loads": []})[kind]
+            history.insert(0, entry)
+            del history[PREWARM_HISTORY:]
+            try:
+                write_json_atomic(self.stats_path, self.stats)
+            except Exception as e:
+                logging.error(f"Failed to write prewarm stats {self.stats_path}: {e}")
+
+    def summary(self, path):
+        """Median prewarm throughput and launch times with and without a prewarm for one model."""
+        with self.lock:
+            stats = self.stats.get(os.path.abspath(path), {"prewarms": [], "loads": []})
+            stats = {kind: list(entries) for kind, entries in stats.items()}
+        warm = _median([load["seconds"] for load in stats["loads"] if load["prewarmed"]])
+        cold = _median([load["seconds"] for load in stats["loads"] if load["warm_fraction"] == 0])
+        return dict(stats, path=os.path.abspath(path),
+                    median_mb_per_second=_median([p["mb_per_second"] for p in stats["prewarms"] if p["mb_per_second"]]),
+                    median_cold_load_seconds=cold,
+                    median_prewarmed_load_seconds=warm,
+                    load_seconds_saved=cold - warm if cold is not None and warm is not None else None)
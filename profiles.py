@@ -0,0 +1,61 @@
+import json
+import logging
+import os
+import threading
+import time
+
+PROFILES_FILE = "launch_profiles.json"
+
+
+def write_json_atomic(path, payload):
+    """Write payload as JSON via a temp file so a crash never leaves a half-written file."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+class LaunchProfiles:
+    """Named, persisted /start-server parameter sets (e.g. the winner of a tuning run)."""
+
+    def __init__(self, path=PROFILES_FILE):
+        self.path = path
+        self.profiles = {}
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.profiles = json.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable launch profiles {self.path}: {e}")
+
+    def _save(self):
+        try:
+            write_json_atomic(self.path, self.profiles)
+        except Exception as e:
+            logging.error(f"Failed to write launch profiles {self.path}: {e}")
+
+    def all(self):
+        with self.lock:
+            return dict(self.profiles)
+
+    def get(self, name):
+        with self.lock:
+            profile = self.profiles.get(name)
+            return dict(profile["params"]) if profile else None
+
+    def put(self, name, params, source=None):
+        with self.lock:
+            self.profiles[name] = {"params": dict(params), "updated_at": time.time(), "source": source}
+            self._save()
+
+    def delete(self, name):
+        with self.lock:
+            if self.profiles.pop(name, None) is None:
+                return False
+            self._save()
+            return True
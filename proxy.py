@@ -0,0 +1,173 @@
+import http.client
+import logging
+import os
+import threading
+import time
+
+# Idle keep-alive connections kept per backend, socket timeout and relay chunk size
+POOL_MAX_IDLE = 16
+PROXY_TIMEOUT = 600
+RELAY_CHUNK = 64 * 1024
+
+# Request headers passed through to llama-server
+FORWARD_HEADERS = ("Content-Type", "Accept", "Authorization")
+# Response headers not relayed (hop-by-hop, or recomputed by the WSGI server)
+HOP_HEADERS = {"connection", "keep-alive", "transfer-encoding", "content-length", "proxy-connection", "upgrade"}
+
+
+class ProxyError(Exception):
+    def __init__(self, message, status=502):
+        super().__init__(message)
+        self.status = status
+
+
+class BackendPool:
+    """LIFO pool of keep-alive HTTP connections to one llama-server."""
+
+    def __init__(self, host, port, max_idle=POOL_MAX_IDLE):
+        self.host = host
+        self.port = port
+        self.max_idle = max_idle
+        self.idle = []
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Return (connection, reused)."""
+        with self.lock:
+            if self.idle:
+                return self.idle.pop(), True
+        return http.client.HTTPConnection(self.host, self.port, timeout=PROXY_TIMEOUT), False
+
+    def release(self, conn):
+        with self.lock:
+            if len(self.idle) < self.max_idle:
+                self.idle.append(conn)
+                return
+        conn.close()
+
+    def clear(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for conn in idle:
+            conn.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def pool_for(host, port):
+    if host in ("0.0.0.0", "::"):
+        host = "127.0.0.1"
+    with _pools_lock:
+        key = (host, port)
+        if key not in _pools:
+            _pools[key] = BackendPool(host, port)
+        return _pools[key]
+
+
+def model_aliases(instance):
+    """Names a client may put in the 'model' field to reach this instance."""
+    aliases = {instance.name}
+    if instance.spec:
+        model = instance.spec["model"]
+        base = os.path.basename(model.replace("\\", "/"))
+        aliases.update({model, base})
+        if base.lower().endswith(".gguf"):
+            aliases.add(base[:-5])
+    return aliases
+
+
+def resolve_instance(candidates, model, fallback_single=True):
+    """Pick the running (or idle-sleeping) instance serving model. With a single instance, any model name
+    routes to it unless fallback_single is off (the model pool loads unmatched models instead)."""
+    running = [instance for instance in candidates if instance.is_running() or instance.sleeping]
+    if not running:
+        raise ProxyError("No llama-server instance is running.", 503)
+    for instance in running:
+        if model and model in model_aliases(instance):
+            return instance
+    if fallback_single and len(running) == 1:
+        return running[0]
+    raise ProxyError(f"Model '{model}' is not served by any instance. "
+                     f"Available: {', '.join(sorted(i.name for i in running))}", 404)
+
+
+def open_upstream(instance, method, path, body, headers, timer=None, spec=None):
+    """Send the request to the instance (or the process described by spec, e.g. from
+    instance.checkout()) and return (pool, conn, response) once headers arrive."""
+    spec = spec or instance.spec
+    pool = pool_for(spec["host"], spec["port"])
+    send_headers = {name: headers[name] for name in FORWARD_HEADERS if name in headers}
+    for attempt in range(2):
+        conn, reused = pool.acquire()
+        try:
+            conn.request(method, path, body=body, headers=send_headers)
+            if timer:
+                timer.mark_sent()
+            response = conn.getresponse()
+            if timer:
+                timer.mark_headers()
+            return pool, conn, response
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+            conn.close()
+            # A pooled connection the backend already closed; retry once on a fresh one
+            if not reused or attempt == 1:
+                raise ProxyError(f"Backend '{instance.name}' closed the connection: {e}")
+        except OSError as e:
+            conn.close()
+            raise ProxyError(f"Backend '{instance.name}' unreachable: {e}")
+        except http.client.HTTPException as e:
+            # BadStatusLine, LineTooLong, IncompleteRead...: the backend answered with something that is not HTTP
+            conn.close()
+            raise ProxyError(f"Backend '{instance.name}' sent an invalid response: {e!r}")
+
+
+def relay_headers(response):
+    return [(name, value) for name, value in response.getheaders() if name.lower() not in HOP_HEADERS]
+
+
+def relay(pool, conn, response, on_done=None):
+    """Yield the upstream body as it arrives (no buffering) and return the connection to the pool."""
+    clean = False
+    try:
+        while True:
+            chunk = response.read1(RELAY_CHUNK)
+            if not chunk:
+                break
+            yield chunk
+        clean = not response.will_close
+    except Exception as e:
+        logging.warning(f"Proxy relay from {pool.host}:{pool.port} aborted: {e}")
+    finally:
+        # read1() leaves a fully read Content-Length response open; close it so the connection is reusable
+        response.close()
+        if clean:
+            pool.release(conn)
+        else:
+            conn.close()
+        if on_done:
+            on_done(clean)
+
+
+class ProxyTimer:
+    """Timestamps of one proxied request, used to report LlamaForge's own overhead."""
+
+    def __init__(self):
+        self.received = time.perf_counter()
+        self.sent = None
+        self.first_byte = None
+
+    def mark_sent(self):
+        self.sent = time.perf_counter()
+
+    def mark_headers(self):
+        self.first_byte = time.perf_counter()
+
+    def sample(self):
+        done = time.perf_counter()
+        return {
+            "overhead": (self.sent or done) - self.received,
+            "ttfb": (self.first_byte or done) - (self.sent or done),
+            "total": done - self.received,
+        }
@@ -0,0 +1,135 @@
+import collections
+import logging
+import threading
+import time
+import urllib.error
+import urllib.request
+
+PHASES = ("spawning", "loading_backend", "loading_model", "warming_up", "restoring_slots", "ready", "failed")
+SETTLED = ("ready", "failed")
+
+# Log substrings that move a launch forward; a phase is never revisited
+PHASE_MARKERS = (
+    ("loading_backend", ("ggml_cuda_init", "load_backend", "ggml_vulkan", "ggml_metal", "ggml_sycl", "build:")),
+    ("loading_model", ("loading model", "llama_model_loader")),
+    ("warming_up", ("llama_context", "warming up", "initializing slots")),
+    # Not "server is listening": older builds print it before the model starts loading
+    ("ready", ("starting the main loop", "all slots are idle")),
+)
+# Lines after which llama-server is known to exit without becoming ready
+FAILURE_MARKERS = ("error while handling argument", "failed to load model", "error loading model",
+                   "couldn't bind", "exiting due to")
+
+HEALTH_POLL_INTERVAL = 0.25
+
+
+class StartupTracker:
+    """Lifecycle of one llama-server launch, driven by its log lines and by polling /health.
+
+    Records when each phase was entered so a launch can report where its startup time went. If on_healthy
+    is given, it runs once /health answers (phase "restoring_slots") and the launch is ready only after it.
+    """
+
+    def __init__(self, process, base_url, on_healthy=None):
+        self.process = process
+        self.base_url = base_url
+        self.on_healthy = on_healthy
+        self.cond = threading.Condition()
+        self.state = "spawning"
+        self.reason = None
+        self.spawned_at = time.time()
+        self.timeline = [{"phase": "spawning", "at": self.spawned_at, "elapsed": 0.0}]
+        self.error_lines = collections.deque(maxlen=5)
+
+    def settled(self):
+        return self.state in SETTLED
+
+    def advance(self, phase, reason=None):
+        with self.cond:
+            if self.settled():
+                return
+            if phase != "failed" and PHASES.index(phase) <= PHASES.index(self.state):
+                return
+            now = time.time()
+            self.state = phase
+            self.reason = reason
+            self.timeline.append({"phase": phase, "at": now, "elapsed": now - self.spawned_at})
+            self.cond.notify_all()
+
+    def observe(self, line):
+        """Feed one log line. Checks stop as soon as the launch has settled."""
+        if self.settled():
+            return
+        lower = line.lower()
+        if "error" in lower or "failed" in lower:
+            self.error_lines.append(line)
+        # Checked on every line: "couldn't bind" (port in use) mentions neither error nor failed
+        for marker in FAILURE_MARKERS:
+            if marker in lower:
+                self.advance("failed", line)
+                return
+        for phase, markers in PHASE_MARKERS:
+            # With a post-health step, only the health poller may declare the launch ready
+            if phase == "ready" and self.on_healthy:
+                continue
+            if any(marker in line for marker in markers):
+                self.advance(phase)
+
+    def start_polling(self, interval=HEALTH_POLL_INTERVAL):
+        threading.Thread(target=self._poll_health, args=(interval,), daemon=True).start()
+
+    def _poll_health(self, interval):
+        while not self.settled():
+            code = self.process.poll()
+            if code is not None:
+                last_error = self.error_lines[-1] if self.error_lines else None
+                self.advance("failed", last_error or f"llama-server exited with code {code}")
+                return
+            try:
+                with urllib.request.urlopen(f"{self.base_url}/health", timeout=2) as resp:
+                    healthy = resp.status == 200
+            except urllib.error.HTTPError as e:
+                # 503 while the model loads: the HTTP server is up, so we are at least loading the model
+                if e.code == 503:
+                    self.advance("loading_model")
+                healthy = False
+            except Exception:
+                healthy = False
+            if healthy:
+                self._finish_ready()
+                return
+            time.sleep(interval)
+
+    def _finish_ready(self):
+        if self.on_healthy:
+            self.advance("restoring_slots")
+            try:
+                self.on_healthy()
+            except Exception as e:
+                logging.error(f"Post-startup step for {self.base_url} failed: {e}")
+        self.advance("ready")
+
+    def abort(self, reason):
+        self.advance("failed", reason)
+
+    def wait(self, timeout=None):
+        """Block until the launch is ready or failed, or timeout passes. Returns the current state."""
+        with self.cond:
+            self.cond.wait_for(self.settled, timeout)
+            return self.state
+
+    def summary(self):
+        with self.cond:
+            timeline = [dict(entry) for entry in self.timeline]
+            state, reason = self.state, self.reason
+        for entry, following in zip(timeline, timeline[1:]):
+            entry["seconds"] = following["at"] - entry["at"]
+        if timeline:
+            timeline[-1]["seconds"] = None if state in SETTLED else time.time() - timeline[-1]["at"]
+        return {
+            "state": state,
+            "reason": reason,
+            "spawned_at": self.spawned_at,
+            "elapsed": timeline[-1]["elapsed"] if state in SETTLED else time.time() - self.spawned_at,
+            "phases": timeline,
+        }
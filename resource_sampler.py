@@ -0,0 +1,237 @@
+import collections
+import logging
+import os
+import threading
+import time
+
+PROC_ROOT = "/proc"
+DEFAULT_INTERVAL = 2.0
+MIN_INTERVAL = 0.1
+# Samples kept per instance (30 minutes at the default interval)
+SAMPLE_HISTORY = 900
+# How often the child process list of each llama-server is re-read
+TREE_REFRESH_SECONDS = 10
+STAT_READ_BYTES = 1024
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def proc_available():
+    return os.path.isdir(os.path.join(PROC_ROOT, "self", "task"))
+
+
+def parse_stat(data):
+    """(cpu ticks, minor faults, major faults, threads, rss pages) from a /proc/<pid>/stat line."""
+    # The command name is in parentheses and may itself contain spaces or parentheses
+    fields = data[data.rindex(b")") + 2:].split()
+    return (int(fields[11]) + int(fields[12]), int(fields[7]), int(fields[9]), int(fields[17]), int(fields[21]))
+
+
+def _ppid(pid):
+    with open(os.path.join(PROC_ROOT, str(pid), "stat"), "rb") as f:
+        data = f.read()
+    return int(data[data.rindex(b")") + 2:].split()[1])
+
+
+def _children(pid):
+    """Direct children of pid, from the per-thread children lists (or a /proc scan where the kernel lacks them)."""
+    task_dir = os.path.join(PROC_ROOT, str(pid), "task")
+    children = []
+    try:
+        for tid in os.listdir(task_dir):
+            with open(os.path.join(task_dir, tid, "children"), "rb") as f:
+                children.extend(int(child) for child in f.read().split())
+        return children
+    except FileNotFoundError:
+        if not os.path.isdir(task_dir):
+            return []
+    for entry in os.listdir(PROC_ROOT):
+        if entry.isdigit():
+            try:
+                if _ppid(entry) == pid:
+                    children.append(int(entry))
+            except (OSError, ValueError, IndexError):
+                continue
+    return children
+
+
+def process_tree(pid):
+    """pid and all of its descendants."""
+    tree, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        tree.append(current)
+        try:
+            pending.extend(_children(current))
+        except OSError:
+            continue
+    return tree
+
+
+class _Tracked:
+    """Sampling state of one instance's current process tree."""
+
+    def __init__(self, root_pid):
+        self.root_pid = root_pid
+        self.pids = []
+        self.tree_read_at = 0.0
+        self.previous = {}
+        self.previous_at = None
+
+
+class ResourceSampler:
+    """Samples CPU, RSS, page faults and threads of every running llama-server and its children from /proc.
+
+    One thread serves all instances. Each process's stat file is kept open and re-read with pread, so
+    a sample costs one system call per process; the process tree is re-read every TREE_REFRESH_SECONDS.
+    Linux only; elsewhere the sampler reports itself unavailable.
+    """
+
+    def __init__(self, registry, interval=DEFAULT_INTERVAL):
+        self.registry = registry
+        self.interval = interval
+        self.available = proc_available()
+        self.series = {}
+        self.tracked = {}
+        self.fds = {}
+        self.lock = threading.Lock()
+        self.cond = threading.Condition(self.lock)
+        self.version = 0
+        self.wake = threading.Event()
+        self.thread = None
+        self.cpu_seconds = 0.0
+        self.ticks = 0
+        self.started_at = None
+        self.last_tick_seconds = 0.0
+
+    def start(self):
+        if not self.available or self.thread:
+            return
+        self.started_at = time.monotonic()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def configure(self, interval):
+        self.interval = max(MIN_INTERVAL, float(interval))
+        self.wake.set()
+        return {"interval": self.interval}
+
+    def _run(self):
+        while True:
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            cpu, wall = time.thread_time(), time.perf_counter()
+            try:
+                self.sample()
+            except Exception as e:
+                logging.error(f"Resource sampler failed: {e}")
+            self.last_tick_seconds = time.perf_counter() - wall
+            self.cpu_seconds += time.thread_time() - cpu
+            self.ticks += 1
+
+    def _read(self, pid):
+        fd = self.fds.get(pid)
+        if fd is None:
+            fd = os.open(os.path.join(PROC_ROOT, str(pid), "stat"), os.O_RDONLY)
+            self.fds[pid] = fd
+        try:
+            return parse_stat(os.pread(fd, STAT_READ_BYTES, 0))
+        except OSError:
+            # The process exited; its open stat file now fails instead of following a reused pid
+            self._close(pid)
+            raise
+
+    def _close(self, pid):
+        fd = self.fds.pop(pid, None)
+        if fd is not None:
+            os.close(fd)
+
+    def sample(self):
+        """Take one sample of every running instance."""
+        now, wall = time.monotonic(), time.time()
+        live = set()
+        for instance in self.registry.all():
+            process = instance.process
+            if process is None or process.poll() is not None:
+                continue
+            tracked = self.tracked.get(instance.name)
+            if tracked is None or tracked.root_pid != process.pid:
+                tracked = self.tracked[instance.name] = _Tracked(process.pid)
+            if now - tracked.tree_read_at >= TREE_REFRESH_SECONDS:
+                tracked.pids = process_tree(process.pid)
+                tracked.tree_read_at = now
+            current = {}
+            for pid in tracked.pids:
+                try:
+                    current[pid] = self._read(pid)
+                except (OSError, ValueError, IndexError):
+                    continue
+            live.update(current)
+            point = self._point(tracked, current, now, wall)
+            tracked.previous, tracked.previous_at = current, now
+            if point is None:
+                continue
+            with self.cond:
+                self.series.setdefault(instance.name, collections.deque(maxlen=SAMPLE_HISTORY)).append(point)
+        for pid in [pid for pid in self.fds if pid not in live]:
+            self._close(pid)
+        with self.cond:
+            self.version += 1
+            self.cond.notify_all()
+
+    def _point(self, tracked, current, now, wall):
+        if not current:
+            return None
+        point = {
+            "t": wall,
+            "pid": tracked.root_pid,
+            "processes": len(current),
+            "threads": sum(stat[3] for stat in current.values()),
+            "rss_bytes": sum(stat[4] for stat in current.values()) * PAGE_SIZE,
+            "cpu_percent": None,
+            "minor_faults_per_second": None,
+            "major_faults_per_second": None,
+        }
+        if tracked.previous_at is None:
+            return point
+        elapsed = now - tracked.previous_at
+        # Only processes seen in both samples count, so a child exiting does not show up as negative usage
+        ticks = minor = major = 0
+        for pid, stat in current.items():
+            before = tracked.previous.get(pid)
+            if before:
+                ticks += stat[0] - before[0]
+                minor += stat[1] - before[1]
+                major += stat[2] - before[2]
+        point["cpu_percent"] = round(ticks / CLOCK_TICKS / elapsed * 100, 1)
+        point["minor_faults_per_second"] = round(minor / elapsed, 1)
+        point["major_faults_per_second"] = round(major / elapsed, 1)
+        return point
+
+    def wait_for_change(self, version, timeout):
+        with self.cond:
+            if self.version == version:
+                self.cond.wait(timeout)
+            return self.version
+
+    def overhead(self):
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0.0
+        return {
+            "cpu_seconds": self.cpu_seconds,
+            "samples": self.ticks,
+            "cpu_percent_of_one_core": round(self.cpu_seconds / elapsed * 100, 3) if elapsed else None,
+            "last_sample_ms": round(self.last_tick_seconds * 1000, 3),
+        }
+
+    def status(self, name=None, since=0):
+        """Sample history newer than since (unix time), for one instance or all of them."""
+        with self.lock:
+            series = {key: [point for point in points if point["t"] > since]
+                      for key, points in self.series.items() if name is None or key == name}
+        return {
+            "available": self.available,
+            "interval": self.interval,
+            "overhead": self.overhead(),
+            "instances": [{"name": key, "samples": points} for key, points in sorted(series.items())],
+        }
@@ -0,0 +1,260 @@
+import collections
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import unicodedata
+
+from profiles import write_json_atomic
+
+RESPONSE_CACHE_DIR = "response_cache"
+RESPONSE_CACHE_INDEX = "index.json"
+DEFAULT_MEMORY_BYTES = 64 * 1024 ** 2
+DEFAULT_DISK_BYTES = 1024 ** 3
+# Larger responses are relayed but never cached
+MAX_ENTRY_BYTES = 4 * 1024 ** 2
+
+# Request fields that do not change what the model generates
+IGNORED_FIELDS = ("model", "stream_options", "user")
+# Launch flags that do not change what the model generates, with their values
+IGNORED_LAUNCH_FLAGS = ("--port", "--host", "-t", "-np", "-b", "--slot-save-path")
+
+
+def _normalize(value):
+    """Canonical form of prompt text: Unicode NFC and \\n line endings, everywhere in the payload."""
+    if isinstance(value, str):
+        return unicodedata.normalize("NFC", value.replace("\r\n", "\n"))
+    if isinstance(value, list):
+        return [_normalize(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    return value
+
+
+def model_fingerprint(spec):
+    """The model file (path, size, mtime) and every launch flag that affects its output."""
+    model = os.path.abspath(spec["model"])
+    try:
+        st = os.stat(model)
+        stamp = [st.st_size, st.st_mtime]
+    except OSError:
+        stamp = None
+    args, flags = spec["args"], []
+    i = 0
+    while i < len(args):
+        if args[i] in IGNORED_LAUNCH_FLAGS:
+            i += 2
+            continue
+        flags.append(args[i])
+        i += 1
+    return [model, stamp, flags]
+
+
+def is_deterministic(payload, sampling):
+    """Greedy decoding only: temperature 0 or top_k 1, after applying the launch's sampling defaults."""
+    temperature = payload.get("temperature", sampling.get("temperature"))
+    top_k = payload.get("top_k", sampling.get("top_k"))
+    try:
+        return float(temperature) <= 0 or int(top_k) == 1
+    except (TypeError, ValueError):
+        return False
+
+
+class ResponseCache:
+    """Exact-match cache of deterministic completions: an LRU in memory that spills to an LRU on disk.
+
+    Entries keep the upstream status, headers and raw body; streamed responses are stored as the SSE
+    byte stream and replayed event by event.
+    """
+
+    def __init__(self, directory=RESPONSE_CACHE_DIR, memory_bytes=DEFAULT_MEMORY_BYTES,
+                 disk_bytes=DEFAULT_DISK_BYTES, enabled=False):
+        self.directory = os.path.abspath(directory)
+        self.index_path = os.path.join(self.directory, RESPONSE_CACHE_INDEX)
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.enabled = enabled
+        self.memory = collections.OrderedDict()
+        self.disk = collections.OrderedDict()
+        self.memory_used = 0
+        self.disk_used = 0
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "bypassed": 0, "stores": 0, "evictions": 0,
+                      "saved_seconds": 0.0}
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                for key, meta in json.load(f):
+                    if os.path.exists(self._path(key)):
+                        self.disk[key] = meta
+                        self.disk_used += meta["size"]
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable response cache index {self.index_path}: {e}")
+
+    def configure(self, enabled=None, memory_bytes=None, disk_bytes=None):
+        with self.lock:
+            if enabled is not None:
+                self.enabled = bool(enabled)
+            if memory_bytes is not None:
+                self.memory_bytes = max(0, int(memory_bytes))
+            if disk_bytes is not None:
+                self.disk_bytes = max(0, int(disk_bytes))
+            self._trim()
+
+    def key_for(self, spec, subpath, payload):
+        """Cache key of a request, or None (counted as bypassed) if its output is not deterministic."""
+        if not is_deterministic(payload, spec.get("sampling", {})):
+            with self.lock:
+                self.stats["bypassed"] += 1
+            return None
+        request = {k: v for k, v in payload.items() if k not in IGNORED_FIELDS}
+        material = json.dumps([model_fingerprint(spec), subpath, _normalize(request)],
+                              sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".bin")
+
+    def get(self, key):
+        """Cached entry for key (promoted to memory if it was on disk), or None. Counts a hit or miss."""
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                self.memory.move_to_end(key)
+            elif key in self.disk:
+                meta = self.disk.pop(key)
+                self.disk_used -= meta["size"]
+                try:
+                    with open(self._path(key), "rb") as f:
+                        entry = dict(meta, body=f.read())
+                    os.remove(self._path(key))
+                except OSError as e:
+                    logging.warning(f"Dropping unreadable response cache entry {key}: {e}")
+                    entry = None
+                if entry is not None:
+                    self._insert(key, entry)
+                self._write_index()
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            entry["hits"] = entry.get("hits", 0) + 1
+            self.stats["hits"] += 1
+            self.stats["saved_seconds"] += entry["compute_seconds"]
+            return entry
+
+    def put(self, key, status, headers, body, streamed, compute_seconds):
+        if len(body) > MAX_ENTRY_BYTES:
+            return
+        entry = {"status": status, "headers": headers, "body": body, "streamed": streamed,
+                 "compute_seconds": compute_seconds, "created": time.time(), "size": len(body), "hits": 0}
+        with self.lock:
+            self._insert(key, entry)
+            self.stats["stores"] += 1
+            self._write_index()
+
+    def _insert(self, key, entry):
+        """Add entry to the memory tier and push the overflow down to disk. Called with the lock held."""
+        old = self.memory.pop(key, None)
+        if old is not None:
+            self.memory_used -= old["size"]
+        self.memory[key] = entry
+        self.memory_used += entry["size"]
+        self._trim()
+
+    def _trim(self):
+        # Least recently used entries move from memory to disk, and off the end of the disk tier
+        while self.memory and self.memory_used > self.memory_bytes:
+            key, entry = self.memory.popitem(last=False)
+            self.memory_used -= entry["size"]
+            self._spill(key, entry)
+        while self.disk and self.disk_used > self.disk_bytes:
+            key, meta = self.disk.popitem(last=False)
+            self.disk_used -= meta["size"]
+            self.stats["evictions"] += 1
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def _spill(self, key, entry):
+        if entry["size"] > self.disk_bytes:
+            self.stats["evictions"] += 1
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self._path(key), "wb") as f:
+                f.write(entry["body"])
+        except OSError as e:
+            logging.warning(f"Cannot spill response cache entry {key} to disk: {e}")
+            self.stats["evictions"] += 1
+            return
+        self.disk[key] = {k: v for k, v in entry.items() if k != "body"}
+        self.disk_used += entry["size"]
+
+    def _write_index(self):
+        if not self.disk and not os.path.exists(self.index_path):
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            write_json_atomic(self.index_path, list(self.disk.items()))
+        except OSError as e:
+            logging.error(f"Failed to write response cache index {self.index_path}: {e}")
+
+    def clear(self):
+        with self.lock:
+            for key in self.disk:
+                try:
+                    os.remove(self._path(key))
+                except FileNotFoundError:
+                    pass
+            self.memory.clear()
+            self.disk.clear()
+            self.memory_used = self.disk_used = 0
+            self._write_index()
+
+    def status(self):
+        with self.lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return dict(self.stats, enabled=self.enabled,
+                        hit_ratio=self.stats["hits"] / lookups if lookups else None,
+                        memory_entries=len(self.memory), memory_bytes=self.memory_used,
+                        memory_limit_bytes=self.memory_bytes,
+                        disk_entries=len(self.disk), disk_bytes=self.disk_used, disk_limit_bytes=self.disk_bytes)
+
+
+class Recorder:
+    """Copies a relayed upstream body so it can be cached once the response completes cleanly."""
+
+    def __init__(self, cache, key, status, headers, streamed, timer):
+        self.cache = cache
+        self.key = key
+        self.status = status
+        self.headers = headers
+        self.streamed = streamed
+        self.timer = timer
+        self.chunks = []
+        self.size = 0
+
+    def wrap(self, chunks):
+        for chunk in chunks:
+            if self.size <= MAX_ENTRY_BYTES:
+                self.chunks.append(chunk)
+                self.size += len(chunk)
+            yield chunk
+
+    def finish(self, ok):
+        if ok and self.status == 200 and self.size <= MAX_ENTRY_BYTES:
+            self.cache.put(self.key, self.status, self.headers, b"".join(self.chunks), self.streamed,
+                           self.timer.sample()["total"])
+
+
+def replay(entry):
+    """The cached body as an iterable: one SSE event at a time for streams, a single chunk otherwise."""
+    body = entry["body"]
+    if not entry["streamed"]:
+        return [body]
+    events = body.split(b"\n\n")
+    return [event + b"\n\n" for event in events[:-1]] + ([events[-1]] if events[-1] else [])
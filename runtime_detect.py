@@ -0,0 +1,224 @@
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+
+from instances import hidden_window_flags
+from profiles import write_json_atomic
+
+RUNTIME_CACHE_FILE = "runtime_cache.json"
+LIST_DEVICES_TIMEOUT = 10
+
+# Backend DLLs shipped next to llama-server in the Windows release builds
+BACKEND_DLLS = {
+    "cuda": "ggml-cuda.dll",
+    "rocm": "ggml-hip.dll",
+    "vulkan": "ggml-vk.dll",
+    "sycl": "ggml-sycl.dll",
+}
+
+# "  ROCm0: AMD Radeon RX 6800 XT (16368 MiB, 16226 MiB free)"
+DEVICE_RE = re.compile(r"^\s*(\w+?)(\d+):\s+(.+?)\s+\((\d+)\s*MiB,\s*(\d+)\s*MiB free\)")
+
+
+def parse_runtime_info(stdout, stderr):
+    output = stdout + "\n" + stderr
+    runtimes = []
+    
+    # Debug logging
+    logging.debug(f"Runtime Detection Output: {output}")
+
+    backend_map = {
+        "CUDA": "CUDA (NVIDIA GPUs)",
+        "ROCm": "ROCm (AMD GPUs)",
+        "Vulkan": "Vulkan (Cross-platform)",
+        "Metal": "Metal (Apple Silicon)",
+        "SYCL": "SYCL (Intel GPUs/Accelerators)",
+    }
+    
+    active_backends = []
+    
+    lines = output.split('\n')
+    for line in lines:
+        lower_line = line.lower()
+        
+        # IGNORE ggml_cuda_init lines (Fix for AMD false positives)
+        if "ggml_cuda_init" in lower_line:
+            continue
+            
+        if "error" in lower_line or "failed" in lower_line or "not found" in lower_line:
+            continue
+            
+        if "cuda" in lower_line and ("device" in lower_line or "init" in lower_line):
+            active_backends.append("CUDA")
+        if ("hip" in lower_line or "rocm" in lower_line or "amd" in lower_line) and ("device" in lower_line or "init" in lower_line):
+            active_backends.append("ROCm")
+        if "vulkan" in lower_line and ("device" in lower_line or "init" in lower_line):
+            active_backends.append("Vulkan")
+        if "metal" in lower_line and ("device" in lower_line or "init" in lower_line):
+            active_backends.append("Metal")
+        if "sycl" in lower_line and ("device" in lower_line or "init" in lower_line):
+            active_backends.append("SYCL")
+
+    # Remove duplicates
+    active_backends = list(set(active_backends))
+
+    for backend, name in backend_map.items():
+        if backend in active_backends:
+            runtimes.append(
+                {
+                    "name": name,
+                    "status": "active",
+                    "tooltip": f"{name} is active and ready.",
+                }
+            )
+    
+    # Always include CPU
+    runtimes.append(
+        {
+            "name": "CPU (Fallback)",
+            "status": "active",
+            "tooltip": "CPU is always available as fallback.",
+        }
+    )
+    return runtimes
+
+
+def parse_devices(output):
+    """Devices and their memory from `llama-server --list-devices`."""
+    devices = []
+    for line in output.splitlines():
+        match = DEVICE_RE.match(line)
+        if match:
+            devices.append({
+                "id": f"{match.group(1)}{match.group(2)}",
+                "backend": match.group(1),
+                "name": match.group(3),
+                "total_bytes": int(match.group(4)) * 1024 * 1024,
+                "free_bytes": int(match.group(5)) * 1024 * 1024,
+            })
+    return devices
+
+
+def resolve_binary(server_path):
+    if os.path.isfile(server_path):
+        return os.path.abspath(server_path)
+    return shutil.which(server_path)
+
+
+def binary_fingerprint(server_path):
+    """(path, size, mtime) of the binary plus the mtime of each backend DLL beside it (None if absent)."""
+    path = resolve_binary(server_path)
+    if not path:
+        return None
+    st = os.stat(path)
+    server_dir = os.path.dirname(path)
+    dlls = {}
+    for backend, dll in BACKEND_DLLS.items():
+        try:
+            dlls[backend] = os.stat(os.path.join(server_dir, dll)).st_mtime_ns
+        except OSError:
+            dlls[backend] = None
+    return {"path": path, "size": st.st_size, "mtime_ns": st.st_mtime_ns, "dlls": dlls}
+
+
+def probe_runtime(server_path):
+    """Backend DLL check plus `llama-server --list-devices`. Slow: initializes every GPU backend."""
+    server_dir = os.path.dirname(server_path) or "."
+    available_backends = {"cpu": True}
+    for backend, dll in BACKEND_DLLS.items():
+        available_backends[backend] = os.path.exists(os.path.join(server_dir, dll))
+
+    startupinfo, creationflags = hidden_window_flags()
+    devices = []
+    try:
+        result = subprocess.run(
+            [server_path, "--list-devices"],
+            capture_output=True,
+            text=True,
+            timeout=LIST_DEVICES_TIMEOUT,
+            startupinfo=startupinfo,
+            creationflags=creationflags
+        )
+        runtimes = parse_runtime_info(result.stdout, result.stderr)
+        devices = parse_devices(result.stdout + "\n" + result.stderr)
+    except Exception as e:
+        logging.warning(f"Runtime check failed (safe to ignore if configuring): {e}")
+        runtimes = [{
+            "name": "CPU (Fallback)",
+            "status": "active",
+            "tooltip": "CPU is always available."
+        }]
+    return {"runtimes": runtimes, "available_backends": available_backends, "devices": devices}
+
+
+class RuntimeCache:
+    """Runtime detection results persisted per llama-server binary and re-probed in the background.
+
+    get() only ever stats the binary: a missing or outdated entry is refreshed on a worker thread
+    while the caller gets the previous result (or a CPU-only placeholder) marked pending.
+    """
+
+    def __init__(self, cache_file=RUNTIME_CACHE_FILE):
+        self.cache_file = cache_file
+        self.entries = {}
+        self.refreshing = set()
+        self.lock = threading.Lock()
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable runtime cache {self.cache_file}: {e}")
+
+    def get(self, server_path, force=False):
+        fingerprint = binary_fingerprint(server_path)
+        if fingerprint is None:
+            return None
+        key = fingerprint["path"]
+        with self.lock:
+            entry = self.entries.get(key)
+        fresh = entry is not None and entry["fingerprint"] == fingerprint
+        if force or not fresh:
+            self.refresh(key, fingerprint)
+        if entry is None:
+            return {"runtimes": [{"name": "CPU (Fallback)", "status": "active",
+                                  "tooltip": "CPU is always available as fallback."}],
+                    "available_backends": {"cpu": True}, "devices": [], "pending": True}
+        return dict(entry["result"], detected_at=entry["detected_at"], pending=not fresh or force)
+
+    def refresh(self, key, fingerprint):
+        with self.lock:
+            if key in self.refreshing:
+                return
+            self.refreshing.add(key)
+        threading.Thread(target=self._refresh, args=(key, fingerprint), daemon=True).start()
+
+    def _refresh(self, key, fingerprint):
+        try:
+            start = time.perf_counter()
+            result = probe_runtime(key)
+            logging.info(f"Detected runtimes for {key} in {time.perf_counter() - start:.1f}s")
+            with self.lock:
+                self.entries[key] = {"fingerprint": fingerprint, "result": result, "detected_at": time.time()}
+                snapshot = dict(self.entries)
+            write_json_atomic(self.cache_file, snapshot)
+        except Exception as e:
+            logging.error(f"Runtime detection for {key} failed: {e}")
+        finally:
+            with self.lock:
+                self.refreshing.discard(key)
+
+    def devices(self, server_path):
+        """GPU devices from the last completed probe of server_path, without probing."""
+        fingerprint = binary_fingerprint(server_path)
+        if fingerprint is None:
+            return []
+        with self.lock:
+            entry = self.entries.get(fingerprint["path"])
+        return entry["result"].get("devices", []) if entry else []
@@ -0,0 +1,245 @@
+import json
+import logging
+import re
+import subprocess
+import threading
+import time
+
+from instances import hidden_window_flags, display_command
+from profiles import write_json_atomic
+from runtime_detect import binary_fingerprint
+
+SERVER_FLAGS_FILE = "server_flags.json"
+HELP_TIMEOUT = 10
+
+# "-fa,   --flash-attn [on|off|auto]       set Flash Attention use ..." (continuation lines are indented)
+FLAG_NAME = r"-{1,2}[A-Za-z0-9][\w-]*"
+OPTION_RE = re.compile(rf"^(?P<names>{FLAG_NAME}(?:,\s+{FLAG_NAME})*)(?: (?P<value>\S+))?(?:\s{{2,}}(?P<desc>.*))?$")
+ALLOWED_VALUES_RE = re.compile(r"allowed values:\s*(.+)$")
+NUMBER_RE = re.compile(r"^-?\d+(\.\d+)?$")
+
+# Flags LlamaForge emits whose name changed between llama.cpp builds, with the older spellings
+RENAMED_FLAGS = {
+    "--draft-max": ("--draft",),
+}
+# Equivalent spellings of on/off values across builds
+BOOLEAN_VALUES = {
+    "on": ("on", "enabled", "true", "1"),
+    "off": ("off", "disabled", "false", "0"),
+}
+# Launch options the UI only offers when the selected binary knows the flag
+FEATURE_FLAGS = {
+    "flash_attn": "-fa",
+    "jinja": "--jinja",
+    "cont_batching": "-cb",
+    "kv_unified": "--kv-unified",
+    "swa_full": "--swa-full",
+    "draft_model": "-md",
+    "slot_persist": "--slot-save-path",
+}
+
+
+def _choices(value):
+    """Allowed values from a {a,b,c} or [a|b|c] value hint, or None for free-form values."""
+    if value and value[0] + value[-1] in ("{}", "[]"):
+        return [choice.strip() for choice in re.split(r"[|,]", value[1:-1]) if choice.strip()]
+    return None
+
+
+def parse_help(text):
+    """Options from `llama-server --help`: their names, value hint (None for switches) and allowed values."""
+    options = []
+    for line in text.splitlines():
+        line = line.rstrip()
+        match = OPTION_RE.match(line)
+        if match:
+            value = match.group("value")
+            options.append({"names": [name.strip() for name in match.group("names").split(",")],
+                            "value": value, "choices": _choices(value)})
+            continue
+        # "allowed values: f32, f16, ..." on a continuation line of the previous option
+        allowed = ALLOWED_VALUES_RE.search(line)
+        if allowed and options and line[:1].isspace() and options[-1]["value"] and not options[-1]["choices"]:
+            options[-1]["choices"] = [choice.strip() for choice in allowed.group(1).split(",") if choice.strip()]
+    return options
+
+
+def index_options(options):
+    """Option of every flag name."""
+    return {name: option for option in options for name in option["names"]}
+
+
+def _equivalent(value, choices):
+    """The spelling of an on/off value this build accepts, or None."""
+    for spellings in BOOLEAN_VALUES.values():
+        if value.lower() in spellings:
+            return next((choice for choice in choices if choice.lower() in spellings), None)
+    return None
+
+
+def _split(args):
+    """(flag, value or None) pairs; llama-server has no positional arguments."""
+    pairs, i = [], 0
+    while i < len(args):
+        flag, value = args[i], None
+        if i + 1 < len(args) and (not args[i + 1].startswith("-") or NUMBER_RE.match(args[i + 1])):
+            value = args[i + 1]
+            i += 1
+        pairs.append((flag, value))
+        i += 1
+    return pairs
+
+
+def adapt_args(args, flags):
+    """args rewritten for a binary whose --help gave flags (see index_options), and what was changed.
+
+    Renamed flags and other spellings of on/off values are translated; flags or values the binary does
+    not accept are dropped, since llama-server refuses to start on them.
+    """
+    adapted, changes = [], []
+    for flag, value in _split(args):
+        option = flags.get(flag)
+        if option is None:
+            renamed = next((name for name in RENAMED_FLAGS.get(flag, ()) if name in flags), None)
+            if renamed is None:
+                changes.append(f"dropped {flag}: not supported by this llama-server")
+                continue
+            changes.append(f"{flag} is spelled {renamed} by this llama-server")
+            flag, option = renamed, flags[renamed]
+        if option["value"] is None:
+            if value is None:
+                adapted.append(flag)
+            elif value.lower() in BOOLEAN_VALUES["on"]:
+                # Older builds take a bare switch where newer ones take on/off/auto
+                changes.append(f"{flag} {value} passed as the switch {flag}")
+                adapted.append(flag)
+            else:
+                changes.append(f"dropped {flag} {value}: this llama-server takes {flag} without a value")
+            continue
+        if value is None:
+            value = _equivalent("on", option["choices"] or [])
+            if value is None:
+                changes.append(f"dropped {flag}: this llama-server requires a value ({option['value']})")
+                continue
+            changes.append(f"{flag} passed as {flag} {value}")
+        elif option["choices"] and value not in option["choices"]:
+            equivalent = _equivalent(value, option["choices"])
+            if equivalent is None:
+                changes.append(f"dropped {flag} {value}: this llama-server accepts {', '.join(option['choices'])}")
+                continue
+            changes.append(f"{flag} {value} passed as {flag} {equivalent}")
+            value = equivalent
+        adapted.extend([flag, value])
+    return adapted, changes
+
+
+def probe_flags(server_path):
+    """Options from `llama-server --help`, or None if the output does not look like llama-server's."""
+    startupinfo, creationflags = hidden_window_flags()
+    result = subprocess.run(
+        [server_path, "--help"],
+        capture_output=True,
+        text=True,
+        timeout=HELP_TIMEOUT,
+        startupinfo=startupinfo,
+        creationflags=creationflags
+    )
+    options = parse_help(result.stdout + "\n" + result.stderr)
+    known = index_options(options)
+    if "--port" not in known or "-m" not in known:
+        logging.warning(f"Unrecognized --help output from {server_path}; launch flags will not be checked")
+        return None
+    return options
+
+
+class FlagCache:
+    """Parsed `llama-server --help` per binary, probed once per binary fingerprint and persisted.
+
+    Launches are checked against it just before the process is spawned, so a flag the selected build
+    does not understand is adapted or dropped instead of costing a failed model load.
+    """
+
+    def __init__(self, cache_file=SERVER_FLAGS_FILE):
+        self.cache_file = cache_file
+        self.entries = {}
+        self.indexes = {}
+        self.lock = threading.Lock()
+        self.probe_locks = {}
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable server flag cache {self.cache_file}: {e}")
+
+    def get(self, server_path):
+        """Cache entry for server_path, probing the binary if it changed. None if it cannot be found."""
+        fingerprint = binary_fingerprint(server_path)
+        if fingerprint is None:
+            return None
+        key = fingerprint["path"]
+        with self.lock:
+            probe_lock = self.probe_locks.setdefault(key, threading.Lock())
+        # Concurrent launches of the same binary wait for one probe instead of each running --help
+        with probe_lock:
+            with self.lock:
+                entry = self.entries.get(key)
+            if entry is not None and entry["fingerprint"] == fingerprint:
+                return entry
+            start = time.perf_counter()
+            try:
+                options = probe_flags(key)
+            except Exception as e:
+                logging.warning(f"Could not read --help of {key}; launch flags will not be checked: {e}")
+                return None
+            logging.info(f"Read {len(options or [])} llama-server options from {key} in {time.perf_counter() - start:.1f}s")
+            entry = {"fingerprint": fingerprint, "options": options, "probed_at": time.time()}
+            with self.lock:
+                self.entries[key] = entry
+                self.indexes.pop(key, None)
+                snapshot = dict(self.entries)
+            try:
+                write_json_atomic(self.cache_file, snapshot)
+            except OSError as e:
+                logging.error(f"Failed to write server flag cache {self.cache_file}: {e}")
+            return entry
+
+    def warm(self, server_path):
+        """Probe server_path in the background so the first launch does not wait on --help."""
+        if server_path:
+            threading.Thread(target=self.get, args=(server_path,), daemon=True).start()
+
+    def flags(self, server_path):
+        """Option of every flag name the binary accepts, or None if it is unknown."""
+        entry = self.get(server_path)
+        if entry is None or entry["options"] is None:
+            return None
+        key = entry["fingerprint"]["path"]
+        with self.lock:
+            if key not in self.indexes:
+                self.indexes[key] = index_options(entry["options"])
+            return self.indexes[key]
+
+    def features(self, server_path):
+        """Which optional launch settings the binary supports; None if its flags are unknown."""
+        flags = self.flags(server_path)
+        if flags is None:
+            return None
+        return {feature: flag in flags for feature, flag in FEATURE_FLAGS.items()}
+
+    def adapt(self, spec):
+        """Check spec's args against its binary and rewrite them (and the display command) in place.
+
+        The changes are recorded in spec["flag_changes"]. A spec that is launched again (a wake-up) has
+        nothing left to change and keeps the changes of its first launch.
+        """
+        flags = self.flags(spec["server_path"])
+        if flags is None:
+            return []
+        args, changes = adapt_args(spec["args"], flags)
+        if changes:
+            spec["args"] = args
+            spec["command"] = display_command(spec["server_path"], args, spec["env"].get("LLAMA_CACHE", ""))
+            spec["flag_changes"] = changes
+        return changes
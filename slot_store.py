@@ -0,0 +1,192 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from profiles import write_json_atomic
+
+# llama-server writes slot files here (--slot-save-path); LlamaForge keeps its bookkeeping next to them
+SLOT_CACHE_DIR = "slot_cache"
+SLOT_INDEX_FILE = "index.json"
+DEFAULT_MAX_BYTES = 20 * 1024 ** 3
+SLOT_REQUEST_TIMEOUT = 300
+
+
+def snapshot_key(spec):
+    """Identifies KV state that can be restored into a launch: same model file and same KV cache types."""
+    model = os.path.abspath(spec["model"])
+    try:
+        st = os.stat(model)
+        stamp = f"{st.st_size}:{st.st_mtime}"
+    except OSError:
+        stamp = ""
+    fields = f"{model}|{stamp}|{spec.get('cache_type_k')}|{spec.get('cache_type_v')}"
+    return hashlib.sha1(fields.encode("utf-8")).hexdigest()[:12]
+
+
+def _slot_action(base_url, slot_id, action, filename):
+    request = urllib.request.Request(f"{base_url}/slots/{slot_id}?action={action}",
+                                     data=json.dumps({"filename": filename}).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"}, method="POST")
+    with urllib.request.urlopen(request, timeout=SLOT_REQUEST_TIMEOUT) as resp:
+        return json.loads(resp.read())
+
+
+def _slot_ids(instance):
+    try:
+        with urllib.request.urlopen(f"{instance.base_url}/slots", timeout=5) as resp:
+            return [slot["id"] for slot in json.loads(resp.read())]
+    except Exception:
+        # /slots can be disabled (--no-slots); the slot count is known from the launch anyway
+        return list(range(instance.spec["parallel"]))
+
+
+class SlotStore:
+    """Saved llama-server KV slots, taken before an instance stops and restored once it is back up.
+
+    Snapshots are keyed by instance, model and KV cache types, and the least recently used ones are
+    deleted once the directory grows past max_bytes.
+    """
+
+    def __init__(self, root=SLOT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = os.path.abspath(root)
+        self.index_path = os.path.join(self.root, SLOT_INDEX_FILE)
+        self.max_bytes = max_bytes
+        self.entries = {}
+        self.lock = threading.Lock()
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable slot index {self.index_path}: {e}")
+
+    def filename(self, instance_name, key, slot_id):
+        # llama-server only accepts plain file names
+        safe_name = re.sub(r"[^A-Za-z0-9_-]", "_", instance_name)
+        return f"{safe_name}-{key}-slot{slot_id}.bin"
+
+    def _persist(self):
+        os.makedirs(self.root, exist_ok=True)
+        try:
+            write_json_atomic(self.index_path, self.entries)
+        except OSError as e:
+            logging.error(f"Failed to write slot index {self.index_path}: {e}")
+
+    def save(self, instance):
+        """Snapshot every slot of a running instance. Returns one result per slot."""
+        key = snapshot_key(instance.spec)
+        results = []
+        for slot_id in _slot_ids(instance):
+            name = self.filename(instance.name, key, slot_id)
+            try:
+                reply = _slot_action(instance.base_url, slot_id, "save", name)
+            except (urllib.error.URLError, OSError, ValueError) as e:
+                results.append({"slot": slot_id, "error": str(e)})
+                continue
+            path = os.path.join(self.root, name)
+            with self.lock:
+                if not reply.get("n_saved"):
+                    # Nothing cached in this slot; do not keep an empty snapshot over an older useful one
+                    self.entries.pop(name, None)
+                    if os.path.exists(path):
+                        os.remove(path)
+                else:
+                    self.entries[name] = {
+                        "instance": instance.name, "key": key, "slot": slot_id, "model": instance.spec["model"],
+                        "tokens": reply["n_saved"], "bytes": reply.get("n_written") or os.path.getsize(path),
+                        "saved_at": time.time(), "last_used": time.time(),
+                        "save_ms": (reply.get("timings") or {}).get("save_ms"),
+                    }
+            results.append({"slot": slot_id, "file": name, "tokens": reply.get("n_saved", 0),
+                            "save_ms": (reply.get("timings") or {}).get("save_ms")})
+        with self.lock:
+            self._evict()
+            self._persist()
+        saved = sum(1 for r in results if r.get("tokens"))
+        logging.info(f"[{instance.name}] Saved {saved} KV slot snapshot(s)")
+        return results
+
+    def restore(self, instance, spec=None, base_url=None):
+        """Load the snapshots matching this launch back into its slots. Returns one result per restored slot.
+
+        spec and base_url name a launch of the instance that is not live yet (the new side of a reload).
+        """
+        spec = spec or instance.spec
+        base_url = base_url or instance.base_url
+        key = snapshot_key(spec)
+        with self.lock:
+            wanted = [(name, entry) for name, entry in self.entries.items()
+                      if entry["instance"] == instance.name and entry["key"] == key
+                      and entry["slot"] < spec["parallel"]]
+        results = []
+        for name, entry in wanted:
+            try:
+                reply = _slot_action(base_url, entry["slot"], "restore", name)
+            except (urllib.error.URLError, OSError, ValueError) as e:
+                logging.warning(f"[{instance.name}] Could not restore slot {entry['slot']} from {name}: {e}")
+                results.append({"slot": entry["slot"], "file": name, "error": str(e)})
+                continue
+            with self.lock:
+                entry["last_used"] = time.time()
+            results.append({"slot": entry["slot"], "file": name, "tokens": reply.get("n_restored"),
+                            "restore_ms": (reply.get("timings") or {}).get("restore_ms")})
+        if wanted:
+            with self.lock:
+                self._persist()
+            restored = sum(1 for r in results if "error" not in r)
+            logging.info(f"[{instance.name}] Restored {restored} of {len(wanted)} KV slot snapshot(s)")
+            instance.log_bus.publish(f"LlamaForge: restored {restored} KV slot snapshot(s)")
+        return results
+
+    def _evict(self):
+        """Delete least recently used snapshots until the directory fits max_bytes. Called with the lock held."""
+        for name in [name for name in self.entries if not os.path.exists(os.path.join(self.root, name))]:
+            del self.entries[name]
+        total = sum(entry["bytes"] for entry in self.entries.values())
+        for name, entry in sorted(self.entries.items(), key=lambda item: item[1]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.root, name))
+            except FileNotFoundError:
+                pass
+            total -= entry["bytes"]
+            del self.entries[name]
+            logging.info(f"Evicted KV slot snapshot {name}")
+
+    def configure(self, max_bytes):
+        with self.lock:
+            self.max_bytes = max(0, int(max_bytes))
+            self._evict()
+            self._persist()
+
+    def delete(self, instance_name=None):
+        """Drop snapshots (all, or only those of one instance). Returns how many were deleted."""
+        with self.lock:
+            names = [name for name, entry in self.entries.items()
+                     if instance_name is None or entry["instance"] == instance_name]
+            for name in names:
+                try:
+                    os.remove(os.path.join(self.root, name))
+                except FileNotFoundError:
+                    pass
+                del self.entries[name]
+            self._persist()
+        return len(names)
+
+    def status(self):
+        with self.lock:
+            entries = [dict(entry, file=name) for name, entry in self.entries.items()]
+        return {
+            "path": self.root,
+            "max_bytes": self.max_bytes,
+            "used_bytes": sum(entry["bytes"] for entry in entries),
+            "snapshots": sorted(entries, key=lambda entry: entry["last_used"], reverse=True),
+        }
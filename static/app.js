@@ -4,6 +4,7 @@ document.addEventListener('DOMContentLoaded', () => {
     const detectRuntimeBtn = document.getElementById('detect-runtime');
     const loadModelBtn = document.getElementById('load-model');
     const unloadModelBtn = document.getElementById('unload-model');
+    const reloadModelBtn = document.getElementById('reload-model');
     const openBrowserBtn = document.getElementById('open-browser-btn');
     const clearLogsBtn = document.getElementById('clear-logs');
     const autoScrollCheckbox = document.getElementById('auto-scroll');
@@ -18,6 +19,8 @@ document.addEventListener('DOMContentLoaded', () => {
     const collapsibleHeaders = document.querySelectorAll('.collapsible-header');
     const tooltip = document.getElementById('custom-tooltip');
     const backendSelect = document.getElementById('backend-select');
+    const instanceNameInput = document.getElementById('instance-name');
+    const instanceName = () => instanceNameInput.value.trim() || 'default';
 
     // V0.6: Editable preview (restored)
     const editPreviewBtn = document.getElementById('edit-preview-btn');
@@ -141,6 +144,17 @@ document.addEventListener('DOMContentLoaded', () => {
                 runtimeList.appendChild(item);
             });
 
+            // Detection runs in the background on the server; check back once it has finished
+            if (data.pending) {
+                const item = document.createElement('div');
+                item.className = 'status-item loading';
+                item.textContent = 'Refreshing...';
+                runtimeList.appendChild(item);
+                setTimeout(() => detectRuntimeBtn.click(), 1500);
+                return;
+            }
+            loadServerFlags();
+
             // Auto-select best available backend if current selection is invalid/auto
             if (backendSelect.value === 'auto' || backendSelect.selectedOptions[0].disabled) {
                 if (data.available_backends && data.available_backends.rocm) backendSelect.value = 'rocm';
@@ -201,31 +215,67 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
+    // Summary of indexed GGUF header metadata, shown as the option tooltip
+    function describeModel(model) {
+        if (model.error) return `Unreadable GGUF: ${model.error}`;
+        const parts = [];
+        if (model.architecture) parts.push(`Arch: ${model.architecture}`);
+        if (model.quant_type) parts.push(`Quant: ${model.quant_type}`);
+        if (model.parameter_count) parts.push(`Params: ${(model.parameter_count / 1e9).toFixed(2)}B`);
+        if (model.layer_count) parts.push(`Layers: ${model.layer_count}`);
+        if (model.context_length) parts.push(`Context: ${model.context_length}`);
+        if (model.vocab_size) parts.push(`Vocab: ${model.vocab_size}`);
+        return parts.join(' | ');
+    }
+
+    function addModelOption(model) {
+        const option = document.createElement('option');
+        option.value = model.path; // Full path as value
+        // Clean Name: Strip .gguf extension (case insensitive)
+        const filename = model.path.split('\\').pop().split('/').pop();
+        option.textContent = filename.replace(/\.gguf$/i, '');
+        option.title = describeModel(model);
+        scannedModelsSelect.appendChild(option);
+    }
+
+    // Streams NDJSON from /scan-models/stream so the dropdown fills in while the tree is walked
     scanModelsBtn.addEventListener('click', async () => {
         const path = document.getElementById('scan-path').value;
         scanModelsBtn.textContent = "Scanning...";
         try {
-            const response = await fetch('/scan-models', {
+            const response = await fetch('/scan-models/stream', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({ path: path })
             });
-            const data = await response.json();
-            if (data.error) {
-                alert(`Error: ${data.error}`);
-                return;
-            }
             scannedModelsSelect.innerHTML = '<option value="">Select Scanned Model</option>';
-            data.models.forEach(model => {
-                const option = document.createElement('option');
-                option.value = model; // Full path as value
-                // Clean Name: Strip .gguf extension (case insensitive)
-                const filename = model.split('\\').pop().split('/').pop();
-                option.textContent = filename.replace(/\.gguf$/i, '');
-                scannedModelsSelect.appendChild(option);
-            });
             scannedModelsSelect.style.display = 'block';
             deleteModelBtn.style.display = 'none'; // Hide delete until selected
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let found = 0;
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                const lines = buffer.split('\n');
+                buffer = lines.pop();
+                for (const line of lines) {
+                    if (!line) continue;
+                    const item = JSON.parse(line);
+                    if (item.error) {
+                        alert(`Error: ${item.error}`);
+                        return;
+                    }
+                    if (item.event === 'model') {
+                        addModelOption(item.model);
+                        found++;
+                        scanModelsBtn.textContent = `Scanning... (${found})`;
+                    }
+                }
+            }
         } catch (e) {
             alert(`Error: ${e.message}`);
         } finally {
@@ -301,14 +351,20 @@ document.addEventListener('DOMContentLoaded', () => {
 
         if (p.no_mmap) cmd += " --no-mmap";
         if (p.mlock) cmd += " --mlock";
-        if (p.flash_attn) cmd += " -fa";
+        if (p.flash_attn) cmd += " -fa on";
         if (p.jinja) cmd += " --jinja";
+        if (p.cont_batching) cmd += " -cb";
+        if (p.kv_unified) cmd += " --kv-unified";
+        if (p.swa_full) cmd += " --swa-full";
 
         cmd += ` --cache-type-k ${p.cache_type_k} --cache-type-v ${p.cache_type_v}`;
         cmd += ` --temp ${p.temp} --top-k ${p.top_k} --top-p ${p.top_p} --min_p ${p.min_p} --repeat-penalty ${p.repeat_penalty}`;
 
         if (p.rope_freq_base > 0) cmd += ` --rope-freq-base ${p.rope_freq_base}`;
         if (p.rope_freq_scale > 0) cmd += ` --rope-freq-scale ${p.rope_freq_scale}`;
+        if (p.draft_model) cmd += ` -md "${p.draft_model}" --draft-max ${p.draft_max}`;
+        if (p.slot_persist) cmd += " --slot-save-path slot_cache";
+        cmd += " --metrics";
 
         commandPreview.textContent = cmd;
     }
@@ -396,6 +452,42 @@ document.addEventListener('DOMContentLoaded', () => {
 
     loadHistory();
 
+    // --- Launch Profiles ---
+    const profileSelect = document.getElementById('profile-select');
+    let launchProfiles = {};
+
+    async function loadProfiles() {
+        try {
+            const response = await fetch('/profiles');
+            launchProfiles = (await response.json()).profiles || {};
+            profileSelect.innerHTML = '<option value="">(none)</option>';
+            Object.keys(launchProfiles).sort().forEach(name => {
+                const option = document.createElement('option');
+                option.value = name;
+                option.textContent = name;
+                profileSelect.appendChild(option);
+            });
+        } catch (e) {
+            console.warn('Could not load launch profiles:', e);
+        }
+    }
+
+    profileSelect.addEventListener('change', () => {
+        const profile = launchProfiles[profileSelect.value];
+        if (!profile) return;
+        // Form ids mirror the parameter names (gpu_layers -> gpu-layers)
+        Object.entries(profile.params).forEach(([key, value]) => {
+            if (key === 'model' || key === 'name') return;
+            const el = document.getElementById(key.replace(/_/g, '-'));
+            if (!el) return;
+            if (el.type === 'checkbox') el.checked = Boolean(value);
+            else el.value = value;
+        });
+        updateCommandPreview();
+    });
+
+    loadProfiles();
+
     // --- Browse Server Path ---
     const browseServerBtn = document.getElementById('browse-server-btn');
     if (browseServerBtn) {
@@ -437,6 +529,9 @@ document.addEventListener('DOMContentLoaded', () => {
             // Show delete button when model is selected
             deleteModelBtn.style.display = 'inline-block';
 
+            if (prewarmCheckbox.checked) prewarmModel(fullPath);
+            loadDraftModels(fullPath);
+
             // Trigger preview update
             updateCommandPreview();
         } else {
@@ -447,6 +542,93 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
+    // --- Launch options the selected llama-server build supports (from its --help) ---
+    async function loadServerFlags() {
+        try {
+            const serverPath = document.getElementById('server-path').value;
+            const data = await (await fetch(`/server-flags?serverPath=${encodeURIComponent(serverPath)}`)).json();
+            // Unknown builds keep every option; the server still checks the flags before launching
+            if (!data.features) return;
+            document.querySelectorAll('[data-feature]').forEach(el => {
+                const supported = data.features[el.dataset.feature] !== false;
+                el.hidden = !supported;
+                if (!supported) {
+                    el.querySelectorAll('input[type="checkbox"]').forEach(box => { box.checked = false; });
+                    el.querySelectorAll('select').forEach(select => { select.value = ''; });
+                }
+            });
+            updateCommandPreview();
+        } catch (e) {
+            console.warn('Server flag lookup failed:', e);
+        }
+    }
+
+    // --- Speculative decoding drafts compatible with the selected model ---
+    const draftModelSelect = document.getElementById('draft-model');
+
+    async function loadDraftModels(path) {
+        const previous = draftModelSelect.value;
+        draftModelSelect.querySelectorAll('option.draft-candidate').forEach(option => option.remove());
+        try {
+            const data = await (await fetch(`/draft-models?model=${encodeURIComponent(path)}`)).json();
+            (data.drafts || []).forEach(draft => {
+                const option = document.createElement('option');
+                option.className = 'draft-candidate';
+                option.value = draft.path;
+                const speedup = draft.measured && draft.measured.speedup;
+                option.textContent = truncateName(draft.path.split('\\').pop().split('/').pop()) +
+                    (speedup ? ` (${speedup.toFixed(2)}x measured)` : '');
+                draftModelSelect.appendChild(option);
+            });
+        } catch (e) {
+            console.warn('Draft model lookup failed:', e);
+        }
+        draftModelSelect.value = [...draftModelSelect.options].some(o => o.value === previous) ? previous : '';
+        updateCommandPreview();
+    }
+
+    // --- Page-cache prewarm of the selected model ---
+    const prewarmCheckbox = document.getElementById('prewarm-model');
+    const prewarmStatus = document.getElementById('prewarm-status');
+    prewarmCheckbox.checked = localStorage.getItem('prewarmModel') === '1';
+    prewarmCheckbox.addEventListener('change', () => {
+        localStorage.setItem('prewarmModel', prewarmCheckbox.checked ? '1' : '0');
+        if (prewarmCheckbox.checked && selectedModelFullPath) {
+            prewarmModel(selectedModelFullPath);
+        } else if (!prewarmCheckbox.checked) {
+            fetch('/prewarm/cancel', { method: 'POST' });
+            prewarmStatus.textContent = '';
+        }
+    });
+
+    async function prewarmModel(path) {
+        try {
+            const response = await fetch('/prewarm', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ model: path })
+            });
+            let info = await response.json();
+            // Poll until this prewarm finishes or is replaced by a newer one
+            while (!info.error && info.path && (info.state === 'queued' || info.state === 'running')) {
+                prewarmStatus.textContent = `Prewarming ${info.percent}% (${(info.mb_per_second || 0).toFixed(0)} MB/s)`;
+                await new Promise(resolve => setTimeout(resolve, 500));
+                const current = await (await fetch('/prewarm')).json();
+                if (current.id !== info.id) return;
+                info = current;
+            }
+            if (info.error) {
+                prewarmStatus.textContent = '';
+            } else if (info.state === 'done') {
+                prewarmStatus.textContent = `Prewarmed in ${info.seconds.toFixed(1)}s (${(info.mb_per_second || 0).toFixed(0)} MB/s)`;
+            } else {
+                prewarmStatus.textContent = `Prewarm ${info.state}`;
+            }
+        } catch (e) {
+            console.warn('Prewarm failed:', e);
+        }
+    }
+
     modelInput.addEventListener('input', () => {
         // If user types manually, assume it's a path or command
         selectedModelFullPath = modelInput.value; // Update selectedModelFullPath to reflect manual input
@@ -464,6 +646,7 @@ document.addEventListener('DOMContentLoaded', () => {
         };
 
         return {
+            name: instanceName(),
             model: modelPath,
             serverPath: document.getElementById('server-path').value,
             threads: parseInt(val('threads', 8)),
@@ -473,11 +656,16 @@ document.addEventListener('DOMContentLoaded', () => {
             ctx_size: parseInt(val('ctx-size', 4096)),
             batch_size: parseInt(val('batch-size', 512)),
             parallel: parseInt(val('parallel', 1)),
+            idle_timeout: parseFloat(val('idle-timeout', 0)) * 60,
+            slot_persist: val('slot-persist', false),
             split_mode: val('split-mode', 'layer'),
             no_mmap: val('no-mmap', false),
             mlock: val('mlock', false),
             flash_attn: val('flash-attn', false),
             jinja: val('jinja', false),
+            cont_batching: val('cont-batching', false),
+            kv_unified: val('kv-unified', false),
+            swa_full: val('swa-full', false),
             temp: parseFloat(val('temp', 0.8)),
             top_k: parseInt(val('top-k', 40)),
             top_p: parseFloat(val('top-p', 0.9)),
@@ -488,6 +676,8 @@ document.addEventListener('DOMContentLoaded', () => {
             cache_path: document.getElementById('scan-path').value || "",
             cache_type_k: val('cache-type-k', 'f16'),
             cache_type_v: val('cache-type-v', 'f16'),
+            draft_model: val('draft-model', ''),
+            draft_max: parseInt(val('draft-max', 16)),
             backend: backendSelect.value
         };
     }
@@ -500,6 +690,32 @@ document.addEventListener('DOMContentLoaded', () => {
             return;
         }
 
+        // Check the config fits in memory before a (possibly long) model load
+        const vramBudget = document.getElementById('vram-budget').value;
+        try {
+            const planResponse = await fetch('/plan-launch', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ ...data, vram_gb: vramBudget || null })
+            });
+            const plan = await planResponse.json();
+            if (!plan.error && !plan.fits) {
+                const message = `This configuration will not fit:\n${plan.problems.join('\n')}`;
+                const suggested = plan.suggested_gpu_layers;
+                if (suggested === null || suggested === data.gpu_layers) {
+                    alert(message);
+                    return;
+                }
+                if (!confirm(`${message}\n\nStart with GPU Layers = ${suggested} instead?`)) return;
+                data.gpu_layers = suggested;
+                document.getElementById('gpu-layers').value = suggested;
+                updateCommandPreview();
+            }
+        } catch (e) {
+            // The planner is advisory; a failed check never blocks a launch
+            console.warn('Launch planning failed:', e);
+        }
+
         // Save History on Start
         saveHistory();
 
@@ -518,9 +734,10 @@ document.addEventListener('DOMContentLoaded', () => {
                 loadModelBtn.disabled = false;
                 loadModelBtn.textContent = "Start Server";
             } else {
-                loadModelBtn.textContent = "Running";
                 unloadModelBtn.disabled = false;
+                reloadModelBtn.disabled = false;
                 openBrowserBtn.disabled = false;
+                followStartup(data.name);
             }
         } catch (e) {
             alert(`Error: ${e.message}`);
@@ -529,13 +746,48 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
+    reloadModelBtn.addEventListener('click', async () => {
+        const data = getParams();
+        if (!data.model) {
+            alert("Please select or enter a model first.");
+            return;
+        }
+        reloadModelBtn.disabled = true;
+        reloadModelBtn.textContent = "Reloading...";
+        try {
+            const response = await fetch('/reload-server', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify(data)
+            });
+            const result = await response.json();
+            if (result.error) {
+                alert(`Reload failed: ${result.error}`);
+            } else {
+                document.getElementById('port').value = result.new_port;
+                updateCommandPreview();
+                loadModelBtn.textContent = `Running (reloaded in ${result.total_seconds.toFixed(1)}s, ` +
+                    `${result.dropped_requests} dropped)`;
+            }
+        } catch (e) {
+            alert(`Error: ${e.message}`);
+        }
+        reloadModelBtn.textContent = "Reload";
+        reloadModelBtn.disabled = false;
+    });
+
     unloadModelBtn.addEventListener('click', async () => {
         try {
-            const response = await fetch('/stop-server', { method: 'POST' });
+            const response = await fetch('/stop-server', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ name: instanceName() })
+            });
             const result = await response.json();
             loadModelBtn.disabled = false;
             loadModelBtn.textContent = "Start Server";
             unloadModelBtn.disabled = true;
+            reloadModelBtn.disabled = true;
             openBrowserBtn.disabled = true;
         } catch (e) {
             alert(`Error: ${e.message}`);
@@ -549,7 +801,26 @@ document.addEventListener('DOMContentLoaded', () => {
     });
 
     // --- Logs & Scanning ---
-    const eventSource = new EventSource('/logs');
+    // Batched stream: one frame per flush window; gzip when the dashboard is viewed remotely
+    const isLocalDashboard = ['127.0.0.1', 'localhost', '[::1]'].includes(location.hostname);
+    let eventSource = null;
+
+    function connectLogs() {
+        if (eventSource) eventSource.close();
+        const instance = encodeURIComponent(instanceName());
+        eventSource = new EventSource(`/logs?batch=1&instance=${instance}${isLocalDashboard ? '' : '&compress=1'}`);
+        eventSource.addEventListener('batch', (event) => {
+            appendLogLines(JSON.parse(event.data));
+        });
+        // Unbatched frames ("color|line"), e.g. the dropped-lines notice
+        eventSource.onmessage = (event) => {
+            const data = event.data;
+            if (data) {
+                const sep = data.indexOf('|');
+                appendLogLines([[colorLevels[data.slice(0, sep)] || 'system', data.slice(sep + 1)]]);
+            }
+        };
+    }
 
     function scanLogForRuntime(line) {
         const lower = line.toLowerCase();
@@ -576,41 +847,118 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
-    eventSource.onmessage = (event) => {
-        const data = event.data;
-        if (data) {
-            const [color, line] = data.split('|');
-
-            // Determine Class based on content
-            let logClass = 'log-system';
-            const lowerLine = line.toLowerCase();
-            if (lowerLine.includes('error') || lowerLine.includes('failed')) logClass = 'log-error';
-            else if (lowerLine.includes('warn') || lowerLine.includes('warning')) logClass = 'log-warn';
-
-            if (lowerLine.includes('eval time') ||
-                lowerLine.includes('tokens per second') ||
-                lowerLine.includes('total time') ||
-                lowerLine.includes('prompt eval time')) {
-                logClass = 'log-token';
-            }
+    const levelClasses = { error: 'log-error', warn: 'log-warn', token: 'log-token', system: 'log-system' };
+    const colorLevels = { red: 'error', yellow: 'warn', green: 'token', blue: 'system' };
+
+    function buildLogSpan(level, line) {
+        // Level is classified server-side
+        const logClass = levelClasses[level] || 'log-system';
+        const span = document.createElement('span');
+        span.className = logClass;
+        span.textContent = line + '\n';
 
-            // Scan for runtime
+        if (logClass === 'log-warn' && !showWarn.checked) span.style.display = 'none';
+        if (logClass === 'log-token' && !showToken.checked) span.style.display = 'none';
+        if (logClass === 'log-system' && !showSystem.checked) span.style.display = 'none';
+        return span;
+    }
+
+    function appendLogLines(items) {
+        // Single DOM insertion per frame
+        const fragment = document.createDocumentFragment();
+        items.forEach(([level, line]) => {
             scanLogForRuntime(line);
+            fragment.appendChild(buildLogSpan(level, line));
+        });
+        logsDiv.appendChild(fragment);
+        if (autoScrollCheckbox.checked) {
+            logsDiv.scrollTop = logsDiv.scrollHeight;
+        }
+    }
 
-            const span = document.createElement('span');
-            span.className = logClass;
-            span.textContent = line + '\n';
+    connectLogs();
 
-            if (logClass === 'log-warn' && !showWarn.checked) span.style.display = 'none';
-            if (logClass === 'log-token' && !showToken.checked) span.style.display = 'none';
-            if (logClass === 'log-system' && !showSystem.checked) span.style.display = 'none';
+    // --- Instance Selection ---
+    const PHASE_LABELS = {
+        spawning: "Spawning...",
+        loading_backend: "Loading backend...",
+        loading_model: "Loading model...",
+        warming_up: "Warming up...",
+        restoring_slots: "Restoring KV cache...",
+    };
 
-            logsDiv.appendChild(span);
-            if (autoScrollCheckbox.checked) {
-                logsDiv.scrollTop = logsDiv.scrollHeight;
+    // Show the launch's lifecycle phase on the Start button until it is ready or has failed
+    async function followStartup(name) {
+        while (name === instanceName()) {
+            try {
+                const response = await fetch(`/instances/${encodeURIComponent(name)}/startup`);
+                const info = await response.json();
+                if (info.error) return;
+                if (info.state === 'ready') {
+                    loadModelBtn.textContent = `Running (ready in ${info.elapsed.toFixed(1)}s)`;
+                    return;
+                }
+                if (info.state === 'failed') {
+                    alert(`Server failed to start: ${info.reason}`);
+                    syncInstanceState();
+                    return;
+                }
+                loadModelBtn.textContent = PHASE_LABELS[info.state] || "Starting...";
+            } catch (e) {
+                console.error(e);
+                return;
             }
+            await new Promise(resolve => setTimeout(resolve, 500));
         }
-    };
+    }
+
+    async function syncInstanceState() {
+        try {
+            const response = await fetch('/instances');
+            const data = await response.json();
+            const current = (data.instances || []).find(i => i.name === instanceName());
+            const running = current && current.running;
+            loadModelBtn.disabled = !!running;
+            loadModelBtn.textContent = running ? "Running" : "Start Server";
+            unloadModelBtn.disabled = !running;
+            reloadModelBtn.disabled = !running;
+            openBrowserBtn.disabled = !running;
+            if (running && current.state !== 'ready') followStartup(current.name);
+        } catch (e) {
+            console.error(e);
+        }
+    }
+
+    instanceNameInput.addEventListener('change', () => {
+        logsDiv.innerHTML = '';
+        connectLogs();
+        syncInstanceState();
+    });
+    syncInstanceState();
+
+    // --- Telemetry Strip (parsed timings + polled /slots) ---
+    const telemetryStrip = document.getElementById('telemetry-strip');
+
+    async function refreshTelemetry() {
+        try {
+            const response = await fetch(`/telemetry?since=${Date.now() / 1000}`);
+            const data = await response.json();
+            if (!data.models || data.models.length === 0) {
+                telemetryStrip.textContent = 'No telemetry yet';
+                return;
+            }
+            telemetryStrip.textContent = data.models.map(m => {
+                const g = m.gauges;
+                return `${m.instance} (${m.model}): Prompt ${g.prompt_tokens_per_second.toFixed(1)} t/s | ` +
+                    `Gen ${g.generation_tokens_per_second.toFixed(1)} t/s | ` +
+                    `Slots ${g.slots_busy}/${g.slots_total || '?'} | Requests ${m.counters.requests_total}`;
+            }).join('  •  ');
+        } catch (e) {
+            telemetryStrip.textContent = 'Telemetry unavailable';
+        }
+    }
+    refreshTelemetry();
+    setInterval(refreshTelemetry, 5000);
 
     clearLogsBtn.addEventListener('click', (e) => {
         e.preventDefault();
@@ -0,0 +1,279 @@
+import collections
+import json
+import logging
+import re
+import threading
+import time
+import urllib.request
+
+# Per-request samples and poll samples kept for the dashboard time series
+TELEMETRY_HISTORY = 720
+POLL_INTERVAL = 5
+
+PROMPT_EVAL_RE = re.compile(r"prompt eval time\s*=\s*([\d.]+)\s*ms\s*/\s*(\d+)\s*tokens")
+EVAL_RE = re.compile(r"(?<!prompt )eval time\s*=\s*([\d.]+)\s*ms\s*/\s*(\d+)\s*(?:tokens|runs)")
+TOTAL_RE = re.compile(r"total time\s*=\s*([\d.]+)\s*ms\s*/\s*(\d+)\s*tokens")
+SLOT_EVENT_RE = re.compile(r"slot\s+(\w+):\s+id\s+(\d+)\s*\|")
+KV_CACHE_RE = re.compile(r"llama_kv_cache:\s+size\s*=\s*([\d.]+)\s*MiB\s*\(\s*(\d+)\s*cells")
+BUFFER_SIZE_RE = re.compile(r"(model|compute) buffer size\s*=\s*([\d.]+)\s*MiB")
+DRAFT_RE = re.compile(r"draft acceptance rate\s*=\s*([\d.]+)\s*\(\s*(\d+)\s*accepted\s*/\s*(\d+)\s*generated")
+UPSTREAM_METRIC_RE = re.compile(r"^([a-zA-Z_:][a-zA-Z0-9_:]*)\s+(\S+)$")
+
+COUNTERS = (
+    ("requests_total", "Completed generations parsed from llama-server timings."),
+    ("prompt_tokens_total", "Prompt tokens processed."),
+    ("generated_tokens_total", "Tokens generated."),
+    ("prompt_eval_seconds_total", "Time spent in prompt processing."),
+    ("eval_seconds_total", "Time spent generating tokens."),
+    ("proxy_requests_total", "Requests relayed through the LlamaForge OpenAI proxy."),
+    ("proxy_errors_total", "Proxied requests that failed or were aborted mid-stream."),
+    ("proxy_overhead_seconds_total", "Time spent in LlamaForge before the request reached llama-server."),
+    ("admission_admitted_total", "Requests admitted to a slot by the admission queue."),
+    ("admission_rejected_total", "Requests rejected, shed or timed out by the admission queue."),
+    ("queue_wait_seconds_total", "Time admitted requests spent waiting for a slot."),
+    ("draft_tokens_accepted_total", "Speculative decoding draft tokens accepted by the target model."),
+    ("draft_tokens_generated_total", "Speculative decoding draft tokens proposed by the draft model."),
+)
+
+GAUGES = (
+    ("prompt_tokens_per_second", "Prompt processing throughput of the last request."),
+    ("generation_tokens_per_second", "Generation throughput of the last request."),
+    ("last_request_seconds", "Total time of the last request."),
+    ("slots_busy", "Slots currently processing a task."),
+    ("slots_total", "Slots reported by llama-server /slots."),
+    ("kv_cache_bytes", "KV cache size allocated at model load."),
+    ("model_buffer_bytes", "Model weight buffers allocated at load, across all devices."),
+    ("compute_buffer_bytes", "Compute buffers allocated at load, across all devices."),
+    ("proxy_overhead_seconds", "Proxy routing and send overhead of the last request."),
+    ("proxy_ttfb_seconds", "Backend time to first byte of the last proxied request."),
+    ("queue_depth", "Requests waiting in the admission queue."),
+    ("slots_in_use", "Requests currently admitted to llama-server slots."),
+    ("queue_wait_seconds", "Queue wait of the last admitted request."),
+    ("cold_start_seconds", "Time from wake-on-request to ready for the last idle wake-up."),
+    ("draft_acceptance_rate", "Share of draft tokens accepted in the last speculative request."),
+)
+
+
+def _rate(tokens, ms):
+    return tokens / (ms / 1000.0) if ms > 0 else 0.0
+
+
+class TelemetryCollector:
+    """Typed metrics for one llama-server, fed from its log lines and its own /metrics and /slots."""
+
+    def __init__(self, model):
+        self.model = model
+        self.lock = threading.Lock()
+        self.counters = {name: 0 for name, _ in COUNTERS}
+        self.gauges = {name: 0 for name, _ in GAUGES}
+        self.upstream = {}
+        self.requests = collections.deque(maxlen=TELEMETRY_HISTORY)
+        self.polls = collections.deque(maxlen=TELEMETRY_HISTORY)
+        self.pending = {}
+        self.busy_slots = set()
+        self.stop_event = threading.Event()
+        self.poll_thread = None
+
+    def observe(self, line):
+        """Parse one llama-server log line. Cheap substring checks gate the regexes."""
+        if "time =" in line:
+            self._observe_timing(line)
+        elif "draft acceptance rate" in line:
+            self._observe_draft(line)
+        elif line.startswith("slot"):
+            match = SLOT_EVENT_RE.match(line)
+            if match:
+                event, slot_id = match.group(1), int(match.group(2))
+                with self.lock:
+                    if event == "launch_slot_":
+                        self.busy_slots.add(slot_id)
+                    elif event == "release":
+                        self.busy_slots.discard(slot_id)
+                    self.gauges["slots_busy"] = len(self.busy_slots)
+        elif line.startswith("llama_kv_cache:"):
+            match = KV_CACHE_RE.search(line)
+            if match:
+                # SWA models report two caches; both count towards the allocation
+                with self.lock:
+                    self.gauges["kv_cache_bytes"] += float(match.group(1)) * 1024 * 1024
+        elif "buffer size" in line:
+            match = BUFFER_SIZE_RE.search(line)
+            if match:
+                with self.lock:
+                    self.gauges[f"{match.group(1)}_buffer_bytes"] += float(match.group(2)) * 1024 * 1024
+        elif "constructing llama_context" in line:
+            with self.lock:
+                self.gauges["kv_cache_bytes"] = 0
+                self.gauges["compute_buffer_bytes"] = 0
+        elif "loading model tensors" in line:
+            with self.lock:
+                self.gauges["model_buffer_bytes"] = 0
+
+    def _observe_timing(self, line):
+        match = PROMPT_EVAL_RE.search(line)
+        if match:
+            ms, tokens = float(match.group(1)), int(match.group(2))
+            self.pending.update(prompt_ms=ms, prompt_tokens=tokens, prompt_tps=_rate(tokens, ms))
+            return
+        match = EVAL_RE.search(line)
+        if match:
+            ms, tokens = float(match.group(1)), int(match.group(2))
+            self.pending.update(eval_ms=ms, generated_tokens=tokens, generation_tps=_rate(tokens, ms))
+            return
+        match = TOTAL_RE.search(line)
+        if match:
+            sample = dict(self.pending, total_ms=float(match.group(1)), ts=time.time())
+            self.pending = {}
+            self.record_request(sample)
+
+    def _observe_draft(self, line):
+        # Printed right after the timings of the request it belongs to
+        match = DRAFT_RE.search(line)
+        if not match:
+            return
+        accepted, generated = int(match.group(2)), int(match.group(3))
+        with self.lock:
+            self.counters["draft_tokens_accepted_total"] += accepted
+            self.counters["draft_tokens_generated_total"] += generated
+            self.gauges["draft_acceptance_rate"] = float(match.group(1))
+            if self.requests:
+                self.requests[-1].update(draft_accepted=accepted, draft_generated=generated,
+                                         draft_acceptance=float(match.group(1)))
+
+    def record_request(self, sample):
+        with self.lock:
+            self.counters["requests_total"] += 1
+            self.counters["prompt_tokens_total"] += sample.get("prompt_tokens", 0)
+            self.counters["generated_tokens_total"] += sample.get("generated_tokens", 0)
+            self.counters["prompt_eval_seconds_total"] += sample.get("prompt_ms", 0) / 1000.0
+            self.counters["eval_seconds_total"] += sample.get("eval_ms", 0) / 1000.0
+            self.gauges["prompt_tokens_per_second"] = sample.get("prompt_tps", 0)
+            self.gauges["generation_tokens_per_second"] = sample.get("generation_tps", 0)
+            self.gauges["last_request_seconds"] = sample["total_ms"] / 1000.0
+            self.requests.append(sample)
+
+    def allocated_bytes(self):
+        """Device and host buffers llama.cpp reported allocating for this model."""
+        with self.lock:
+            return (self.gauges["model_buffer_bytes"] + self.gauges["kv_cache_bytes"]
+                    + self.gauges["compute_buffer_bytes"])
+
+    def record_proxy(self, timing, ok=True):
+        with self.lock:
+            self.counters["proxy_requests_total"] += 1
+            if not ok:
+                self.counters["proxy_errors_total"] += 1
+            self.counters["proxy_overhead_seconds_total"] += timing["overhead"]
+            self.gauges["proxy_overhead_seconds"] = timing["overhead"]
+            self.gauges["proxy_ttfb_seconds"] = timing["ttfb"]
+
+    def record_admission(self, waited, depth, active):
+        with self.lock:
+            self.counters["admission_admitted_total"] += 1
+            self.counters["queue_wait_seconds_total"] += waited
+            self.gauges["queue_wait_seconds"] = waited
+            self.gauges["queue_depth"] = depth
+            self.gauges["slots_in_use"] = active
+
+    def record_cold_start(self, seconds):
+        with self.lock:
+            self.gauges["cold_start_seconds"] = seconds
+
+    def record_rejection(self):
+        with self.lock:
+            self.counters["admission_rejected_total"] += 1
+
+    def set_queue(self, depth, active):
+        with self.lock:
+            self.gauges["queue_depth"] = depth
+            self.gauges["slots_in_use"] = active
+
+    def start_polling(self, base_url, interval=POLL_INTERVAL):
+        self.stop_event.clear()
+        self.poll_thread = threading.Thread(target=self._poll_loop, args=(base_url, interval), daemon=True)
+        self.poll_thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _poll_loop(self, base_url, interval):
+        while not self.stop_event.wait(interval):
+            sample = {"ts": time.time()}
+            try:
+                with urllib.request.urlopen(f"{base_url}/metrics", timeout=2) as resp:
+                    upstream = parse_prometheus_text(resp.read().decode("utf-8", errors="replace"))
+                with self.lock:
+                    self.upstream = upstream
+                sample.update(upstream)
+            except Exception as e:
+                # Server still loading, or launched without --metrics
+                logging.debug(f"Telemetry poll of {base_url}/metrics failed: {e}")
+            try:
+                with urllib.request.urlopen(f"{base_url}/slots", timeout=2) as resp:
+                    slots = json.loads(resp.read())
+                busy = sum(1 for slot in slots if slot.get("is_processing"))
+                with self.lock:
+                    self.gauges["slots_busy"] = busy
+                    self.gauges["slots_total"] = len(slots)
+                sample.update(slots_busy=busy, slots_total=len(slots))
+            except Exception as e:
+                logging.debug(f"Telemetry poll of {base_url}/slots failed: {e}")
+            with self.lock:
+                self.polls.append(sample)
+
+    def snapshot(self, since=0):
+        with self.lock:
+            return {
+                "model": self.model,
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+                "upstream": dict(self.upstream),
+                "requests": [s for s in self.requests if s["ts"] > since],
+                "polls": [s for s in self.polls if s["ts"] > since],
+            }
+
+
+def parse_prometheus_text(text):
+    """Unlabelled samples from a Prometheus text exposition (llama-server exports no labels)."""
+    values = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        match = UPSTREAM_METRIC_RE.match(line.strip())
+        if match:
+            try:
+                values[match.group(1)] = float(match.group(2))
+            except ValueError:
+                continue
+    return values
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_prometheus(collectors):
+    """Prometheus text format for a list of (labels dict, TelemetryCollector)."""
+    snapshots = [(labels, collector.snapshot(since=time.time())) for labels, collector in collectors]
+    out = []
+
+    def family(name, kind, help_text, key, field):
+        out.append(f"# HELP llamaforge_{name} {help_text}")
+        out.append(f"# TYPE llamaforge_{name} {kind}")
+        for labels, snap in snapshots:
+            if key not in snap[field]:
+                continue
+            label_str = ",".join(f'{k}="{_label(v)}"' for k, v in labels.items())
+            out.append(f"llamaforge_{name}{{{label_str}}} {snap[field].get(key, 0)}")
+
+    for name, help_text in COUNTERS:
+        family(name, "counter", help_text, name, "counters")
+    for name, help_text in GAUGES:
+        family(name, "gauge", help_text, name, "gauges")
+
+    upstream_names = sorted({key for _, snap in snapshots for key in snap["upstream"]})
+    for key in upstream_names:
+        name = "upstream_" + key.replace(":", "_")
+        family(name, "gauge", f"{key} as reported by llama-server /metrics.", key, "upstream")
+
+    return "\n".join(out) + "\n"
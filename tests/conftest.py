@@ -0,0 +1,30 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the repository root, next to app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_overhead import free_port, make_launcher  # noqa: E402
+from instances import InstanceRegistry, build_launch  # noqa: E402
+
+
+@pytest.fixture
+def registry():
+    registry = InstanceRegistry()
+    yield registry
+    registry.stop_all()
+
+
+@pytest.fixture
+def stub_spec(tmp_path):
+    """Launch spec factory for benchmarks/fake_llama_server.py, started the way LlamaForge starts llama-server."""
+    launcher = make_launcher(str(tmp_path))
+
+    def make(env=None, **params):
+        spec = build_launch(dict({"model": "stub.gguf", "port": free_port()}, **params), launcher)
+        spec["env"].update({"FAKE_LLAMA_LOAD_SECONDS": "0.1", **(env or {})})
+        return spec
+
+    return make
@@ -0,0 +1,49 @@
+import threading
+
+import pytest
+
+from admission import AdmissionQueue, AdmissionRejected
+
+
+def test_zero_queue_rejects_instead_of_waiting():
+    queue = AdmissionQueue(1, 0)
+    queue.acquire()
+    with pytest.raises(AdmissionRejected):
+        queue.acquire(timeout=0.1)
+    assert queue.counts["rejected"] == 1
+    queue.release()
+    queue.acquire(timeout=0.1)
+
+
+def test_interactive_sheds_newest_batch_waiter_when_full():
+    queue = AdmissionQueue(1, 1)
+    queue.acquire()
+    shed = []
+
+    def batch():
+        try:
+            queue.acquire("batch", timeout=5)
+        except AdmissionRejected as e:
+            shed.append(e)
+
+    waiter = threading.Thread(target=batch)
+    waiter.start()
+    while not queue.waiting:
+        pass
+    granted = threading.Thread(target=queue.acquire, args=("interactive", 5))
+    granted.start()
+    waiter.join(5)
+    assert shed and queue.counts["shed"] == 1
+    queue.release()
+    granted.join(5)
+    assert queue.active == 1
+
+
+def test_cancel_event_leaves_the_queue():
+    queue = AdmissionQueue(1)
+    queue.acquire()
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(AdmissionRejected):
+        queue.acquire("batch", timeout=60, cancel=cancel)
+    assert not queue.waiting
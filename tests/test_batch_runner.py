@@ -0,0 +1,78 @@
+import json
+import time
+
+import pytest
+
+import batch_runner
+from batch_runner import BatchRunner
+
+ROWS = 20
+
+
+def write_rows(path):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(ROWS):
+            f.write(json.dumps({"custom_id": f"row-{i}", "body": {"messages": [{"role": "user", "content": str(i)}],
+                                                                  "max_tokens": 4}}) + "\n")
+
+
+def output_lines(path):
+    with open(path, "r", encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f]
+    assert all("response" in row for row in rows)
+    return sorted(row["line"] for row in rows)
+
+
+def wait_until(predicate, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise TimeoutError
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def batch_instance(registry, stub_spec):
+    # 40 ms per row, two slots
+    instance = registry.start("batch", stub_spec(parallel=2, env={"FAKE_LLAMA_TOKEN_SECONDS": "0.01"}))
+    assert instance.wait_ready(30)
+    return instance
+
+
+def test_pause_then_resume_sends_every_row_once(tmp_path, registry, batch_instance):
+    write_rows(tmp_path / "in.jsonl")
+    runner = BatchRunner(registry, str(tmp_path / "jobs.json"))
+    job = runner.submit("batch", str(tmp_path / "in.jsonl"), str(tmp_path / "out.jsonl"))
+    wait_until(lambda: job.counts["rows_done"] >= 3)
+    runner.stop(job.id)
+    time.sleep(0.01)
+    runner.resume(job.id)
+    wait_until(lambda: job.state != "running")
+
+    assert job.state == "done", job.error
+    assert output_lines(tmp_path / "out.jsonl") == list(range(ROWS))
+
+
+def test_resume_after_a_crash_neither_repeats_nor_drops_rows(tmp_path, registry, batch_instance, monkeypatch):
+    monkeypatch.setattr(batch_runner, "CHECKPOINT_SECONDS", 0)
+    write_rows(tmp_path / "in.jsonl")
+    runner = BatchRunner(registry, str(tmp_path / "jobs.json"))
+    job = runner.submit("batch", str(tmp_path / "in.jsonl"), str(tmp_path / "out.jsonl"))
+    wait_until(lambda: job.counts["rows_done"] >= 5)
+    # From here on nothing reaches the checkpoint, as if the process died: the rows written after it
+    # must be dropped and sent again
+    job._checkpoint = lambda force=False: None
+    wait_until(lambda: job.counts["rows_done"] >= 9)
+    job.stop_event.set()
+    job._thread.join(30)
+    with open(tmp_path / "out.jsonl", "rb") as f:
+        assert len(f.read().splitlines()) >= 9
+
+    restarted = BatchRunner(registry, str(tmp_path / "jobs.json"))
+    resumed = restarted.resume(job.id)
+    wait_until(lambda: resumed.state != "running")
+
+    assert resumed.state == "done", resumed.error
+    assert resumed.resumed_from is not None and resumed.resumed_from < 9
+    assert output_lines(tmp_path / "out.jsonl") == list(range(ROWS))
+    assert resumed.counts["rows_done"] == ROWS
@@ -0,0 +1,53 @@
+import os
+
+from draft_advisor import DraftAdvisor
+
+VOCAB = {"tokenizer_model": "gpt2", "bos_token_id": 1, "eos_token_id": 2, "vocab_size": 151936, "vocab_hash": "abc"}
+
+
+class FakeIndex:
+    def __init__(self, models):
+        self.entries = {os.path.abspath(path): dict(VOCAB, architecture="qwen2", **meta) for path, meta in models.items()}
+
+    def lookup(self, path):
+        return self.entries[path]
+
+    def models(self):
+        return list(self.entries.items())
+
+
+class FakeStats:
+    def __init__(self, speedups):
+        self.speedups = {os.path.abspath(path): speedup for path, speedup in speedups.items()}
+
+    def summary(self, target, draft):
+        speedup = self.speedups.get(draft)
+        return None if speedup is None else {"speedup": speedup}
+
+
+def names(drafts):
+    return [os.path.basename(draft["path"]) for draft in drafts]
+
+
+def test_missing_target_parameter_count_falls_back_to_file_size():
+    index = FakeIndex({
+        "target.gguf": {"file_size": 8000},
+        "small.gguf": {"parameter_count": 500, "file_size": 1000},
+        "big.gguf": {"parameter_count": 7000, "file_size": 7000},
+        "unknown.gguf": {},
+    })
+    result = DraftAdvisor(index, FakeStats({})).candidates("target.gguf")
+    assert sorted(names(result["drafts"])) == ["small.gguf", "unknown.gguf"]
+    assert names(result["rejected"]) == ["big.gguf"]
+
+
+def test_drafts_measured_slower_rank_after_unmeasured_ones():
+    index = FakeIndex({
+        "target.gguf": {"parameter_count": 8000},
+        "fast.gguf": {"parameter_count": 1000},
+        "slow.gguf": {"parameter_count": 500},
+        "new.gguf": {"parameter_count": 1500},
+    })
+    stats = FakeStats({"fast.gguf": 1.6, "slow.gguf": 0.8})
+    advisor = DraftAdvisor(index, stats)
+    assert names(advisor.candidates("target.gguf")["drafts"]) == ["fast.gguf", "new.gguf", "slow.gguf"]
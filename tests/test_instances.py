@@ -0,0 +1,46 @@
+import time
+
+import pytest
+
+from instances import InstanceRegistry, ServerInstance, INTERNAL_PREFIX
+
+
+def test_internal_instances_are_not_listed_or_startable_by_users():
+    registry = InstanceRegistry()
+    for name in ("chat", INTERNAL_PREFIX + "tune"):
+        instance = ServerInstance(name, registry.log_bus(name))
+        with registry.lock:
+            registry.instances[name] = instance
+    assert [instance.name for instance in registry.public()] == ["chat"]
+    with pytest.raises(RuntimeError):
+        registry.start(INTERNAL_PREFIX + "tune", {})
+
+
+def test_idle_instance_sleeps_and_wakes_with_the_same_command(registry, stub_spec):
+    instance = registry.start("chat", stub_spec(idle_timeout=0.5))
+    assert instance.wait_ready(30)
+    command = instance.process.args
+
+    instance.last_used = time.time() - 1
+    assert instance.is_idle()
+    assert instance.sleep()
+    assert instance.sleeping and not instance.is_running()
+
+    cold_start = instance.wake()
+    assert instance.is_running() and not instance.sleeping
+    assert instance.process.args == command
+    assert [entry["seconds"] for entry in instance.cold_starts] == [cold_start]
+    # The wake counts as use: the idle timer starts over
+    assert not instance.is_idle()
+
+
+def test_busy_instance_does_not_sleep(registry, stub_spec):
+    instance = registry.start("chat", stub_spec(idle_timeout=0.5))
+    assert instance.wait_ready(30)
+    instance.last_used = time.time() - 1
+    instance.admission.acquire()
+    try:
+        assert not instance.sleep()
+        assert instance.is_running()
+    finally:
+        instance.admission.release()
@@ -0,0 +1,18 @@
+import os
+
+from model_index import ModelIndex
+
+
+def test_prune_only_touches_the_scanned_root(tmp_path, monkeypatch):
+    index = ModelIndex(str(tmp_path / "index.json"))
+    root, other = tmp_path / "models", tmp_path / "models-other"
+    gone, elsewhere = str(root / "gone.gguf"), str(other / "elsewhere.gguf")
+    index.entries = {path: {"size": 1, "mtime": 0, "meta": {}} for path in (gone, elsewhere)}
+    checked = []
+    real_exists = os.path.exists
+    monkeypatch.setattr(os.path, "exists", lambda path: checked.append(path) or real_exists(path))
+
+    index.prune(str(root), [])
+
+    assert list(index.entries) == [elsewhere]
+    assert checked == [gone]
@@ -0,0 +1,33 @@
+import socket
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import proxy
+
+
+def garbage_backend(reply):
+    """A listening socket that answers every connection with reply instead of HTTP."""
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen()
+
+    def serve():
+        while True:
+            conn, _ = server.accept()
+            conn.recv(65536)
+            conn.sendall(reply)
+            conn.close()
+
+    threading.Thread(target=serve, daemon=True).start()
+    return server.getsockname()[1]
+
+
+@pytest.mark.parametrize("reply", [b"NOT HTTP\r\n\r\n", b"HTTP/1.1 200 OK\r\n" + b"X" * 70000 + b"\r\n\r\n"])
+def test_invalid_response_is_a_proxy_error(reply):
+    port = garbage_backend(reply)
+    instance = SimpleNamespace(name="bad", spec={"host": "127.0.0.1", "port": port})
+    with pytest.raises(proxy.ProxyError) as raised:
+        proxy.open_upstream(instance, "POST", "/v1/chat/completions", b"{}", {})
+    assert raised.value.status == 502
@@ -0,0 +1,18 @@
+from readiness import StartupTracker
+
+
+def test_port_in_use_fails_fast():
+    tracker = StartupTracker(None, "http://127.0.0.1:1")
+    tracker.observe("main: loading model")
+    tracker.observe("couldn't bind HTTP server socket, hostname: 127.0.0.1, port: 8080")
+    assert tracker.state == "failed"
+    assert "couldn't bind" in tracker.reason
+
+
+def test_listening_line_of_older_builds_is_not_ready():
+    tracker = StartupTracker(None, "http://127.0.0.1:1")
+    tracker.observe("main: HTTP server is listening, hostname: 127.0.0.1, port: 8080, http threads: 15")
+    tracker.observe("main: loading model")
+    assert tracker.state == "loading_model"
+    tracker.observe("srv  update_slots: all slots are idle")
+    assert tracker.state == "ready"